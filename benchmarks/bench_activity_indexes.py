@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Plan and latency benchmark for the activities indexes (migration 008).
+
+Builds a large synthetic ``activities`` table in a throwaway schema with the
+same columns and RLS policy as production, then replays the SQL the agent
+generated for the ``stravatalk/evals/level1/evals.json`` scenarios (as
+recorded in ``test_report.json``) as one athlete. Each query is timed with
+EXPLAIN ANALYZE before and after applying
+``migrations/008_add_activity_indexes.sql``. The report shows the median
+execution time and the scans used.
+
+Prerequisites:
+- A local PostgreSQL in DATABASE_URL (only the bench schema is touched)
+
+Usage:
+    DATABASE_URL=postgresql://localhost/stravatalk_bench python benchmarks/bench_activity_indexes.py \\
+        --rows 2000000 --athletes 2000 --runs 5
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+
+import psycopg2
+from psycopg2 import sql
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+EVALS_DIR = os.path.join(ROOT, "stravatalk", "evals", "level1")
+MIGRATION_FILE = "008_add_activity_indexes.sql"
+
+BENCH_SCHEMA = "bench_activity_indexes"
+BENCH_ATHLETE_ID = 1
+
+ACTIVITY_TYPES = [
+    "Run", "Ride", "Swim", "Walk", "Hike", "WeightTraining",
+    "Yoga", "VirtualRide", "Rowing", "AlpineSki", "Workout",
+]
+
+
+def load_eval_queries():
+    """(scenario id, SQL) for every evals.json scenario that produced SQL."""
+    with open(os.path.join(EVALS_DIR, "evals.json")) as f:
+        scenario_ids = [scenario["id"] for scenario in json.load(f)["test_scenarios"]]
+    with open(os.path.join(EVALS_DIR, "test_report.json")) as f:
+        recorded = {scenario["id"]: scenario.get("sql_query") for scenario in json.load(f)["scenarios"]}
+    return [(sid, recorded[sid]) for sid in scenario_ids if recorded.get(sid)]
+
+
+def build_synthetic_table(cursor, rows, athletes):
+    print(f"🏗️  Building {rows:,} synthetic activities for {athletes:,} athletes...")
+    cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(BENCH_SCHEMA)))
+    cursor.execute(sql.SQL("CREATE SCHEMA {}").format(sql.Identifier(BENCH_SCHEMA)))
+    cursor.execute(sql.SQL("SET search_path TO {}, public").format(sql.Identifier(BENCH_SCHEMA)))
+
+    # Same shape as the production table (start_date is still TEXT here)
+    cursor.execute("""
+        CREATE TABLE activities (
+            id BIGINT PRIMARY KEY,
+            name TEXT,
+            distance REAL,
+            moving_time INTEGER,
+            elapsed_time INTEGER,
+            total_elevation_gain REAL,
+            type TEXT,
+            start_date TEXT,
+            athlete_id BIGINT
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO activities
+        SELECT
+            g,
+            'Activity ' || g,
+            (500 + random() * 40000)::real,
+            (600 + random() * 12000)::integer,
+            (700 + random() * 14000)::integer,
+            (random() * 1500)::real,
+            (%s::text[])[1 + floor(random() * %s)::integer],
+            to_char(timestamp '2015-01-01' + random() * interval '10 years', 'YYYY-MM-DD"T"HH24:MI:SS"Z"'),
+            1 + (g %% %s)
+        FROM generate_series(1, %s) AS g
+    """, (ACTIVITY_TYPES, len(ACTIVITY_TYPES), athletes, rows))
+
+    # Queries run under the same policy as production; FORCE applies it to the owner too
+    cursor.execute("ALTER TABLE activities ENABLE ROW LEVEL SECURITY")
+    cursor.execute("ALTER TABLE activities FORCE ROW LEVEL SECURITY")
+    cursor.execute("""
+        CREATE POLICY user_activities_policy ON activities
+            FOR ALL TO PUBLIC
+            USING (athlete_id = current_setting('app.current_user_id', true)::integer)
+    """)
+    cursor.execute("ANALYZE activities")
+
+
+def apply_index_migration(cursor):
+    sys.path.insert(0, os.path.join(ROOT, "migrations"))
+    from run_migration import execute_statements
+
+    print(f"🔨 Applying {MIGRATION_FILE}...")
+    with open(os.path.join(ROOT, "migrations", MIGRATION_FILE)) as f:
+        execute_statements(cursor, f.read())
+
+
+def _scans(plan):
+    node = plan["Node Type"]
+    found = []
+    if "Scan" in node:
+        found.append(f"{node} ({plan['Index Name']})" if "Index Name" in plan else node)
+    for child in plan.get("Plans", []):
+        found.extend(_scans(child))
+    return found
+
+
+def measure(cursor, queries, runs):
+    results = {}
+    for scenario_id, query in queries:
+        query = query.strip().rstrip(";")
+        timings = []
+        for _ in range(runs + 1):  # first run warms the cache
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query)
+            plan_json = cursor.fetchone()[0]
+            if isinstance(plan_json, str):
+                plan_json = json.loads(plan_json)
+            timings.append(plan_json[0]["Execution Time"])
+        results[scenario_id] = {
+            "median_ms": statistics.median(timings[1:]),
+            "scans": ", ".join(dict.fromkeys(_scans(plan_json[0]["Plan"]))),
+        }
+    return results
+
+
+def print_report(queries, before, after):
+    print()
+    print(f"{'scenario':<38} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for scenario_id, _ in queries:
+        b, a = before[scenario_id], after[scenario_id]
+        speedup = b["median_ms"] / a["median_ms"] if a["median_ms"] else float("inf")
+        print(f"{scenario_id:<38} {b['median_ms']:>10.2f} {a['median_ms']:>10.2f} {speedup:>7.1f}x")
+        print(f"    before: {b['scans']}")
+        print(f"    after:  {a['scans']}")
+    total_before = sum(r["median_ms"] for r in before.values())
+    total_after = sum(r["median_ms"] for r in after.values())
+    print(f"\n{'total':<38} {total_before:>10.2f} {total_after:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--athletes", type=int, default=2_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="keep the bench schema afterwards")
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("❌ DATABASE_URL must point at a local PostgreSQL")
+        sys.exit(1)
+
+    queries = load_eval_queries()
+    print(f"📋 Replaying {len(queries)} eval queries as athlete {BENCH_ATHLETE_ID}")
+
+    conn = psycopg2.connect(database_url)
+    conn.autocommit = True  # CREATE INDEX CONCURRENTLY cannot run in a transaction
+    cursor = conn.cursor()
+    try:
+        build_synthetic_table(cursor, args.rows, args.athletes)
+        cursor.execute("SELECT set_config('app.current_user_id', %s, false)", (str(BENCH_ATHLETE_ID),))
+
+        before = measure(cursor, queries, args.runs)
+        apply_index_migration(cursor)
+        after = measure(cursor, queries, args.runs)
+        print_report(queries, before, after)
+    finally:
+        if not args.keep:
+            cursor.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(BENCH_SCHEMA)))
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the FastAPI services.
+
+Fires concurrent webhook "create" events and session lookups at the combined
+app (``stravatalk.main``) twice: once with every blocking call run inline on
+the event loop (how the endpoints behaved before ``async_executor``), and once
+through the bounded thread pools. Reports throughput, latency percentiles and
+the longest event-loop stall seen while the requests were in flight.
+
+Prerequisites:
+- A local PostgreSQL in DATABASE_URL with the migrations applied
+- Nothing else: Strava is replaced by a stub HTTP server with a fixed latency
+
+Usage:
+    DATABASE_URL=postgresql://localhost/stravatalk_bench python benchmarks/bench_async_endpoints.py \\
+        --requests 200 --concurrency 20 --strava-latency-ms 150
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+BENCH_ATHLETE_ID = 990000001
+BENCH_ACTIVITY_ID_START = 990000000000
+
+
+class StubStravaHandler(BaseHTTPRequestHandler):
+    """Answers GET /activities/<id> like Strava, after a fixed delay."""
+
+    latency = 0.15
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        activity_id = int(self.path.rstrip("/").rsplit("/", 1)[-1])
+        body = json.dumps({
+            "id": activity_id,
+            "name": f"Bench activity {activity_id}",
+            "distance": 10000.0,
+            "moving_time": 3000,
+            "elapsed_time": 3100,
+            "total_elevation_gain": 50.0,
+            "type": "Run",
+            "start_date": "2024-06-01T07:00:00Z",
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_strava(latency_ms):
+    StubStravaHandler.latency = latency_ms / 1000.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubStravaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def seed_database(db_connection):
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO user_tokens (athlete_id, access_token, refresh_token, expires_at, scope)
+            VALUES (%s, 'bench-access', 'bench-refresh', %s, 'read,activity:read_all')
+            ON CONFLICT (athlete_id) DO UPDATE SET expires_at = EXCLUDED.expires_at
+        """, (BENCH_ATHLETE_ID, int(time.time()) + 86400))
+        conn.commit()
+
+
+def cleanup_database(db_connection):
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM activities WHERE athlete_id = %s", (BENCH_ATHLETE_ID,))
+        cursor.execute("DELETE FROM user_tokens WHERE athlete_id = %s", (BENCH_ATHLETE_ID,))
+        cursor.execute("DELETE FROM athlete_data_versions WHERE athlete_id = %s", (BENCH_ATHLETE_ID,))
+        cursor.execute("DELETE FROM athlete_stats WHERE athlete_id = %s", (BENCH_ATHLETE_ID,))
+        for table in ("activity_daily_rollups", "activity_weekly_rollups", "activity_monthly_rollups"):
+            cursor.execute(f"DELETE FROM {table} WHERE athlete_id = %s", (BENCH_ATHLETE_ID,))
+        conn.commit()
+
+
+async def _inline(func, *args, **kwargs):
+    return func(*args, **kwargs)
+
+
+def set_blocking_mode(blocking):
+    """Swap the executor helpers for inline calls to reproduce the old behaviour."""
+    from stravatalk import webhook_handler, auth_server, oauth_server
+    from stravatalk.utils import async_executor, strava_client
+
+    for module in (webhook_handler, auth_server, oauth_server):
+        module.run_db = _inline if blocking else async_executor.run_db
+        module.run_http = _inline if blocking else async_executor.run_http
+    # Strava API calls go through the shared client's async variant
+    strava_client.run_http = _inline if blocking else async_executor.run_http
+
+
+async def measure_loop_stall(stop_event, interval=0.01):
+    """Largest delay between when a timer should fire and when it did."""
+    worst = 0.0
+    while not stop_event.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run_round(app, total_requests, concurrency, first_activity_id):
+    transport = httpx.ASGITransport(app=app)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    failures = 0
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            nonlocal failures
+            async with semaphore:
+                start = time.perf_counter()
+                if i % 2 == 0:
+                    response = await client.post("/webhook", json={
+                        "object_type": "activity",
+                        "aspect_type": "create",
+                        "object_id": first_activity_id + i,
+                        "owner_id": BENCH_ATHLETE_ID,
+                        "updates": {},
+                    })
+                    ok = response.status_code == 200
+                else:
+                    response = await client.get("/auth/session-info", params={"session_token": "bench-no-such-session"})
+                    ok = response.status_code == 401
+                latencies.append(time.perf_counter() - start)
+                if not ok:
+                    failures += 1
+
+        stop = asyncio.Event()
+        stall_task = asyncio.create_task(measure_loop_stall(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total_requests)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        max_stall = await stall_task
+
+    latencies.sort()
+    return {
+        "requests": total_requests,
+        "failures": failures,
+        "elapsed_s": elapsed,
+        "throughput_rps": total_requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "max_loop_stall_ms": max_stall * 1000,
+    }
+
+
+def print_round(label, result):
+    print(
+        f"{label:<10} {result['throughput_rps']:8.1f} req/s  "
+        f"p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms  "
+        f"max loop stall {result['max_loop_stall_ms']:7.1f} ms  "
+        f"failures {result['failures']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--strava-latency-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    if not os.getenv("DATABASE_URL"):
+        print("❌ DATABASE_URL must point at a local PostgreSQL with the migrations applied")
+        sys.exit(1)
+
+    stub = start_stub_strava(args.strava_latency_ms)
+    os.environ["STRAVA_API_URL"] = f"http://127.0.0.1:{stub.server_port}"
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+    # Imported after STRAVA_API_URL is set so the Strava client picks up the stub
+    from stravatalk.main import app
+    from stravatalk.utils.db_pool import db_connection, close_pool
+    from stravatalk.utils.async_executor import shutdown_executors
+
+    seed_database(db_connection)
+    print(f"🏁 {args.requests} requests, concurrency {args.concurrency}, "
+          f"stub Strava latency {args.strava_latency_ms:.0f} ms")
+    try:
+        set_blocking_mode(True)
+        print_round("blocking", asyncio.run(run_round(app, args.requests, args.concurrency, BENCH_ACTIVITY_ID_START)))
+
+        set_blocking_mode(False)
+        print_round("executor", asyncio.run(run_round(
+            app, args.requests, args.concurrency, BENCH_ACTIVITY_ID_START + args.requests
+        )))
+    finally:
+        cleanup_database(db_connection)
+        shutdown_executors()
+        close_pool()
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
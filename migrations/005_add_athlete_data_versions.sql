@@ -0,0 +1,13 @@
+-- Migration: Add per-athlete data version counter
+-- Every write to an athlete's activities bumps their version in the same
+-- transaction, so cached query results can be reused until the data changes.
+-- last_write_lsn is the primary's WAL position recorded once that write has
+-- committed (NULL until then); the read-replica guard only sends the
+-- athlete's queries to a replica that has replayed past it.
+
+CREATE TABLE IF NOT EXISTS athlete_data_versions (
+    athlete_id BIGINT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    last_write_lsn PG_LSN,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
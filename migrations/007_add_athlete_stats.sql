@@ -0,0 +1,46 @@
+-- Migration: Add incrementally maintained per-athlete activity statistics
+-- One row per (athlete, activity type). The webhook handlers and the sync
+-- service adjust these rows in the same transaction as each activity write,
+-- so the UI can show counts and totals without scanning activities.
+
+CREATE TABLE IF NOT EXISTS athlete_stats (
+    athlete_id BIGINT NOT NULL,
+    type TEXT NOT NULL,
+    activity_count INTEGER NOT NULL DEFAULT 0,
+    total_distance DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_moving_time BIGINT NOT NULL DEFAULT 0,
+    total_elevation_gain DOUBLE PRECISION NOT NULL DEFAULT 0,
+    first_activity_at TIMESTAMPTZ,
+    last_activity_at TIMESTAMPTZ,
+    last_write_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (athlete_id, type)
+);
+
+-- Backfill from existing activities
+INSERT INTO athlete_stats (
+    athlete_id, type, activity_count, total_distance, total_moving_time,
+    total_elevation_gain, first_activity_at, last_activity_at
+)
+SELECT
+    athlete_id,
+    COALESCE(type, ''),
+    COUNT(*),
+    COALESCE(SUM(distance), 0),
+    COALESCE(SUM(moving_time), 0),
+    COALESCE(SUM(total_elevation_gain), 0),
+    MIN(start_date::timestamptz),
+    MAX(start_date::timestamptz)
+FROM activities
+WHERE athlete_id IS NOT NULL
+GROUP BY athlete_id, COALESCE(type, '')
+ON CONFLICT (athlete_id, type) DO NOTHING;
+
+-- Same isolation as activities
+ALTER TABLE athlete_stats ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY user_athlete_stats_policy ON athlete_stats
+    FOR ALL
+    TO PUBLIC
+    USING (athlete_id = current_setting('app.current_user_id', true)::integer);
+
+GRANT SELECT, INSERT, UPDATE, DELETE ON athlete_stats TO PUBLIC;
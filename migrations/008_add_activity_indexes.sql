@@ -0,0 +1,17 @@
+-- migration: no-transaction
+-- Migration: Index activities for athlete-scoped time-range queries
+-- Nearly every generated query is "RLS on athlete_id + optional type filter
+-- + range on start_date". CONCURRENTLY builds the indexes without blocking
+-- webhook and sync writes, which is why this file runs outside a transaction.
+-- If a build is interrupted it leaves an INVALID index behind; drop it and
+-- re-run this migration.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_activities_athlete_start_date
+    ON activities (athlete_id, start_date);
+
+-- Covers the usual aggregates (counts, distance/time sums) with index-only scans
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_activities_athlete_type_start_date
+    ON activities (athlete_id, type, start_date)
+    INCLUDE (distance, moving_time, elapsed_time, total_elevation_gain);
+
+ANALYZE activities;
@@ -0,0 +1,117 @@
+-- Migration: Typed, year-partitioned activities table (step 1 of an online swap)
+--
+-- activities.start_date is TEXT, so date filters need casts and cannot prune.
+-- This creates activities_partitioned with start_date TIMESTAMPTZ (plus
+-- start_date_local), range-partitioned by year, and a trigger that mirrors
+-- every write on activities into it. Nothing reads the new table yet.
+--
+-- Then run:  python migrations/backfill_partitioned_activities.py
+-- which copies existing rows in small batches and swaps the tables in one
+-- short transaction (see that script for details).
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'activities'::regclass) THEN
+        RAISE EXCEPTION 'activities is already partitioned';
+    END IF;
+END $$;
+
+-- Written by the app from now on, so both tables have it
+ALTER TABLE activities ADD COLUMN IF NOT EXISTS start_date_local TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS activities_partitioned (
+    id BIGINT NOT NULL,
+    name TEXT,
+    distance REAL,
+    moving_time INTEGER,
+    elapsed_time INTEGER,
+    total_elevation_gain REAL,
+    type TEXT,
+    start_date TIMESTAMPTZ NOT NULL,
+    athlete_id BIGINT,
+    start_date_local TIMESTAMP,
+    -- The partition key must be part of every unique constraint
+    PRIMARY KEY (id, start_date)
+) PARTITION BY RANGE (start_date);
+
+-- One partition per year since Strava launched; later years land in the default
+DO $$
+DECLARE
+    year INTEGER;
+BEGIN
+    FOR year IN 2009..2035 LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF activities_partitioned
+                 FOR VALUES FROM (%L) TO (%L)',
+            'activities_y' || year,
+            make_timestamptz(year, 1, 1, 0, 0, 0, 'UTC'),
+            make_timestamptz(year + 1, 1, 1, 0, 0, 0, 'UTC')
+        );
+    END LOOP;
+END $$;
+
+CREATE TABLE IF NOT EXISTS activities_default PARTITION OF activities_partitioned DEFAULT;
+
+-- Same access paths as migration 008, created on each partition
+CREATE INDEX IF NOT EXISTS idx_activities_part_athlete_start_date
+    ON activities_partitioned (athlete_id, start_date);
+
+CREATE INDEX IF NOT EXISTS idx_activities_part_athlete_type_start_date
+    ON activities_partitioned (athlete_id, type, start_date)
+    INCLUDE (distance, moving_time, elapsed_time, total_elevation_gain);
+
+-- Lookups by id alone (webhook updates/deletes) check each partition's index
+CREATE INDEX IF NOT EXISTS idx_activities_part_id
+    ON activities_partitioned (id);
+
+-- start_date as TIMESTAMPTZ, or NULL if it is missing or not a timestamp.
+-- Such rows cannot go into the partitioned table (start_date is its key).
+CREATE OR REPLACE FUNCTION activity_start_date_or_null(start_date TEXT) RETURNS TIMESTAMPTZ AS $$
+BEGIN
+    RETURN start_date::timestamptz;
+EXCEPTION WHEN data_exception THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Dual write: keep activities_partitioned in step with activities until the swap.
+-- A row without a usable start_date is skipped (with a warning) rather than
+-- failing the app's write; the backfill reports such rows before the swap.
+CREATE OR REPLACE FUNCTION mirror_activity_to_partitioned() RETURNS TRIGGER AS $$
+DECLARE
+    start_at TIMESTAMPTZ;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM activities_partitioned WHERE id = OLD.id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        start_at := activity_start_date_or_null(NEW.start_date);
+        IF start_at IS NULL THEN
+            RAISE WARNING 'activity % has no usable start_date (%), not mirrored', NEW.id, NEW.start_date;
+            RETURN NULL;
+        END IF;
+        INSERT INTO activities_partitioned (
+            id, name, distance, moving_time, elapsed_time, total_elevation_gain,
+            type, start_date, athlete_id, start_date_local
+        ) VALUES (
+            NEW.id, NEW.name, NEW.distance, NEW.moving_time, NEW.elapsed_time, NEW.total_elevation_gain,
+            NEW.type, start_at, NEW.athlete_id, NEW.start_date_local
+        )
+        ON CONFLICT (id, start_date) DO UPDATE SET
+            name = EXCLUDED.name,
+            distance = EXCLUDED.distance,
+            moving_time = EXCLUDED.moving_time,
+            elapsed_time = EXCLUDED.elapsed_time,
+            total_elevation_gain = EXCLUDED.total_elevation_gain,
+            type = EXCLUDED.type,
+            athlete_id = EXCLUDED.athlete_id,
+            start_date_local = EXCLUDED.start_date_local;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS activities_mirror_to_partitioned ON activities;
+CREATE TRIGGER activities_mirror_to_partitioned
+    AFTER INSERT OR UPDATE OR DELETE ON activities
+    FOR EACH ROW EXECUTE FUNCTION mirror_activity_to_partitioned();
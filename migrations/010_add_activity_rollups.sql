@@ -0,0 +1,123 @@
+-- Migration: Per-athlete daily/weekly/monthly rollups per activity type
+-- Counts and totals are additive, so the webhook handlers and the sync
+-- service adjust them in the same transaction as each activity write. The SQL
+-- agent answers aggregate questions from these few rows instead of scanning
+-- every activity. Periods follow the athlete's local calendar
+-- (start_date_local, falling back to UTC for rows synced without it).
+
+CREATE TABLE IF NOT EXISTS activity_daily_rollups (
+    athlete_id BIGINT NOT NULL,
+    type TEXT NOT NULL,
+    period_start DATE NOT NULL,  -- the activity date
+    activity_count INTEGER NOT NULL DEFAULT 0,
+    total_distance DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_moving_time BIGINT NOT NULL DEFAULT 0,
+    total_elapsed_time BIGINT NOT NULL DEFAULT 0,
+    total_elevation_gain DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (athlete_id, period_start, type)
+);
+
+INSERT INTO activity_daily_rollups (
+    athlete_id, type, period_start, activity_count, total_distance,
+    total_moving_time, total_elapsed_time, total_elevation_gain
+)
+SELECT
+    athlete_id,
+    COALESCE(type, ''),
+    date_trunc('day', COALESCE(start_date_local, start_date::timestamptz AT TIME ZONE 'UTC'))::date,
+    COUNT(*),
+    COALESCE(SUM(distance), 0),
+    COALESCE(SUM(moving_time), 0),
+    COALESCE(SUM(elapsed_time), 0),
+    COALESCE(SUM(total_elevation_gain), 0)
+FROM activities
+WHERE athlete_id IS NOT NULL
+GROUP BY 1, 2, 3
+ON CONFLICT (athlete_id, period_start, type) DO NOTHING;
+
+ALTER TABLE activity_daily_rollups ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY user_activity_daily_rollups_policy ON activity_daily_rollups
+    FOR ALL
+    TO PUBLIC
+    USING (athlete_id = current_setting('app.current_user_id', true)::integer);
+
+GRANT SELECT, INSERT, UPDATE, DELETE ON activity_daily_rollups TO PUBLIC;
+
+CREATE TABLE IF NOT EXISTS activity_weekly_rollups (
+    athlete_id BIGINT NOT NULL,
+    type TEXT NOT NULL,
+    period_start DATE NOT NULL,  -- Monday of the ISO week
+    activity_count INTEGER NOT NULL DEFAULT 0,
+    total_distance DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_moving_time BIGINT NOT NULL DEFAULT 0,
+    total_elapsed_time BIGINT NOT NULL DEFAULT 0,
+    total_elevation_gain DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (athlete_id, period_start, type)
+);
+
+INSERT INTO activity_weekly_rollups (
+    athlete_id, type, period_start, activity_count, total_distance,
+    total_moving_time, total_elapsed_time, total_elevation_gain
+)
+SELECT
+    athlete_id,
+    COALESCE(type, ''),
+    date_trunc('week', COALESCE(start_date_local, start_date::timestamptz AT TIME ZONE 'UTC'))::date,
+    COUNT(*),
+    COALESCE(SUM(distance), 0),
+    COALESCE(SUM(moving_time), 0),
+    COALESCE(SUM(elapsed_time), 0),
+    COALESCE(SUM(total_elevation_gain), 0)
+FROM activities
+WHERE athlete_id IS NOT NULL
+GROUP BY 1, 2, 3
+ON CONFLICT (athlete_id, period_start, type) DO NOTHING;
+
+ALTER TABLE activity_weekly_rollups ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY user_activity_weekly_rollups_policy ON activity_weekly_rollups
+    FOR ALL
+    TO PUBLIC
+    USING (athlete_id = current_setting('app.current_user_id', true)::integer);
+
+GRANT SELECT, INSERT, UPDATE, DELETE ON activity_weekly_rollups TO PUBLIC;
+
+CREATE TABLE IF NOT EXISTS activity_monthly_rollups (
+    athlete_id BIGINT NOT NULL,
+    type TEXT NOT NULL,
+    period_start DATE NOT NULL,  -- first day of the month
+    activity_count INTEGER NOT NULL DEFAULT 0,
+    total_distance DOUBLE PRECISION NOT NULL DEFAULT 0,
+    total_moving_time BIGINT NOT NULL DEFAULT 0,
+    total_elapsed_time BIGINT NOT NULL DEFAULT 0,
+    total_elevation_gain DOUBLE PRECISION NOT NULL DEFAULT 0,
+    PRIMARY KEY (athlete_id, period_start, type)
+);
+
+INSERT INTO activity_monthly_rollups (
+    athlete_id, type, period_start, activity_count, total_distance,
+    total_moving_time, total_elapsed_time, total_elevation_gain
+)
+SELECT
+    athlete_id,
+    COALESCE(type, ''),
+    date_trunc('month', COALESCE(start_date_local, start_date::timestamptz AT TIME ZONE 'UTC'))::date,
+    COUNT(*),
+    COALESCE(SUM(distance), 0),
+    COALESCE(SUM(moving_time), 0),
+    COALESCE(SUM(elapsed_time), 0),
+    COALESCE(SUM(total_elevation_gain), 0)
+FROM activities
+WHERE athlete_id IS NOT NULL
+GROUP BY 1, 2, 3
+ON CONFLICT (athlete_id, period_start, type) DO NOTHING;
+
+ALTER TABLE activity_monthly_rollups ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY user_activity_monthly_rollups_policy ON activity_monthly_rollups
+    FOR ALL
+    TO PUBLIC
+    USING (athlete_id = current_setting('app.current_user_id', true)::integer);
+
+GRANT SELECT, INSERT, UPDATE, DELETE ON activity_monthly_rollups TO PUBLIC;
@@ -0,0 +1,21 @@
+-- Migration: Per-user high-water mark for incremental Strava syncs
+-- A completed sync records the newest activity it stored. Later syncs only
+-- ask Strava for activities that started after it (the `after` parameter),
+-- instead of walking the whole history again.
+
+ALTER TABLE user_sync_status
+    ADD COLUMN IF NOT EXISTS last_activity_start_date TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS last_activity_id BIGINT;
+
+-- Completed syncs start from the newest activity already stored
+UPDATE user_sync_status s
+SET last_activity_start_date = latest.last_activity_at
+FROM strava_connections c,
+     LATERAL (
+         SELECT MAX(last_activity_at) AS last_activity_at
+         FROM athlete_stats
+         WHERE athlete_id = c.athlete_id
+     ) latest
+WHERE c.user_id = s.user_id
+  AND s.sync_completed
+  AND s.last_activity_start_date IS NULL;
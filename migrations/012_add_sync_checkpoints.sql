@@ -0,0 +1,20 @@
+-- Migration: Resumable sync checkpoints
+-- Each committed page of a historical sync records how far the sync got, in
+-- the same transaction as the page itself. A sync that dies (closed browser
+-- tab, Strava 429, deploy) resumes from its checkpoint instead of re-fetching
+-- the pages it already stored.
+
+ALTER TABLE user_sync_status
+    -- The `after` cursor of the sync in progress (NULL for a full sync); page
+    -- numbers are only meaningful for the same listing
+    ADD COLUMN IF NOT EXISTS sync_after BIGINT,
+    -- Pages 1..sync_pages_done are stored
+    ADD COLUMN IF NOT EXISTS sync_pages_done INTEGER NOT NULL DEFAULT 0,
+    -- Activities newly stored by the sync in progress
+    ADD COLUMN IF NOT EXISTS sync_activities_stored INTEGER NOT NULL DEFAULT 0,
+    -- Newest activity stored so far, the watermark once the sync completes
+    ADD COLUMN IF NOT EXISTS sync_newest_start_date TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS sync_newest_activity_id BIGINT,
+    ADD COLUMN IF NOT EXISTS last_error TEXT,
+    -- Set when Strava's rate limit stopped the sync; no requests before then
+    ADD COLUMN IF NOT EXISTS next_request_at TIMESTAMPTZ;
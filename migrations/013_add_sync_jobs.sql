@@ -0,0 +1,37 @@
+-- Migration: Durable queue of historical sync jobs
+-- The Streamlit app only enqueues a sync and polls its progress; separate
+-- worker processes (python -m stravatalk.sync_worker) claim jobs with
+-- SELECT ... FOR UPDATE SKIP LOCKED and run them. A job outlives the browser
+-- session that started it, and a worker that dies stops heartbeating so its
+-- job is picked up again (resuming from the sync checkpoint).
+
+CREATE TABLE IF NOT EXISTS sync_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+    full_sync BOOLEAN NOT NULL DEFAULT FALSE,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_by TEXT,
+    heartbeat_at TIMESTAMPTZ,
+    progress_count INTEGER NOT NULL DEFAULT 0,
+    progress_message TEXT,
+    activities_synced INTEGER,
+    error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMPTZ,
+    finished_at TIMESTAMPTZ
+);
+
+-- At most one queued or running job per user; enqueueing again joins it
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_jobs_active_user
+    ON sync_jobs (user_id) WHERE status IN ('queued', 'running');
+
+-- Claim order for workers
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_queued
+    ON sync_jobs (run_after, id) WHERE status = 'queued';
+
+-- Latest job per user, for the UI
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_user_created
+    ON sync_jobs (user_id, created_at DESC);
@@ -0,0 +1,29 @@
+-- Migration: Durable queue of incoming Strava webhook events
+-- With WEBHOOK_PROCESSING=queue, POST /webhook only appends the raw event
+-- here and replies at once (Strava wants an answer within 2 seconds and
+-- redelivers otherwise). Worker processes (python -m stravatalk.webhook_worker)
+-- claim events with SELECT ... FOR UPDATE SKIP LOCKED and process them.
+-- Processed events are deleted; an event that keeps failing is moved to the
+-- 'dead' state with its last error, and can be retried by setting it back
+-- to 'queued'.
+
+CREATE TABLE IF NOT EXISTS webhook_events (
+    id BIGSERIAL PRIMARY KEY,
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'processing', 'dead')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_by TEXT,
+    locked_at TIMESTAMPTZ,
+    last_error TEXT,
+    received_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Claim order for workers
+CREATE INDEX IF NOT EXISTS idx_webhook_events_queued
+    ON webhook_events (run_after, id) WHERE status = 'queued';
+
+-- Events held by a worker, to find ones whose worker died
+CREATE INDEX IF NOT EXISTS idx_webhook_events_processing
+    ON webhook_events (locked_at) WHERE status = 'processing';
@@ -0,0 +1,38 @@
+-- Migration: Coalesce and deduplicate queued webhook events
+-- Events are now claimed per object: a worker takes every pending event for
+-- the same activity (or athlete) at once and merges them (create + updates is
+-- one fetch; anything followed by a delete is just the delete). Processed
+-- events are kept as 'done' for WEBHOOK_EVENT_RETENTION_HOURS so that Strava
+-- redeliveries of an event already applied are recognised by their
+-- dedup_key and ignored.
+
+ALTER TABLE webhook_events
+    ADD COLUMN IF NOT EXISTS owner_id BIGINT,
+    ADD COLUMN IF NOT EXISTS object_type TEXT,
+    ADD COLUMN IF NOT EXISTS object_id BIGINT,
+    ADD COLUMN IF NOT EXISTS aspect_type TEXT,
+    -- Identifies a delivery of the same Strava event (NULL for older rows)
+    ADD COLUMN IF NOT EXISTS dedup_key TEXT,
+    ADD COLUMN IF NOT EXISTS processed_at TIMESTAMPTZ;
+
+UPDATE webhook_events SET
+    owner_id = (payload->>'owner_id')::BIGINT,
+    object_type = payload->>'object_type',
+    object_id = (payload->>'object_id')::BIGINT,
+    aspect_type = payload->>'aspect_type'
+WHERE object_id IS NULL;
+
+ALTER TABLE webhook_events DROP CONSTRAINT IF EXISTS webhook_events_status_check;
+ALTER TABLE webhook_events ADD CONSTRAINT webhook_events_status_check
+    CHECK (status IN ('queued', 'processing', 'done', 'dead'));
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_webhook_events_dedup
+    ON webhook_events (dedup_key);
+
+-- Pending events of one object, claimed together
+CREATE INDEX IF NOT EXISTS idx_webhook_events_object
+    ON webhook_events (object_type, object_id) WHERE status IN ('queued', 'processing');
+
+-- Purge of processed events past their retention
+CREATE INDEX IF NOT EXISTS idx_webhook_events_done
+    ON webhook_events (processed_at) WHERE status = 'done';
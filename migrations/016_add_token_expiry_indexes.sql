@@ -0,0 +1,19 @@
+-- Migration: Index Strava tokens by expiry for the background refresher
+-- The token refresh scheduler (utils/token_refresh.py) periodically picks the
+-- tokens expiring within its horizon, soonest first, and refreshes them before
+-- a webhook or sync has to. user_tokens used to be created on first use by the
+-- OAuth server; it is declared here as well so the index can be built.
+
+CREATE TABLE IF NOT EXISTS user_tokens (
+    id SERIAL PRIMARY KEY,
+    athlete_id INTEGER UNIQUE NOT NULL,
+    access_token TEXT NOT NULL,
+    refresh_token TEXT NOT NULL,
+    expires_at INTEGER NOT NULL,
+    scope TEXT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_tokens_expires_at ON user_tokens (expires_at);
+CREATE INDEX IF NOT EXISTS idx_strava_connections_expires_at ON strava_connections (expires_at);
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Online backfill and swap for the partitioned activities table (migration 009).
+
+Run after 009_partition_activities.sql. While it runs, the app keeps writing
+to ``activities`` and the 009 trigger mirrors every write into
+``activities_partitioned``.
+
+1. Backfill: existing rows are copied in id order, ``--batch-size`` rows per
+   short transaction. Each batch locks only its own source rows
+   (``FOR UPDATE``), so a concurrent webhook update or delete of one of them
+   waits a few milliseconds instead of racing the copy. No table-level lock
+   is taken. Rows whose ``start_date`` is missing or not a timestamp cannot
+   be partitioned; they are skipped, counted and listed.
+2. Verify: row counts and id checksums of both tables are compared in one
+   snapshot, leaving out the rows without a usable ``start_date``.
+3. Swap: one transaction takes a brief exclusive lock (bounded by
+   ``lock_timeout``, retried if busy). It drops the mirror trigger, renames
+   ``activities`` to ``activities_legacy`` and ``activities_partitioned`` to
+   ``activities``, and re-creates the RLS policy and grants. The swap is
+   recorded in schema_migrations, which changes the schema marker, so running
+   apps rebuild their schema cache within ``SCHEMA_CACHE_RECHECK_SECONDS``.
+
+``activities_legacy`` is kept but no longer written; skipped rows are only
+there. Drop it once the new table has been checked.
+
+Usage:
+    python migrations/backfill_partitioned_activities.py [--batch-size 5000] [--pause 0.05] [--no-swap]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import psycopg2
+import psycopg2.errors
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from run_migration import record_migration
+
+load_dotenv()
+
+SWAP_VERSION = "009_partition_activities_swap"
+
+COPY_BATCH_SQL = """
+    WITH batch AS (
+        SELECT id, name, distance, moving_time, elapsed_time, total_elevation_gain,
+               type, activity_start_date_or_null(start_date) AS start_at, athlete_id, start_date_local
+        FROM activities
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE
+    ), copied AS (
+        INSERT INTO activities_partitioned (
+            id, name, distance, moving_time, elapsed_time, total_elevation_gain,
+            type, start_date, athlete_id, start_date_local
+        )
+        SELECT id, name, distance, moving_time, elapsed_time, total_elevation_gain,
+               type, start_at, athlete_id, start_date_local
+        FROM batch
+        WHERE start_at IS NOT NULL
+        -- Already there means the trigger mirrored a newer write; keep it
+        ON CONFLICT (id, start_date) DO NOTHING
+    )
+    SELECT MAX(id), COUNT(*), COALESCE(array_agg(id ORDER BY id) FILTER (WHERE start_at IS NULL), '{}')
+    FROM batch
+"""
+
+VERIFY_SQL = """
+    WITH source AS (
+        SELECT id FROM activities WHERE activity_start_date_or_null(start_date) IS NOT NULL
+    )
+    SELECT
+        (SELECT COUNT(*) FROM source),
+        (SELECT COUNT(*) FROM activities_partitioned),
+        (SELECT COALESCE(SUM(id), 0) FROM source),
+        (SELECT COALESCE(SUM(id), 0) FROM activities_partitioned),
+        (SELECT COUNT(*) FROM activities) - (SELECT COUNT(*) FROM source)
+"""
+
+# Skipped ids listed in the backfill summary
+SKIPPED_IDS_SHOWN = 20
+
+SWAP_SQL = """
+    DROP TRIGGER activities_mirror_to_partitioned ON activities;
+    ALTER TABLE activities RENAME TO activities_legacy;
+    ALTER TABLE activities_partitioned RENAME TO activities;
+
+    ALTER TABLE activities ENABLE ROW LEVEL SECURITY;
+    CREATE POLICY user_activities_policy ON activities
+        FOR ALL
+        TO PUBLIC
+        USING (athlete_id = current_setting('app.current_user_id', true)::integer);
+    GRANT SELECT, INSERT, UPDATE, DELETE ON activities TO PUBLIC;
+"""
+
+
+def is_partitioned(cursor):
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'activities'::regclass)")
+    return cursor.fetchone()[0]
+
+
+def backfill(conn, batch_size, pause, start_id=0):
+    """Copy existing activities in id order, one short transaction per batch."""
+    last_id = start_id
+    copied_total = 0
+    skipped_ids = []
+    started = time.monotonic()
+
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(COPY_BATCH_SQL, (last_id, batch_size))
+            max_id, count, skipped = cursor.fetchone()
+        conn.commit()
+
+        if not count:
+            break
+        last_id = max_id
+        copied_total += count - len(skipped)
+        skipped_ids.extend(skipped)
+        rate = copied_total / max(time.monotonic() - started, 1e-6)
+        print(f"📦 Copied {copied_total:,} rows (through id {last_id}, {rate:,.0f} rows/s)")
+        if pause:
+            time.sleep(pause)
+
+    print(f"✅ Backfill complete: {copied_total:,} rows")
+    if skipped_ids:
+        shown = ", ".join(str(activity_id) for activity_id in skipped_ids[:SKIPPED_IDS_SHOWN])
+        more = f" and {len(skipped_ids) - SKIPPED_IDS_SHOWN:,} more" if len(skipped_ids) > SKIPPED_IDS_SHOWN else ""
+        print(f"⚠️ Skipped {len(skipped_ids):,} rows without a usable start_date "
+              f"(ids {shown}{more}); they stay in activities_legacy after the swap")
+    return skipped_ids
+
+
+def verify(conn):
+    """Compare both tables in a single snapshot."""
+    with conn.cursor() as cursor:
+        cursor.execute(VERIFY_SQL)
+        old_count, new_count, old_sum, new_sum, unpartitionable = cursor.fetchone()
+    conn.commit()
+
+    if unpartitionable:
+        print(f"⚠️ {unpartitionable:,} rows in activities have no usable start_date and are not compared")
+
+    if (old_count, old_sum) != (new_count, new_sum):
+        print(f"❌ Tables differ: activities={old_count:,} rows, activities_partitioned={new_count:,} rows")
+        return False
+    print(f"✅ Tables match ({old_count:,} rows)")
+    return True
+
+
+def swap(conn, lock_timeout="5s", attempts=10):
+    """Swap the tables in one short transaction, retrying if the lock is busy."""
+    for attempt in range(1, attempts + 1):
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+                cursor.execute("LOCK TABLE activities, activities_partitioned IN ACCESS EXCLUSIVE MODE")
+                cursor.execute(SWAP_SQL)
+                record_migration(cursor, SWAP_VERSION)
+            conn.commit()
+            print("🔁 Swapped: activities is now partitioned (old table kept as activities_legacy)")
+            return True
+        except psycopg2.errors.LockNotAvailable:
+            conn.rollback()
+            print(f"⏳ Tables busy, retrying swap ({attempt}/{attempts})...")
+            time.sleep(1)
+    print("❌ Could not acquire the swap lock")
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill and swap in the partitioned activities table")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--pause", type=float, default=0.05, help="seconds to sleep between batches")
+    parser.add_argument("--start-id", type=int, default=0, help="resume after this activity id")
+    parser.add_argument("--no-swap", action="store_true", help="backfill and verify only")
+    args = parser.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("❌ DATABASE_URL environment variable not set")
+        sys.exit(1)
+
+    conn = psycopg2.connect(database_url)
+    try:
+        with conn.cursor() as cursor:
+            if is_partitioned(cursor):
+                print("✅ activities is already partitioned, nothing to do")
+                return
+        conn.commit()
+
+        backfill(conn, args.batch_size, args.pause, args.start_id)
+        if not verify(conn):
+            sys.exit(1)
+        if not args.no_swap and not swap(conn):
+            sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,40 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 load_dotenv()
 
+def record_migration(cursor, migration_file):
+    """Record an applied migration.
+
+    The number of recorded migrations and the latest ``applied_at`` are the
+    schema marker the app uses to decide when its cached table definitions
+    are stale, so re-applying a migration moves the marker too.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(255) PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT NOW()
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO schema_migrations (version) VALUES (%s)
+        ON CONFLICT (version) DO UPDATE SET applied_at = NOW()
+    """, (migration_file,))
+
+# Files starting with this line run statement by statement in autocommit mode
+# (needed for CREATE INDEX CONCURRENTLY, which cannot run in a transaction)
+NO_TRANSACTION_MARKER = "-- migration: no-transaction"
+
+def is_no_transaction(sql_content):
+    """Whether a migration must run outside a transaction block."""
+    return sql_content.lstrip().lower().startswith(NO_TRANSACTION_MARKER)
+
+def execute_statements(cursor, sql_content):
+    """Execute a migration one statement at a time."""
+    import sqlparse
+    
+    for statement in sqlparse.split(sql_content):
+        if sqlparse.format(statement, strip_comments=True).strip():
+            cursor.execute(statement)
+
 def run_migration(migration_file):
     """Run a SQL migration file."""
     database_url = os.getenv("DATABASE_URL")
@@ -32,7 +66,12 @@ def run_migration(migration_file):
         
         # Execute migration
         print(f"🚀 Running migration: {migration_file}")
-        cursor.execute(sql_content)
+        if is_no_transaction(sql_content):
+            conn.autocommit = True
+            execute_statements(cursor, sql_content)
+        else:
+            cursor.execute(sql_content)
+        record_migration(cursor, migration_file)
         conn.commit()
         
         print("✅ Migration completed successfully!")
@@ -2,10 +2,12 @@
 Simplified SQL agent using instructor directly.
 """
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel, Field
 import instructor
 
+from ..utils.schema_cache import render_schema_description
+
 
 class SQLAgentOutput(BaseModel):
     """Output schema for SQL generation."""
@@ -16,17 +18,12 @@ class SQLAgentOutput(BaseModel):
 def create_sql_agent(client: instructor.client, model: str = "gpt-4o-mini", current_date: str = None, **kwargs):
     """Creates a simplified SQL generation function using instructor directly."""
     
-    def generate_sql(query: str, table_definitions: List[Dict[str, Any]]) -> SQLAgentOutput:
+    def generate_sql(query: str, table_definitions: List[Dict[str, Any]], schema_description: Optional[str] = None) -> SQLAgentOutput:
         """Generate SQL query from natural language."""
         
-        # Build schema description
-        schema_description = ""
-        for table in table_definitions:
-            schema_description += f"\nTable: {table['name']}\n"
-            schema_description += f"Description: {table['description']}\n"
-            schema_description += "Columns:\n"
-            for col in table['columns']:
-                schema_description += f"  - {col['name']} ({col['type']}): {col['description']}\n"
+        # Build schema description unless the cached rendering was passed in
+        if schema_description is None:
+            schema_description = render_schema_description(table_definitions)
         
         # Add current date context if provided
         date_context = ""
@@ -42,10 +39,11 @@ RULES:
 - Use the exact column names from the schema above
 - Generate complete PostgreSQL queries with NO parameter placeholders
 - For count queries, use COUNT(*) or COUNT(column_name)
-- For date filtering, use start_date with proper date comparisons
+- For date filtering, use half-open ranges on start_date (e.g. start_date >= '2023-12-25' AND start_date < '2023-12-26'), never a cast or function on start_date, so only the matching partitions are read
 - Activity types are strings like 'Run', 'Swim', 'Ride'
 - For activity distance queries e.g. show my 5k runs. Acccount for the fact that GPS is innacurate and 1% in either direction e.g. 4950m to 5050m
 - If no time period is mentioned, assume it's across all the data
+- For counts, totals and averages per day, week, month or activity type, prefer the activity_*_rollups tables when they are in the schema: they hold a few pre-aggregated rows instead of every activity. Filter them with ranges on period_start (a local date) and add up the totals; average pace = SUM(total_moving_time) / SUM(total_distance). Use activities when individual activities, names or distance bands are needed
 
 UNIT CONVERSIONS (when appropriate):
 - Distance: meters to km with 'distance / 1000 AS distance_km'
@@ -55,6 +53,7 @@ UNIT CONVERSIONS (when appropriate):
 EXAMPLES:
 - "How many runs this year?" → SELECT COUNT(*) FROM activities WHERE type = 'Run' AND start_date >= '2025-01-01'
 - "My swim activities" → SELECT * FROM activities WHERE type = 'Swim'
+- "Running distance per month in 2024" → SELECT period_start, total_distance / 1000 AS distance_km FROM activity_monthly_rollups WHERE type = 'Run' AND period_start >= '2024-01-01' AND period_start < '2025-01-01' ORDER BY period_start
 - "Average run pace in Nov 23" → SELECT FLOOR(AVG(moving_time/distance*1000)/60)||':'||LPAD(ROUND(MOD(AVG(moving_time/distance*1000)::numeric,60))::text,2,'0')||'/km' FROM activities WHERE type='Run' AND start_date>='2023-11-01' AND start_date<'2023-12-01' AND distance>0;
 """
 
@@ -71,7 +70,7 @@ EXAMPLES:
     
     # Return an object that mimics the original agent interface
     class SimpleAgent:
-        def run(self, query: str, table_definitions: List[Dict[str, Any]]):
-            return generate_sql(query, table_definitions)
+        def run(self, query: str, table_definitions: List[Dict[str, Any]], schema_description: Optional[str] = None):
+            return generate_sql(query, table_definitions, schema_description)
     
     return SimpleAgent()
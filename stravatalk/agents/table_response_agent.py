@@ -16,6 +16,7 @@ class SQLResult(BaseModel):
     column_names: Optional[List[str]] = Field(None, description="Names of result columns")
     rows: Optional[List[Dict[str, Any]]] = Field(None, description="Result rows")
     row_count: Optional[int] = Field(None, description="Total number of rows returned")
+    row_count_is_lower_bound: bool = Field(False, description="Whether row_count is only a lower bound")
     has_visualization: bool = Field(False, description="Whether visualization was created")
 
 
@@ -73,7 +74,10 @@ Success: {sql_result.success}
 """
 
         if sql_result.success:
-            context += f"Results: {sql_result.row_count} rows returned\n"
+            if sql_result.row_count_is_lower_bound:
+                context += f"Results: at least {sql_result.row_count} rows (the full count was not computed)\n"
+            else:
+                context += f"Results: {sql_result.row_count} rows returned\n"
             if sql_result.rows:
                 context += f"Column names: {sql_result.column_names}\n"
                 # Show first few rows for context
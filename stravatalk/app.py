@@ -86,56 +86,48 @@ def show_sync_interface(user_id: int, sync_service):
     else:
         st.info("📊 No activities found. Let's fetch your complete Strava history!")
     
-    col1, col2 = st.columns([1, 1])
+    from .utils.sync_jobs import enqueue_sync_job, get_latest_sync_job
     
-    with col1:
-        if st.button("🚀 Start Sync", type="primary", use_container_width=True):
-            st.session_state.sync_started = True
-            st.rerun()
-    
-    with col2:
-        if st.button("⏭️ Skip Sync", use_container_width=True):
-            # Mark as completed to skip sync
-            sync_service._complete_sync_status(user_id, current_count)
-            st.success("✅ Sync skipped. You can sync later from settings.")
-            st.rerun()
+    # The sync runs in the background worker; this page only enqueues and polls it
+    job = get_latest_sync_job(user_id)
+    active = job is not None and job["status"] in ("queued", "running")
     
-    # Show sync progress if started
-    if st.session_state.get("sync_started", False):
-        st.markdown("### 🔄 Syncing Activities...")
+    if not active:
+        col1, col2 = st.columns([1, 1])
         
-        # Create progress containers
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        def update_progress(count, message):
-            """Update progress bar and status text."""
-            # Estimate progress (we don't know total upfront)
-            estimated_total = max(100, count + 50)  # Rough estimate
-            progress = min(count / estimated_total, 0.95)  # Never reach 100% until done
-            progress_bar.progress(progress)
-            status_text.text(message)
+        with col1:
+            if st.button("🚀 Start Sync", type="primary", use_container_width=True):
+                enqueue_sync_job(user_id)
+                st.rerun()
         
-        # Run the sync
-        with st.spinner("Fetching your activities from Strava..."):
-            result = sync_service.sync_historical_activities(user_id, update_progress)
+        with col2:
+            if st.button("⏭️ Skip Sync", use_container_width=True):
+                # Mark as completed to skip sync
+                sync_service._complete_sync_status(user_id, current_count)
+                st.success("✅ Sync skipped. You can sync later from settings.")
+                st.rerun()
         
-        if result["success"]:
-            progress_bar.progress(1.0)
-            status_text.text(f"✅ Completed! Synced {result['activities_synced']} activities.")
-            st.success(f"🎉 Successfully synced {result['activities_synced']} activities!")
-            st.balloons()
-            
-            # Clear sync state and refresh
-            if 'sync_started' in st.session_state:
-                del st.session_state.sync_started
-            
-            time.sleep(2)  # Show success message briefly
-            st.rerun()
-        else:
-            st.error(f"❌ Sync failed: {result.get('error', 'Unknown error')}")
-            if 'sync_started' in st.session_state:
-                del st.session_state.sync_started
+        if job is not None and job["status"] == "failed":
+            st.error(f"❌ Sync failed: {job.get('error') or 'Unknown error'}")
+        return
+    
+    # Show sync progress; refreshing the browser no longer interrupts the sync
+    st.markdown("### 🔄 Syncing Activities...")
+    count = job["progress_count"] or 0
+    # Estimate progress (we don't know total upfront)
+    estimated_total = max(100, count + 50)  # Rough estimate
+    st.progress(min(count / estimated_total, 0.95))  # Never reach 100% until done
+    if job["status"] == "queued":
+        message = "Waiting for a sync worker..."
+        if job.get("error"):
+            message += f" (retrying after: {job['error']})"
+        st.text(message)
+    else:
+        st.text(job["progress_message"] or "Fetching your activities from Strava...")
+    st.caption("You can close this page; the sync continues in the background.")
+    
+    time.sleep(2)
+    st.rerun()
 
 def create_interface():
     """Create the Streamlit interface for trackin.pro."""
@@ -238,6 +230,13 @@ User Email: {user_email}
     # Add disconnect Strava button (only if not in dev mode)
     if not dev_mode:
         st.sidebar.markdown("---")
+        if st.sidebar.button("🔄 Sync New Activities", type="secondary"):
+            # Incremental: only activities newer than the last sync are fetched
+            from .utils.sync_jobs import enqueue_sync_job
+            
+            job = enqueue_sync_job(user_id)
+            st.sidebar.info(f"🔄 Sync {job['status']}, new activities will appear shortly")
+
         if st.sidebar.button("🔗 Disconnect Strava Account", type="secondary"):
             from .utils.auth_utils import disconnect_strava_account
             
@@ -460,11 +459,15 @@ def handle_query(user_query):
         if result["success"]:
             from .utils.memory import create_data_summary
             
+            # Displayed data is capped, so count from the full result size
+            result_count = result.get("row_count") or (len(result["data"]) if result.get("data") is not None else 0)
+            
             # Create summary of the results
             data_summary = create_data_summary(
                 result.get("data"), 
                 str(classification.query_type), 
-                len(result["data"]) if result.get("data") is not None else 0
+                result_count,
+                result.get("row_count_is_lower_bound", False),
             )
             
             # Add to memory
@@ -472,13 +475,13 @@ def handle_query(user_query):
                 user_query=user_query,
                 sql_query=result.get("sql_query"),
                 data_summary=data_summary,
-                result_count=len(result["data"]) if result.get("data") is not None else 0,
+                result_count=result_count,
                 query_type=str(classification.query_type)
             )
             
             # Add data summary and metadata to assistant message for persistence
             assistant_message["data_summary"] = data_summary
-            assistant_message["result_count"] = len(result["data"]) if result.get("data") is not None else 0
+            assistant_message["result_count"] = result_count
             assistant_message["query_type"] = str(classification.query_type)
         
         # Save conversation to database
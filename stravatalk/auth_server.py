@@ -20,6 +20,7 @@ from .utils.auth_utils import (
     cleanup_expired_tokens
 )
 from .utils.email_service import send_magic_link_email, send_welcome_email
+from .utils.async_executor import run_db, run_http
 
 load_dotenv()
 
@@ -55,14 +56,14 @@ async def send_magic_link(request_data: MagicLinkRequest):
         
         # Store token in database
         print(f"💾 Storing token in database...")
-        if not store_magic_token(email, magic_token):
+        if not await run_db(store_magic_token, email, magic_token):
             print(f"❌ Failed to store magic token in database")
             raise HTTPException(status_code=500, detail="Failed to store magic token")
         print(f"✅ Token stored in database successfully")
         
         # Send email
         print(f"📧 Attempting to send email...")
-        email_result = send_magic_link_email(email, magic_token)
+        email_result = await run_http(send_magic_link_email, email, magic_token)
         print(f"📧 Email send result: {email_result}")
         
         if not email_result:
@@ -89,20 +90,20 @@ async def verify_magic_link(token: str = Query(...)):
     """Verify a magic link token and create a user session."""
     try:
         # Clean up expired tokens first
-        cleanup_expired_tokens()
+        await run_db(cleanup_expired_tokens)
         
         # Validate and consume the magic token
-        email = validate_and_consume_magic_token(token)
+        email = await run_db(validate_and_consume_magic_token, token)
         if not email:
             raise HTTPException(status_code=400, detail="Invalid or expired token")
         
         # Get or create user
-        user_id = get_or_create_user(email)
+        user_id = await run_db(get_or_create_user, email)
         if not user_id:
             raise HTTPException(status_code=500, detail="Failed to create user account")
         
         # Create session
-        session_token = create_user_session(user_id)
+        session_token = await run_db(create_user_session, user_id)
         if not session_token:
             raise HTTPException(status_code=500, detail="Failed to create session")
         
@@ -123,7 +124,7 @@ async def verify_magic_link(token: str = Query(...)):
 async def logout(session_token: str):
     """Logout user by invalidating their session."""
     try:
-        success = invalidate_session(session_token)
+        success = await run_db(invalidate_session, session_token)
         return {
             "success": success,
             "message": "Logged out successfully" if success else "Session not found"
@@ -136,7 +137,7 @@ async def logout(session_token: str):
 async def get_session_info(session_token: str = Query(...)):
     """Get information about the current session."""
     try:
-        session_info = validate_session_token(session_token)
+        session_info = await run_db(validate_session_token, session_token)
         if not session_info:
             raise HTTPException(status_code=401, detail="Invalid or expired session")
         
@@ -158,7 +159,7 @@ async def get_session_info(session_token: str = Query(...)):
 async def cleanup_tokens():
     """Clean up expired tokens and sessions (can be called by cron job)."""
     try:
-        cleanup_expired_tokens()
+        await run_db(cleanup_expired_tokens)
         return {"success": True, "message": "Cleanup completed"}
     except Exception as e:
         print(f"Error during cleanup: {e}")
@@ -17,6 +17,12 @@ app = FastAPI(
 from . import oauth_server
 from . import webhook_handler
 from . import auth_server
+from .utils.db_pool import get_pool_stats, close_pool
+from .utils.async_executor import run_db, shutdown_executors
+from .utils.strava_client import get_strava_client_stats
+from .utils.token_cache import get_access_token_cache
+from .utils.token_refresh import get_token_refresh_scheduler
+from .utils.webhook_queue import get_webhook_queue_stats
 
 # Root endpoint - redirect to documentation or return simple message
 @app.get("/")
@@ -70,6 +76,35 @@ async def auth_health_check():
 async def health_check():
     return {"status": "healthy", "services": ["oauth", "webhook", "auth"], "version": "1.0.0"}
 
+@app.get("/health/db-pool")
+async def db_pool_health():
+    """Connection pool statistics (in-use, waits, checkout latency)."""
+    return {"pool": get_pool_stats(), "replica": get_pool_stats("replica")}
+
+@app.get("/health/strava")
+async def strava_health():
+    """Strava API latency per endpoint, rate-limit usage, the access token cache and refresher."""
+    return dict(
+        get_strava_client_stats(),
+        token_cache=get_access_token_cache().stats(),
+        token_refresh=get_token_refresh_scheduler().stats(),
+    )
+
+@app.get("/health/webhook-queue")
+async def webhook_queue_health():
+    """Queued, in-progress and dead-lettered webhook events."""
+    return await run_db(get_webhook_queue_stats)
+
+@app.on_event("startup")
+def start_token_refresh():
+    get_token_refresh_scheduler().start()
+
+@app.on_event("shutdown")
+def shutdown_db_pool():
+    get_token_refresh_scheduler().stop()
+    shutdown_executors()
+    close_pool()
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
@@ -1,10 +1,12 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import RedirectResponse
 import os
-import requests
 from dotenv import load_dotenv
-from .utils.db_utils import get_db_connection
+from .utils.db_pool import db_connection
 from .utils.auth_utils import store_strava_connection
+from .utils.async_executor import run_db, run_http
+from .utils.strava_client import STRAVA_OAUTH_URL, get_strava_client
+from .utils.strava_rate_limit import RateLimitExceeded
 
 load_dotenv()
 
@@ -34,7 +36,7 @@ async def initiate_oauth(scope: str = "read", session_token: str = None):
         return RedirectResponse(url=f"{STREAMLIT_URL}?login=true")
     
     print(f"🔍 Validating session token...")
-    session_info = validate_session_token(session_token)
+    session_info = await run_db(validate_session_token, session_token)
     if not session_info:
         print(f"❌ Invalid session token - redirecting to login")
         return RedirectResponse(url=f"{STREAMLIT_URL}?login=true")
@@ -85,20 +87,21 @@ async def oauth_callback(request: Request, code: str = None, error: str = None,
         return RedirectResponse(url=f"{STREAMLIT_URL}?error=missing_session")
     
     # Validate session
-    session_info = validate_session_token(session_token)
+    session_info = await run_db(validate_session_token, session_token)
     if not session_info:
         return RedirectResponse(url=f"{STREAMLIT_URL}?error=invalid_session")
     
     try:
         # Exchange authorization code for access token
-        token_data = exchange_code_for_token(code)
+        token_data = await run_http(exchange_code_for_token, code)
         
         if not token_data:
             raise HTTPException(status_code=400, detail="Failed to exchange code for token")
         
         # Store Strava connection for this user
         athlete_id = token_data["athlete"]["id"]
-        success = store_strava_connection(
+        success = await run_db(
+            store_strava_connection,
             user_id=session_info["user_id"],
             athlete_id=athlete_id,
             access_token=token_data["access_token"],
@@ -111,7 +114,7 @@ async def oauth_callback(request: Request, code: str = None, error: str = None,
             raise HTTPException(status_code=500, detail="Failed to store Strava connection")
         
         # Ensure webhook subscription exists (idempotent)
-        webhook_status = ensure_webhook_subscription()
+        webhook_status = await run_http(ensure_webhook_subscription)
         print(f"Webhook subscription status: {webhook_status}")
         
         # Redirect back to Streamlit with session token
@@ -125,8 +128,6 @@ async def oauth_callback(request: Request, code: str = None, error: str = None,
 
 def exchange_code_for_token(auth_code: str):
     """Exchange authorization code for access token."""
-    token_url = "https://www.strava.com/oauth/token"
-    
     data = {
         "client_id": CLIENT_ID,
         "client_secret": CLIENT_SECRET,
@@ -134,7 +135,10 @@ def exchange_code_for_token(auth_code: str):
         "grant_type": "authorization_code"
     }
     
-    response = requests.post(token_url, data=data)
+    # Not retried: an authorization code can only be exchanged once
+    response = get_strava_client().request(
+        "POST", f"{STRAVA_OAUTH_URL}/token", data=data, rate_limited=False, retries=0
+    )
     
     if response.status_code == 200:
         token_data = response.json()
@@ -146,8 +150,6 @@ def exchange_code_for_token(auth_code: str):
 
 def ensure_webhook_subscription():
     """Ensure webhook subscription exists for the application (idempotent)."""
-    import requests
-    
     CLIENT_ID = os.getenv("CLIENT_ID")
     CLIENT_SECRET = os.getenv("CLIENT_SECRET")
     STRAVA_WEBHOOK_VERIFY_TOKEN = os.getenv("STRAVA_WEBHOOK_VERIFY_TOKEN")
@@ -157,13 +159,17 @@ def ensure_webhook_subscription():
         return "Missing webhook configuration"
     
     # First, check if subscription already exists
-    list_url = "https://www.strava.com/api/v3/push_subscriptions"
+    client = get_strava_client()
     params = {
         "client_id": CLIENT_ID,
         "client_secret": CLIENT_SECRET
     }
     
-    response = requests.get(list_url, params=params)
+    try:
+        response = client.request("GET", "/push_subscriptions", params=params)
+    except RateLimitExceeded as e:
+        # Checked again on the next connection; not worth failing this one over
+        return f"Subscription check skipped: {e}"
     
     if response.status_code == 200:
         subscriptions = response.json()
@@ -172,7 +178,6 @@ def ensure_webhook_subscription():
             return f"Existing subscription active (ID: {subscriptions[0]['id']})"
     
     # If no subscription exists, create one
-    subscription_url = "https://www.strava.com/api/v3/push_subscriptions"
     data = {
         "client_id": CLIENT_ID,
         "client_secret": CLIENT_SECRET,
@@ -180,7 +185,10 @@ def ensure_webhook_subscription():
         "verify_token": STRAVA_WEBHOOK_VERIFY_TOKEN,
     }
     
-    response = requests.post(subscription_url, json=data)
+    try:
+        response = client.request("POST", "/push_subscriptions", json=data, retries=0)
+    except RateLimitExceeded as e:
+        return f"Subscription not created: {e}"
     
     if response.status_code == 201:
         subscription = response.json()
@@ -193,47 +201,40 @@ def ensure_webhook_subscription():
 
 def store_user_tokens(athlete_id: int, access_token: str, refresh_token: str, expires_at: int, scope: str):
     """Store user tokens in PostgreSQL database with athlete association."""
-    conn = get_db_connection()
-    if not conn:
-        raise Exception("Database connection failed - PostgreSQL required")
+    with db_connection() as conn, conn.cursor() as cursor:
+        # Create user_tokens table if it doesn't exist
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS user_tokens (
+                id SERIAL PRIMARY KEY,
+                athlete_id INTEGER UNIQUE NOT NULL,
+                access_token TEXT NOT NULL,
+                refresh_token TEXT NOT NULL,
+                expires_at INTEGER NOT NULL,
+                scope TEXT NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
         
-    cursor = conn.cursor()
-    
-    # Create user_tokens table if it doesn't exist
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS user_tokens (
-            id SERIAL PRIMARY KEY,
-            athlete_id INTEGER UNIQUE NOT NULL,
-            access_token TEXT NOT NULL,
-            refresh_token TEXT NOT NULL,
-            expires_at INTEGER NOT NULL,
-            scope TEXT NOT NULL,
-            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Insert or update user tokens
-    cursor.execute("""
-        INSERT INTO user_tokens 
-        (athlete_id, access_token, refresh_token, expires_at, scope)
-        VALUES (%s, %s, %s, %s, %s)
-        ON CONFLICT (athlete_id) 
-        DO UPDATE SET 
-            access_token = EXCLUDED.access_token,
-            refresh_token = EXCLUDED.refresh_token,
-            expires_at = EXCLUDED.expires_at,
-            scope = EXCLUDED.scope,
-            updated_at = CURRENT_TIMESTAMP
-        RETURNING id
-    """, (athlete_id, access_token, refresh_token, expires_at, scope))
-    
-    result = cursor.fetchone()
-    token_id = result[0] if result else None
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
+        # Insert or update user tokens
+        cursor.execute("""
+            INSERT INTO user_tokens 
+            (athlete_id, access_token, refresh_token, expires_at, scope)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (athlete_id) 
+            DO UPDATE SET 
+                access_token = EXCLUDED.access_token,
+                refresh_token = EXCLUDED.refresh_token,
+                expires_at = EXCLUDED.expires_at,
+                scope = EXCLUDED.scope,
+                updated_at = CURRENT_TIMESTAMP
+            RETURNING id
+        """, (athlete_id, access_token, refresh_token, expires_at, scope))
+        
+        result = cursor.fetchone()
+        token_id = result[0] if result else None
+        
+        conn.commit()
     
     print(f"Stored tokens for athlete {athlete_id} (token ID: {token_id})")
     return token_id
@@ -241,21 +242,11 @@ def store_user_tokens(athlete_id: int, access_token: str, refresh_token: str, ex
 @app.get("/tokens")
 async def list_stored_tokens():
     """List all stored tokens (for debugging)."""
-    conn = get_db_connection()
-    if not conn:
+    try:
+        tokens = await run_db(_fetch_stored_tokens)
+    except Exception as e:
+        print(f"Error listing tokens: {e}")
         raise HTTPException(status_code=500, detail="Database connection failed")
-        
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT athlete_id, scope, created_at,
-               CASE WHEN expires_at > EXTRACT(epoch FROM NOW()) THEN 'valid' ELSE 'expired' END as status
-        FROM user_tokens ORDER BY created_at DESC
-    """)
-    
-    tokens = cursor.fetchall()
-    cursor.close()
-    conn.close()
     
     return {
         "tokens": [
@@ -269,6 +260,15 @@ async def list_stored_tokens():
         ]
     }
 
+def _fetch_stored_tokens():
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT athlete_id, scope, created_at,
+                   CASE WHEN expires_at > EXTRACT(epoch FROM NOW()) THEN 'valid' ELSE 'expired' END as status
+            FROM user_tokens ORDER BY created_at DESC
+        """)
+        return cursor.fetchall()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
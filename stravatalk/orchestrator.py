@@ -3,7 +3,6 @@ Orchestrator for the StravaTalk application.
 """
 
 import os
-import pandas as pd
 import instructor
 
 from .agents.classify_agent import create_classification_agent, QueryType
@@ -11,9 +10,13 @@ from .agents.response_agent import create_response_agent, SQLResult
 from .agents.table_response_agent import create_table_response_agent
 from .agents.clarify_agent import create_clarification_agent
 from .agents.sql_agent import create_sql_agent
-from .utils.db_utils import get_table_definitions, execute_sql_query
+from .utils.db_utils import get_table_definitions, get_schema_description, execute_cached_sql_query
 import openai
 
+# Most rows ever shown in a table; the response agent sees the first RESPONSE_ROW_LIMIT
+TABLE_ROW_LIMIT = 50
+RESPONSE_ROW_LIMIT = 25
+
 
 def initialize_agents(shared_memory=None, current_date=None):
     """Initialize all agents."""
@@ -64,6 +67,8 @@ def process_query(classify_agent, sql_agent, response_agent, table_response_agen
         "chart_info": None,
         "sql_query": None,
         "show_table": False,
+        "row_count": 0,
+        "row_count_is_lower_bound": False,
     }
 
     # Handle CLARIFY queries
@@ -88,11 +93,13 @@ def process_query(classify_agent, sql_agent, response_agent, table_response_agen
         return result
 
     # Step 2: Generate SQL if appropriate
+    # Both come from the per-process schema cache (no DB round trip)
     tables = get_table_definitions()
+    schema_description = get_schema_description()
 
     try:
         # Use enhanced query with memory context for SQL generation
-        sql_output = sql_agent.run(enhanced_query, tables)
+        sql_output = sql_agent.run(enhanced_query, tables, schema_description)
         sql_query = sql_output.sql_query
         
         # Basic validation - just check we got a non-empty query
@@ -120,8 +127,12 @@ def process_query(classify_agent, sql_agent, response_agent, table_response_agen
     logger.info(f"🔍 Generated SQL Query: {sql_query}")
     logger.info(f"🔍 User filtering with athlete_id: {athlete_id}")
 
-    # Step 3: Execute SQL query with user filtering
-    execution_result = execute_sql_query(sql_query, athlete_id=athlete_id)
+    # Step 3: Execute SQL query with user filtering, streaming only the rows we can show
+    # (EXPLAIN-gated so a runaway plan is rejected instead of pinning the database).
+    # Repeat questions are served from the per-athlete cache until their data changes.
+    execution_result = execute_cached_sql_query(
+        sql_query, athlete_id, max_rows=TABLE_ROW_LIMIT, cost_gate=True, columnar=True
+    )
     execution_result["sql_query"] = sql_query
     
     # Debug: Show SQL execution
@@ -156,12 +167,12 @@ def process_query(classify_agent, sql_agent, response_agent, table_response_agen
         result["response_text"] = response_output.response
         return result
 
-    # Convert results to DataFrame for easier manipulation
-    if execution_result["success"] and execution_result["rows"]:
-        df = pd.DataFrame(
-            execution_result["rows"], columns=execution_result["column_names"]
-        )
-        result["data"] = df
+    # Wrap the column arrays in a DataFrame (no copy, no per-row dicts)
+    columnar = execution_result["columnar"]
+    if columnar is not None and len(columnar):
+        result["data"] = columnar.to_dataframe()
+    result["row_count"] = execution_result["row_count"]
+    result["row_count_is_lower_bound"] = execution_result["row_count_is_lower_bound"]
 
     # Step 4: Generate text response based on classification
     sql_result = SQLResult(
@@ -170,17 +181,15 @@ def process_query(classify_agent, sql_agent, response_agent, table_response_agen
         success=True,
         error_message=None,
         column_names=execution_result["column_names"],
-        rows=execution_result["rows"][:25],
+        rows=columnar.to_records(RESPONSE_ROW_LIMIT) if columnar is not None else None,
         row_count=execution_result["row_count"],
+        row_count_is_lower_bound=execution_result["row_count_is_lower_bound"],
         has_visualization=False,
     )
 
     # Choose appropriate response agent based on classification
     if classification.query_type == QueryType.TEXT_AND_TABLE:
-        # For table queries, limit to 50 rows as specified in requirements
-        if execution_result["success"] and execution_result["rows"]:
-            limited_rows = execution_result["rows"][:50]
-            result["data"] = pd.DataFrame(limited_rows, columns=execution_result["column_names"])
+        # For table queries the result is already capped at TABLE_ROW_LIMIT rows
         result["show_table"] = True
         
         # Use table response agent for supporting text  
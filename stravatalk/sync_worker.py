@@ -0,0 +1,119 @@
+"""
+Background worker for historical Strava syncs.
+
+Claims jobs from ``sync_jobs`` (see ``utils/sync_jobs.py``) and runs
+``StravaSyncService.sync_historical_activities`` for them, reporting progress
+back to the job row for the Streamlit app to poll. Run as many processes (or
+``--threads``) as needed; claims never overlap. A worker whose job was
+reclaimed as stale (see ``SYNC_JOB_STALE_SECONDS``) stops it at its next
+progress report.
+
+Usage:
+    python -m stravatalk.sync_worker [--threads 2] [--once]
+"""
+
+import os
+import time
+import socket
+import logging
+import argparse
+import threading
+
+from dotenv import load_dotenv
+
+from .utils.db_pool import close_pool
+from .utils.strava_sync import StravaSyncService, SyncCancelled
+from .utils.sync_jobs import claim_sync_job, finish_sync_job, update_sync_job_progress
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SYNC_WORKER_POLL_SECONDS = float(os.getenv("SYNC_WORKER_POLL_SECONDS", "2"))
+# Progress writes are throttled; each one also refreshes the job's heartbeat
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+
+def run_job(job, worker_id):
+    """Run one claimed job to completion and record its result."""
+    logger.info(f"🔄 {worker_id} running sync job {job['id']} for user {job['user_id']}")
+    last_report = 0.0
+
+    def report_progress(count, message):
+        nonlocal last_report
+        now = time.monotonic()
+        if now - last_report < PROGRESS_INTERVAL_SECONDS:
+            return
+        last_report = now
+        try:
+            still_ours = update_sync_job_progress(job["id"], worker_id, count, message)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not record progress for sync job {job['id']}: {e}")
+            return
+        if not still_ours:
+            # Reclaimed as stale by another worker, which is running it now
+            raise SyncCancelled(f"Sync job {job['id']} is no longer held by {worker_id}")
+
+    try:
+        result = StravaSyncService().sync_historical_activities(
+            job["user_id"], report_progress, full=job["full_sync"]
+        )
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+
+    if result.get("cancelled"):
+        logger.warning(f"⚠️ {worker_id} stopped sync job {job['id']}: {result['error']}")
+        return
+    if result.get("success"):
+        update_sync_job_progress(job["id"], worker_id, result["activities_synced"], result["message"])
+    finish_sync_job(job, worker_id, result)
+
+
+def worker_loop(worker_id, stop_event, once=False):
+    """Claim and run jobs until ``stop_event`` is set (or the queue is empty, with ``once``)."""
+    while not stop_event.is_set():
+        try:
+            job = claim_sync_job(worker_id)
+        except Exception as e:
+            logger.error(f"❌ {worker_id} could not claim a sync job: {e}")
+            job = None
+
+        if job is None:
+            if once:
+                return
+            stop_event.wait(SYNC_WORKER_POLL_SECONDS)
+            continue
+        run_job(job, worker_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background Strava sync jobs")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("SYNC_WORKER_THREADS", "1")))
+    parser.add_argument("--once", action="store_true", help="exit when no job is runnable")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    stop_event = threading.Event()
+    base_id = f"{socket.gethostname()}:{os.getpid()}"
+    threads = [
+        threading.Thread(target=worker_loop, args=(f"{base_id}:{i}", stop_event, args.once), name=f"sync-worker-{i}")
+        for i in range(args.threads)
+    ]
+    logger.info(f"🚀 Sync worker {base_id} started with {args.threads} thread(s)")
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=1)
+    except KeyboardInterrupt:
+        logger.info("🛑 Stopping after the current jobs finish...")
+        stop_event.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
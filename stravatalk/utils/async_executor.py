@@ -0,0 +1,67 @@
+"""
+Run blocking database and HTTP calls from async endpoints without stalling
+the event loop.
+
+psycopg2 and ``requests`` are blocking, so the FastAPI services hand each call
+to a bounded thread pool and ``await`` the result. Database work gets its own
+pool sized to the connection pool, so a worker thread never queues for a
+connection; slow Strava/email calls use a separate pool and cannot starve it.
+"""
+
+import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from .db_pool import DB_POOL_MAX_SIZE
+
+load_dotenv()
+
+DB_EXECUTOR_MAX_WORKERS = int(os.getenv("DB_EXECUTOR_MAX_WORKERS", str(DB_POOL_MAX_SIZE)))
+HTTP_EXECUTOR_MAX_WORKERS = int(os.getenv("HTTP_EXECUTOR_MAX_WORKERS", "16"))
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_executors_pid: Optional[int] = None
+_executors_lock = threading.Lock()
+
+
+def _get_executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    global _executors_pid
+    pid = os.getpid()
+    with _executors_lock:
+        if _executors_pid != pid:
+            # Worker threads do not survive fork()
+            _executors.clear()
+            _executors_pid = pid
+        executor = _executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-executor")
+            _executors[name] = executor
+        return executor
+
+
+async def run_db(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking database call on the database thread pool."""
+    executor = _get_executor("db", DB_EXECUTOR_MAX_WORKERS)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+async def run_http(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking outbound HTTP call (Strava, email) on the HTTP thread pool."""
+    executor = _get_executor("http", HTTP_EXECUTOR_MAX_WORKERS)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executors(wait: bool = True):
+    """Stop the thread pools (used on application shutdown)."""
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
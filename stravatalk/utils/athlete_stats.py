@@ -0,0 +1,281 @@
+"""
+Incrementally maintained per-athlete activity statistics and rollups.
+
+``athlete_stats`` keeps one row per (athlete, activity type) with counts,
+totals and the first/last activity date; ``activity_{daily,weekly,monthly}_rollups``
+keep the same additive totals per period. Every write path adjusts them in
+the same transaction as the activity write, so readers (and the SQL agent)
+get counts from a handful of primary-key rows instead of scanning
+``activities``.
+"""
+
+from typing import Any, Dict, List, Optional
+
+# Columns of an activity row that contribute to its stats
+STATS_SOURCE_NAMES = [
+    "type", "distance", "moving_time", "elapsed_time", "total_elevation_gain", "start_date", "start_date_local",
+]
+STATS_SOURCE_COLUMNS = ", ".join(STATS_SOURCE_NAMES)
+
+ADD_ACTIVITY_SQL = """
+    INSERT INTO athlete_stats AS s (
+        athlete_id, type, activity_count, total_distance, total_moving_time,
+        total_elevation_gain, first_activity_at, last_activity_at, last_write_at
+    ) VALUES (%(athlete_id)s, %(type)s, 1, %(distance)s, %(moving_time)s,
+              %(total_elevation_gain)s, %(start_date)s::timestamptz, %(start_date)s::timestamptz, NOW())
+    ON CONFLICT (athlete_id, type) DO UPDATE SET
+        activity_count = s.activity_count + 1,
+        total_distance = s.total_distance + EXCLUDED.total_distance,
+        total_moving_time = s.total_moving_time + EXCLUDED.total_moving_time,
+        total_elevation_gain = s.total_elevation_gain + EXCLUDED.total_elevation_gain,
+        first_activity_at = LEAST(s.first_activity_at, EXCLUDED.first_activity_at),
+        last_activity_at = GREATEST(s.last_activity_at, EXCLUDED.last_activity_at),
+        last_write_at = NOW()
+"""
+
+REMOVE_ACTIVITY_SQL = """
+    UPDATE athlete_stats SET
+        activity_count = activity_count - 1,
+        total_distance = total_distance - %(distance)s,
+        total_moving_time = total_moving_time - %(moving_time)s,
+        total_elevation_gain = total_elevation_gain - %(total_elevation_gain)s,
+        last_write_at = NOW()
+    WHERE athlete_id = %(athlete_id)s AND type = %(type)s
+    RETURNING
+        activity_count,
+        (first_activity_at = %(start_date)s::timestamptz
+         OR last_activity_at = %(start_date)s::timestamptz) IS NOT FALSE AS was_boundary
+"""
+
+# Only needed when the removed activity was the first or last of its type
+RECOMPUTE_BOUNDS_SQL = """
+    UPDATE athlete_stats SET
+        first_activity_at = bounds.first_at,
+        last_activity_at = bounds.last_at
+    FROM (
+        SELECT MIN(start_date::timestamptz) AS first_at, MAX(start_date::timestamptz) AS last_at
+        FROM activities
+        WHERE athlete_id = %(athlete_id)s AND COALESCE(type, '') = %(type)s
+    ) bounds
+    WHERE athlete_id = %(athlete_id)s AND type = %(type)s
+"""
+
+
+ROLLUP_PERIODS = {
+    "activity_daily_rollups": "day",
+    "activity_weekly_rollups": "week",
+    "activity_monthly_rollups": "month",
+}
+
+# Adds sign * the activity to its period row in every rollup table, in one round trip
+_ROLLUP_UPSERT = """
+    INSERT INTO {table} AS r (
+        athlete_id, type, period_start, activity_count, total_distance,
+        total_moving_time, total_elapsed_time, total_elevation_gain
+    )
+    SELECT %(athlete_id)s, %(type)s, date_trunc('{period}', local_start)::date, %(sign)s,
+           %(sign)s * %(distance)s, %(sign)s * %(moving_time)s,
+           %(sign)s * %(elapsed_time)s, %(sign)s * %(total_elevation_gain)s
+    FROM start
+    ON CONFLICT (athlete_id, period_start, type) DO UPDATE SET
+        activity_count = r.activity_count + EXCLUDED.activity_count,
+        total_distance = r.total_distance + EXCLUDED.total_distance,
+        total_moving_time = r.total_moving_time + EXCLUDED.total_moving_time,
+        total_elapsed_time = r.total_elapsed_time + EXCLUDED.total_elapsed_time,
+        total_elevation_gain = r.total_elevation_gain + EXCLUDED.total_elevation_gain
+"""
+
+_START_CTE = (
+    "start AS (SELECT COALESCE(%(start_date_local)s::timestamp, "
+    "%(start_date)s::timestamptz AT TIME ZONE 'UTC') AS local_start)"
+)
+
+ADJUST_ROLLUPS_SQL = "WITH {}, {} SELECT 1".format(
+    _START_CTE,
+    ", ".join(
+        f"{period} AS ({_ROLLUP_UPSERT.format(table=table, period=period)})"
+        for table, period in ROLLUP_PERIODS.items()
+    ),
+)
+
+# Periods left without activities are removed rather than kept as zero rows
+PRUNE_ROLLUPS_SQL = "; ".join(
+    f"DELETE FROM {table} WHERE athlete_id = %(athlete_id)s AND type = %(type)s AND activity_count <= 0"
+    for table in ROLLUP_PERIODS
+)
+
+
+# Batch counterparts of the statements above: data-modifying CTEs that fold a
+# set of newly stored activities (a CTE with the ``activities`` columns) into
+# the stats and every rollup table, grouped so each target row changes once
+_ADD_BATCH_STATS = """
+    INSERT INTO athlete_stats AS s (
+        athlete_id, type, activity_count, total_distance, total_moving_time,
+        total_elevation_gain, first_activity_at, last_activity_at, last_write_at
+    )
+    SELECT athlete_id, COALESCE(type, ''), COUNT(*), COALESCE(SUM(distance), 0),
+           COALESCE(SUM(moving_time), 0), COALESCE(SUM(total_elevation_gain), 0),
+           MIN(start_date::timestamptz), MAX(start_date::timestamptz), NOW()
+    FROM {source}
+    GROUP BY 1, 2
+    ON CONFLICT (athlete_id, type) DO UPDATE SET
+        activity_count = s.activity_count + EXCLUDED.activity_count,
+        total_distance = s.total_distance + EXCLUDED.total_distance,
+        total_moving_time = s.total_moving_time + EXCLUDED.total_moving_time,
+        total_elevation_gain = s.total_elevation_gain + EXCLUDED.total_elevation_gain,
+        first_activity_at = LEAST(s.first_activity_at, EXCLUDED.first_activity_at),
+        last_activity_at = GREATEST(s.last_activity_at, EXCLUDED.last_activity_at),
+        last_write_at = NOW()
+"""
+
+_ADD_BATCH_ROLLUP = """
+    INSERT INTO {table} AS r (
+        athlete_id, type, period_start, activity_count, total_distance,
+        total_moving_time, total_elapsed_time, total_elevation_gain
+    )
+    SELECT athlete_id, COALESCE(type, ''),
+           date_trunc('{period}', COALESCE(start_date_local, start_date::timestamptz AT TIME ZONE 'UTC'))::date,
+           COUNT(*), COALESCE(SUM(distance), 0), COALESCE(SUM(moving_time), 0),
+           COALESCE(SUM(elapsed_time), 0), COALESCE(SUM(total_elevation_gain), 0)
+    FROM {source}
+    GROUP BY 1, 2, 3
+    ON CONFLICT (athlete_id, period_start, type) DO UPDATE SET
+        activity_count = r.activity_count + EXCLUDED.activity_count,
+        total_distance = r.total_distance + EXCLUDED.total_distance,
+        total_moving_time = r.total_moving_time + EXCLUDED.total_moving_time,
+        total_elapsed_time = r.total_elapsed_time + EXCLUDED.total_elapsed_time,
+        total_elevation_gain = r.total_elevation_gain + EXCLUDED.total_elevation_gain
+"""
+
+
+def batch_stats_ctes(source: str) -> str:
+    """CTEs (each prefixed with a comma) adding the rows of ``source`` to stats and rollups.
+
+    Append them to a ``WITH source AS (INSERT ... RETURNING *)`` so a whole
+    batch of activities and its stats are written in one statement.
+    """
+    ctes = [f", {source}_stats AS ({_ADD_BATCH_STATS.format(source=source)})"]
+    ctes.extend(
+        f", {source}_{period} AS ({_ADD_BATCH_ROLLUP.format(table=table, period=period, source=source)})"
+        for table, period in ROLLUP_PERIODS.items()
+    )
+    return "".join(ctes)
+
+
+def _contribution(athlete_id: int, activity: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "athlete_id": athlete_id,
+        "type": activity.get("type") or "",
+        "distance": activity.get("distance") or 0,
+        "moving_time": activity.get("moving_time") or 0,
+        "elapsed_time": activity.get("elapsed_time") or 0,
+        "total_elevation_gain": activity.get("total_elevation_gain") or 0,
+        "start_date": activity.get("start_date"),
+        "start_date_local": activity.get("start_date_local"),
+    }
+
+
+def record_activity_added(cursor, athlete_id: int, activity: Dict[str, Any]):
+    """Add one stored activity to its athlete's stats and rollups."""
+    params = _contribution(athlete_id, activity)
+    cursor.execute(ADD_ACTIVITY_SQL, params)
+    cursor.execute(ADJUST_ROLLUPS_SQL, dict(params, sign=1))
+
+
+def record_activity_removed(cursor, athlete_id: int, activity: Dict[str, Any]):
+    """Remove one activity (as it was stored) from its athlete's stats and rollups.
+
+    Must run after the activity row itself is gone, so first/last dates can be
+    recomputed without it.
+    """
+    params = _contribution(athlete_id, activity)
+    cursor.execute(ADJUST_ROLLUPS_SQL, dict(params, sign=-1))
+    cursor.execute(PRUNE_ROLLUPS_SQL, params)
+    cursor.execute(REMOVE_ACTIVITY_SQL, params)
+    row = cursor.fetchone()
+    if not row:
+        return
+
+    activity_count, was_boundary = row
+    if activity_count <= 0:
+        cursor.execute(
+            "DELETE FROM athlete_stats WHERE athlete_id = %(athlete_id)s AND type = %(type)s", params
+        )
+    elif was_boundary:
+        cursor.execute(RECOMPUTE_BOUNDS_SQL, params)
+
+
+def record_activity_replaced(cursor, athlete_id: int, old: Optional[Dict[str, Any]], new: Dict[str, Any]):
+    """Move an activity's contribution from its previous version to its new one.
+
+    Runs after the row has been rewritten; ``old`` is the row as returned by
+    ``lock_activity`` beforehand (None if the activity is new).
+    """
+    if old is not None:
+        record_activity_removed(cursor, old["athlete_id"], old)
+    record_activity_added(cursor, athlete_id, new)
+
+
+def lock_activity(cursor, activity_id: int, athlete_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Lock an activity row for update and return its stats columns, or None if absent."""
+    query = f"SELECT athlete_id, {STATS_SOURCE_COLUMNS} FROM activities WHERE id = %s"
+    params = [activity_id]
+    if athlete_id is not None:
+        query += " AND athlete_id = %s"
+        params.append(athlete_id)
+    cursor.execute(query + " FOR UPDATE", params)
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip(["athlete_id"] + STATS_SOURCE_NAMES, row))
+
+
+def lock_activities(cursor, activity_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Lock the stored rows of several activities and return their stats columns by id.
+
+    activities is partitioned by start_date, so an activity is only found by
+    id; an insert's conflict check would miss one whose start_date changed.
+    Rows are locked in id order, so concurrent batches can't deadlock.
+    """
+    if not activity_ids:
+        return {}
+    cursor.execute(
+        f"SELECT id, athlete_id, {STATS_SOURCE_COLUMNS} FROM activities "
+        "WHERE id = ANY(%s) ORDER BY id FOR UPDATE",
+        (list(activity_ids),),
+    )
+    return {row[0]: dict(zip(["athlete_id"] + STATS_SOURCE_NAMES, row[1:])) for row in cursor.fetchall()}
+
+
+def get_athlete_stats(cursor, athlete_id: int) -> Dict[str, Any]:
+    """Summarize an athlete's stats rows (totals overall and per type)."""
+    cursor.execute("SELECT * FROM athlete_stats WHERE athlete_id = %s", (athlete_id,))
+    rows = cursor.fetchall()
+    if rows and not isinstance(rows[0], dict):
+        names = [col.name for col in cursor.description]
+        rows = [dict(zip(names, row)) for row in rows]
+
+    by_type = {
+        row["type"]: {
+            "activity_count": row["activity_count"],
+            "total_distance": row["total_distance"],
+            "total_moving_time": row["total_moving_time"],
+            "total_elevation_gain": row["total_elevation_gain"],
+            "first_activity_at": row["first_activity_at"],
+            "last_activity_at": row["last_activity_at"],
+        }
+        for row in rows
+    }
+    first_dates = [row["first_activity_at"] for row in rows if row["first_activity_at"]]
+    last_dates = [row["last_activity_at"] for row in rows if row["last_activity_at"]]
+
+    return {
+        "activity_count": sum(row["activity_count"] for row in rows),
+        "total_distance": sum(row["total_distance"] for row in rows),
+        "total_moving_time": sum(row["total_moving_time"] for row in rows),
+        "total_elevation_gain": sum(row["total_elevation_gain"] for row in rows),
+        "first_activity_at": min(first_dates) if first_dates else None,
+        "last_activity_at": max(last_dates) if last_dates else None,
+        "last_write_at": max((row["last_write_at"] for row in rows), default=None),
+        "by_type": by_type,
+    }
@@ -0,0 +1,121 @@
+"""
+Columnar query results.
+
+Rows fetched from PostgreSQL are transposed once into one typed array per
+column. NUMERIC values become float64 and timestamps become datetime64 in a
+single vectorized conversion per column, so the result converts to a pandas
+DataFrame without copying and can be sliced without rebuilding anything.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# PostgreSQL type OIDs (pg_type.oid) that get a typed array
+INT_OIDS = {20, 21, 23}           # int8, int2, int4
+FLOAT_OIDS = {700, 701, 1700}     # float4, float8, numeric
+BOOL_OIDS = {16}
+TIMESTAMP_OIDS = {1114}           # timestamp without time zone
+TIMESTAMPTZ_OIDS = {1184}         # timestamp with time zone
+DATE_OIDS = {1082}
+
+
+def _convert_column(values: Sequence[Any], type_code: Optional[int]):
+    """Convert one column of Python values into a typed array."""
+    has_nulls = any(v is None for v in values)
+
+    if type_code in FLOAT_OIDS:
+        # Decimal -> float and None -> NaN in one pass
+        return np.array(values, dtype=np.float64)
+    if type_code in INT_OIDS:
+        return np.array(values, dtype=np.float64 if has_nulls else np.int64)
+    if type_code in BOOL_OIDS and not has_nulls:
+        return np.array(values, dtype=bool)
+    if type_code in TIMESTAMPTZ_OIDS:
+        return pd.to_datetime(list(values), utc=True).array
+    if type_code in TIMESTAMP_OIDS or type_code in DATE_OIDS:
+        return pd.to_datetime(list(values)).array
+
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return arr
+
+
+class ColumnarResult:
+    """A query result held as one array per column.
+
+    DATE columns are held as datetime64 like timestamps; ``date_columns``
+    remembers which ones they are so records show them as plain dates.
+    """
+
+    def __init__(self, column_names: List[str], columns: Dict[str, Any], date_columns: Iterable[str] = ()):
+        self.column_names = list(column_names)
+        self.columns = columns
+        self.date_columns = frozenset(date_columns)
+
+    @classmethod
+    def from_rows(cls, column_names: List[str], type_codes: List[Optional[int]], rows: Sequence[Sequence[Any]]):
+        """Build a columnar result from tuple rows and their column type OIDs."""
+        if rows:
+            transposed = list(zip(*rows))
+        else:
+            transposed = [()] * len(column_names)
+        columns = {
+            name: _convert_column(values, type_code)
+            for name, type_code, values in zip(column_names, type_codes, transposed)
+        }
+        date_columns = [name for name, type_code in zip(column_names, type_codes) if type_code in DATE_OIDS]
+        return cls(column_names, columns, date_columns)
+
+    @classmethod
+    def from_cursor(cls, cursor, rows: Sequence[Sequence[Any]]):
+        """Build a columnar result from rows fetched with a tuple cursor."""
+        description = cursor.description or []
+        return cls.from_rows(
+            [col.name for col in description],
+            [col.type_code for col in description],
+            rows,
+        )
+
+    def __len__(self) -> int:
+        if not self.column_names:
+            return 0
+        return len(self.columns[self.column_names[0]])
+
+    def head(self, n: int) -> "ColumnarResult":
+        """First ``n`` rows as a new result sharing this result's arrays."""
+        return ColumnarResult(
+            self.column_names, {name: self.columns[name][:n] for name in self.column_names}, self.date_columns
+        )
+
+    def copy(self) -> "ColumnarResult":
+        """A result with its own copy of every column array."""
+        return ColumnarResult(
+            self.column_names, {name: self.columns[name].copy() for name in self.column_names}, self.date_columns
+        )
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Wrap the column arrays in a DataFrame without copying them.
+
+        Editing the frame in place edits this result too; results that are
+        shared (such as cached ones) are copied before they are handed out.
+        """
+        return pd.DataFrame({name: self.columns[name] for name in self.column_names}, copy=False)
+
+    def to_records(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Rows as plain-Python dicts (used for the small samples sent to the LLM)."""
+        head = self if limit is None else self.head(limit)
+        values = []
+        for name in head.column_names:
+            column = head.columns[name]
+            if name in head.date_columns:
+                values.append([None if pd.isna(v) else v.date().isoformat() for v in column])
+            elif isinstance(column, pd.api.extensions.ExtensionArray):
+                values.append([None if pd.isna(v) else v.isoformat() for v in column])
+            elif column.dtype == np.float64:
+                # NaN only ever stands for SQL NULL here
+                values.append([None if np.isnan(v) else v for v in column.tolist()])
+            else:
+                values.append(column.tolist())
+        return [dict(zip(head.column_names, row)) for row in zip(*values)]
@@ -0,0 +1,384 @@
+"""
+Process-wide PostgreSQL connection pool.
+
+Every database helper checks connections out of this pool instead of opening a
+new TCP+TLS connection per statement. Connections are health-checked on
+checkout and idle connections are pinged periodically so the serverless
+database does not suspend underneath us.
+"""
+
+import os
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional, Any
+
+import psycopg2
+import psycopg2.extensions
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Pool configuration
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "30"))
+DB_POOL_HEALTHCHECK_AFTER = float(os.getenv("DB_POOL_HEALTHCHECK_AFTER", "30"))  # Idle seconds before a checkout ping
+DB_POOL_KEEPALIVE_INTERVAL = float(os.getenv("DB_POOL_KEEPALIVE_INTERVAL", "240"))  # 0 disables keepalive pings
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+
+# TCP keepalives so dead connections are detected by the OS as well
+TCP_KEEPALIVE_KWARGS = {
+    "keepalives": 1,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 3,
+}
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+    pass
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that carries pool bookkeeping attributes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_created_at = time.monotonic()
+        self.pool_last_used = self.pool_created_at
+
+
+class ConnectionPool:
+    """Thread-safe pool of PostgreSQL connections with health checks and stats."""
+
+    def __init__(self, dsn: str, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 checkout_timeout: float = DB_POOL_CHECKOUT_TIMEOUT,
+                 healthcheck_after: float = DB_POOL_HEALTHCHECK_AFTER,
+                 keepalive_interval: float = DB_POOL_KEEPALIVE_INTERVAL,
+                 max_lifetime: float = DB_POOL_MAX_LIFETIME,
+                 name: str = "primary"):
+        if not dsn:
+            raise ValueError("DATABASE_URL environment variable is required.")
+        if max_size < 1:
+            raise ValueError("Pool max_size must be at least 1")
+
+        self.dsn = dsn
+        self.name = name
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.healthcheck_after = healthcheck_after
+        self.keepalive_interval = keepalive_interval
+        self.max_lifetime = max_lifetime
+
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "timeouts": 0,
+            "checkout_latency_total": 0.0,
+            "checkout_latency_max": 0.0,
+            "connections_created": 0,
+            "connections_discarded": 0,
+            "health_check_failures": 0,
+            "keepalive_pings": 0,
+        }
+
+        self._keepalive_thread = None
+        if self.keepalive_interval > 0:
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive_loop, name=f"db-pool-keepalive-{name}", daemon=True
+            )
+            self._keepalive_thread.start()
+
+    # Connection lifecycle
+
+    def _connect(self) -> PooledConnection:
+        conn = psycopg2.connect(self.dsn, connection_factory=PooledConnection, **TCP_KEEPALIVE_KWARGS)
+        with self._cond:
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _close(self, conn):
+        """Close a connection without releasing its slot in the pool."""
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats["connections_discarded"] += 1
+
+    def _discard(self, conn):
+        """Close a connection and free its slot in the pool."""
+        self._close(conn)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn) -> bool:
+        """Ping a connection with a trivial query."""
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _is_expired(self, conn, now: float) -> bool:
+        return self.max_lifetime > 0 and now - conn.pool_created_at > self.max_lifetime
+
+    # Checkout / return
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Check a connection out of the pool, waiting if the pool is exhausted."""
+        start = time.monotonic()
+        timeout = self.checkout_timeout if timeout is None else timeout
+        deadline = start + timeout
+        waited = False
+        conn = None
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout(f"Connection pool '{self.name}' is closed")
+                if self._idle:
+                    # LIFO keeps the hottest connections in use and lets the rest age out
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                waited = True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"Timed out after {timeout:.1f}s waiting for a connection from pool '{self.name}'"
+                    )
+                self._cond.wait(remaining)
+            self._in_use += 1
+
+        try:
+            now = time.monotonic()
+            # A replaced connection keeps the slot it was checked out from
+            if conn is not None and (conn.closed or self._is_expired(conn, now)):
+                self._close(conn)
+                conn = None
+            elif conn is not None and now - conn.pool_last_used > self.healthcheck_after:
+                if not self._is_healthy(conn):
+                    logger.warning(f"Discarding unhealthy connection from pool '{self.name}'")
+                    with self._cond:
+                        self._stats["health_check_failures"] += 1
+                    self._close(conn)
+                    conn = None
+
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        latency = time.monotonic() - start
+        with self._cond:
+            self._stats["checkouts"] += 1
+            self._stats["checkout_latency_total"] += latency
+            self._stats["checkout_latency_max"] = max(self._stats["checkout_latency_max"], latency)
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_time_total"] += latency
+        return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if not discard and not conn.closed:
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+
+        if discard or conn.closed or self._closed:
+            with self._cond:
+                self._in_use -= 1
+            self._discard(conn)
+            return
+
+        conn.pool_last_used = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """Context manager that checks out a connection and always returns it."""
+        conn = self.getconn(timeout)
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    # Keepalive
+
+    def _keepalive_loop(self):
+        while not self._closed:
+            time.sleep(self.keepalive_interval)
+            try:
+                self._keepalive_once()
+            except Exception as e:
+                logger.warning(f"Keepalive pass failed for pool '{self.name}': {e}")
+
+    def _keepalive_once(self):
+        """Ping idle connections, retire old ones and top the pool up to min_size."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._in_use += len(idle)
+
+        now = time.monotonic()
+        for conn in idle:
+            if conn.closed or self._is_expired(conn, now) or not self._is_healthy(conn):
+                with self._cond:
+                    self._in_use -= 1
+                self._discard(conn)
+                continue
+            with self._cond:
+                self._stats["keepalive_pings"] += 1
+            self.putconn(conn)
+
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    break
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception as e:
+                with self._cond:
+                    self._size -= 1
+                logger.warning(f"Could not open keepalive connection for pool '{self.name}': {e}")
+                break
+            with self._cond:
+                self._idle.appendleft(conn)
+                self._cond.notify()
+
+    # Introspection
+
+    def stats(self) -> Dict[str, Any]:
+        """Return a snapshot of pool usage statistics."""
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "name": self.name,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            })
+        checkouts = stats["checkouts"]
+        stats["checkout_latency_avg"] = stats["checkout_latency_total"] / checkouts if checkouts else 0.0
+        return stats
+
+    def close(self):
+        """Close all idle connections and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+
+# Environment variable holding the DSN for each pool role
+POOL_DSN_ENV = {
+    "primary": "DATABASE_URL",
+    "replica": "DATABASE_READ_URL",
+}
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(role: str = "primary") -> ConnectionPool:
+    """Return the process-wide pool for ``role``, creating it on first use (and after a fork)."""
+    global _pools_pid
+    pid = os.getpid()
+    pool = _pools.get(role)
+    if pool is not None and _pools_pid == pid:
+        return pool
+    with _pool_lock:
+        if _pools_pid != pid:
+            # Connections inherited across fork() must not be shared with the parent
+            _pools.clear()
+            _pools_pid = pid
+        pool = _pools.get(role)
+        if pool is None:
+            pool = ConnectionPool(os.getenv(POOL_DSN_ENV[role]), name=role)
+            _pools[role] = pool
+            logger.info(f"🔌 Created {role} database connection pool (min={pool.min_size}, max={pool.max_size})")
+    return pool
+
+
+def has_read_replica() -> bool:
+    """Whether a separate read-replica DSN is configured."""
+    return bool(os.getenv(POOL_DSN_ENV["replica"]))
+
+
+@contextmanager
+def db_connection(timeout: Optional[float] = None, role: str = "primary"):
+    """Check out a pooled connection for the duration of a ``with`` block.
+
+    Uncommitted work is rolled back when the block exits, so callers must
+    ``conn.commit()`` explicitly, exactly as with a raw psycopg2 connection.
+    """
+    with get_pool(role).connection(timeout) as conn:
+        yield conn
+
+
+def get_pool_stats(role: str = "primary") -> Optional[Dict[str, Any]]:
+    """Return statistics for a process-wide pool, or None if it was never created."""
+    pool = _pools.get(role)
+    if pool is None or _pools_pid != os.getpid():
+        return None
+    return pool.stats()
+
+
+def close_pool():
+    """Close all process-wide pools (used on application shutdown)."""
+    global _pools_pid
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+        _pools_pid = None
@@ -1,18 +1,37 @@
 import os
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
-import requests
 import time
+import uuid
 import logging
+from dataclasses import asdict
+from psycopg2 import sql
 from dotenv import load_dotenv
 
+from .db_pool import db_connection, has_read_replica, PoolTimeout
+from .schema_cache import SchemaCache
+from .query_guard import explain_query, check_plan, record_estimate
+from .sql_rewrite import cap_query, count_query
+from .result_cache import get_result_cache, get_data_version
+from .replica_router import get_replica_router
+from .strava_client import STRAVA_OAUTH_URL, get_strava_client
+from .token_cache import get_access_token_cache
+
 # Load environment variables from .env file
 load_dotenv()
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
-# Column descriptions for the activities table (only table exposed to LLM)
+# Statements that can be wrapped in DECLARE ... CURSOR
+READ_QUERY_PREFIXES = ("select", "with", "values", "table", "(")
+
+# Time the full count of a truncated result may take before it is abandoned
+# and the row count reported as "more than max_rows"
+SQL_COUNT_TIMEOUT_MS = int(os.getenv("SQL_COUNT_TIMEOUT_MS", "2000"))
+
+# Column descriptions for the activities table
 ACTIVITIES_DESCRIPTION = {
     "name": "activities",
     "description": "Table containing a user's Strava activity records",
@@ -24,13 +43,48 @@ ACTIVITIES_DESCRIPTION = {
         "elapsed_time": "total elapsed time in seconds",
         "total_elevation_gain": "total elevation gain in meters",
         "type": "type of activity (e.g., Run, Ride, Swim)",
-        "start_date": "when the activity started",
+        "start_date": "when the activity started (UTC)",
+        "start_date_local": "when the activity started, in the athlete's local time",
     },
 }
 
+ROLLUP_COLUMNS = {
+    "type": "type of activity (e.g., Run, Ride, Swim)",
+    "activity_count": "number of activities of this type in the period",
+    "total_distance": "total distance covered in meters",
+    "total_moving_time": "total time spent moving in seconds",
+    "total_elapsed_time": "total elapsed time in seconds",
+    "total_elevation_gain": "total elevation gain in meters",
+}
+
+# Tables exposed to the LLM, in prompt order. Rollups (migration 010) are
+# listed only once they exist.
+TABLE_DESCRIPTIONS = [
+    ACTIVITIES_DESCRIPTION,
+    {
+        "name": "activity_daily_rollups",
+        "description": "Per-day totals per activity type, one row per day with activities",
+        "columns": dict(ROLLUP_COLUMNS, period_start="the day (athlete's local date)"),
+    },
+    {
+        "name": "activity_weekly_rollups",
+        "description": "Per-week totals per activity type, one row per week with activities",
+        "columns": dict(ROLLUP_COLUMNS, period_start="Monday of the week (athlete's local date)"),
+    },
+    {
+        "name": "activity_monthly_rollups",
+        "description": "Per-month totals per activity type, one row per month with activities",
+        "columns": dict(ROLLUP_COLUMNS, period_start="first day of the month (athlete's local date)"),
+    },
+]
+
 
 def get_db_connection():
-    """Establishes a connection to the PostgreSQL database."""
+    """Establishes a new, unpooled connection to the PostgreSQL database.
+
+    Application code should use ``db_connection()`` from ``db_pool`` instead;
+    this is kept for one-off scripts such as migrations.
+    """
     database_url = os.getenv("DATABASE_URL")
     if not database_url:
         raise ValueError("DATABASE_URL environment variable is required.")
@@ -38,151 +92,417 @@ def get_db_connection():
     return psycopg2.connect(database_url)
 
 
+def _load_table_definitions(cursor):
+    """Introspect the definitions of the tables exposed to the LLM from PostgreSQL."""
+    cursor.execute(
+        """
+        SELECT table_name, column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = ANY(%s)
+          AND column_name != 'athlete_id'
+        ORDER BY ordinal_position
+        """,
+        ([table["name"] for table in TABLE_DESCRIPTIONS],),
+    )
+    columns_by_table = {}
+    for table_name, column_name, data_type in cursor.fetchall():
+        columns_by_table.setdefault(table_name, []).append((column_name, data_type))
+
+    # Return simple dicts instead of Pydantic objects to avoid serialization issues
+    return [
+        {
+            "name": table["name"],
+            "columns": [
+                {
+                    "name": column_name,
+                    "type": data_type,
+                    "description": table["columns"].get(column_name, ""),
+                }
+                for column_name, data_type in columns_by_table[table["name"]]
+            ],
+            "description": table["description"],
+        }
+        for table in TABLE_DESCRIPTIONS
+        if table["name"] in columns_by_table
+    ]
+
+
+_schema_cache = SchemaCache(_load_table_definitions)
+
+
 def get_table_definitions():
-    """Get activities table definition for LLM (only table exposed to agents)."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    """Get the definitions of the tables exposed to the LLM."""
+    tables, _ = _schema_cache.get()
+    return tables
 
-    try:
-        # Get activities table schema from PostgreSQL
+
+def get_schema_description():
+    """Get the pre-rendered schema description used in the SQL agent prompt."""
+    _, description = _schema_cache.get()
+    return description
+
+
+def _failed_result(error_message):
+    """Result dict for a query that could not be executed."""
+    return {
+        "success": False,
+        "rows": None,
+        "column_names": None,
+        "row_count": 0,
+        "row_count_is_lower_bound": False,
+        "truncated": False,
+        "error_message": error_message,
+    }
+
+
+def _is_read_query(sql_query):
+    """Cheap check for statements that can back a server-side cursor."""
+    return sql_query.lstrip().lower().startswith(READ_QUERY_PREFIXES)
+
+
+def _new_cursor_name():
+    return f"stream_{uuid.uuid4().hex}"
+
+
+def _user_context_sql(conn, user_id):
+    """SQL that applies the RLS user context for the current transaction only.
+
+    It is sent in the same round trip as the first statement of the
+    transaction. ``set_config(..., true)`` is undone at commit/rollback, so no
+    setting leaks to the next user of the connection, and it stays correct
+    behind a transaction-mode pooler such as PgBouncer.
+    """
+    if not user_id:
+        return ""
+    logger.info(f"🔒 Applying RLS user context: {user_id}")
+    return sql.SQL("SELECT set_config('app.current_user_id', {}, true); ").format(
+        sql.Literal(str(user_id))
+    ).as_string(conn)
+
+
+def _declare_cursor_sql(cursor_name, sql_query, fetch_count, context_sql=""):
+    """Open a server-side cursor and fetch its first batch in one round trip.
+
+    The newline keeps a trailing ``--`` comment in the query from swallowing
+    the FETCH.
+    """
+    return (
+        f"{context_sql}DECLARE {cursor_name} NO SCROLL CURSOR FOR {sql_query.strip().rstrip(';')}\n; "
+        f"FETCH FORWARD {int(fetch_count)} FROM {cursor_name}"
+    )
+
+
+def _fetch_capped(conn, sql_query, query_params, max_rows, columnar=False, context_sql=""):
+    """Fetch at most ``max_rows`` rows through a server-side cursor.
+
+    Used for read statements ``cap_query`` cannot rewrite. The cursor is
+    declared and its first ``max_rows + 1`` rows fetched in one round trip;
+    the extra row only tells whether the result was truncated. The rest of
+    the result is never produced, so for a truncated result the returned
+    total is a lower bound (``max_rows + 1``), not the full count, and is
+    flagged as such.
+    """
+    cursor_name = _new_cursor_name()
+    cursor_factory = None if columnar else psycopg2.extras.RealDictCursor
+    with conn.cursor(cursor_factory=cursor_factory) as cursor:
+        cursor.execute(_declare_cursor_sql(cursor_name, sql_query, max_rows + 1, context_sql), query_params)
+        rows = cursor.fetchall()
+        column_names = [col.name for col in cursor.description]
+        total = len(rows)
+        rows = rows[:max_rows]
+        if columnar:
+            rows = _to_columnar(cursor, rows)
+        cursor.execute(f"CLOSE {cursor_name}")
+
+    return rows, column_names, total, total > max_rows
+
+
+def _fetch_limited(conn, capped, sql_query, query_params, max_rows, columnar=False, context_sql="",
+                   cost_gate=False):
+    """Run a LIMIT-rewritten query and return at most ``max_rows`` rows.
+
+    Only ``max_rows + 1`` rows are produced by the server; the extra one tells
+    whether the result was truncated. The full count is taken from the
+    original query, in the same transaction, only in that case (see
+    ``_count_rows``); if it cannot be taken the total stays ``max_rows + 1``
+    and is flagged as a lower bound.
+    """
+    cursor_factory = None if columnar else psycopg2.extras.RealDictCursor
+    with conn.cursor(cursor_factory=cursor_factory) as cursor:
+        cursor.execute(context_sql + capped.sql, query_params)
+        rows = cursor.fetchall()
+        column_names = [col.name for col in cursor.description]
+        total = len(rows)
+        rows = rows[:max_rows]
+        if columnar:
+            rows = _to_columnar(cursor, rows)
+
+    lower_bound = False
+    if capped.may_truncate and total > max_rows:
+        count = _count_rows(conn, sql_query, query_params, cost_gate)
+        if count is None:
+            lower_bound = True
+        else:
+            total = count
+
+    return rows, column_names, total, lower_bound
+
+
+def _count_rows(conn, sql_query, query_params, cost_gate=False):
+    """Count the rows of the uncapped query, or return None if that is too costly.
+
+    The count scans everything the LIMIT spared, so it gets the same EXPLAIN
+    gate as the query itself and runs under ``SQL_COUNT_TIMEOUT_MS``. It runs
+    inside a savepoint that is always rolled back, which undoes the timeout
+    and, if the count was cancelled, leaves the transaction usable.
+    """
+    counting_sql = count_query(sql_query)
+    if cost_gate:
+        rejected_reason = check_plan(explain_query(conn, counting_sql, query_params))
+        if rejected_reason:
+            logger.info(f"🔢 Skipped full row count: {rejected_reason}")
+            return None
+
+    with conn.cursor() as cursor:
         cursor.execute(
-            "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = 'activities' and column_name != 'athlete_id' ORDER BY ordinal_position;"
+            f"SAVEPOINT row_count; SET LOCAL statement_timeout = {max(SQL_COUNT_TIMEOUT_MS, 0)}"
         )
-        columns = cursor.fetchall()
-
-        column_definitions = [
-            {
-                "name": col[0],
-                "type": col[1],
-                "description": ACTIVITIES_DESCRIPTION["columns"].get(col[0], ""),
-            }
-            for col in columns
-        ]
-
-        # Return simple dict instead of Pydantic object to avoid serialization issues
-        return [
-            {
-                "name": "activities",
-                "columns": column_definitions,
-                "description": ACTIVITIES_DESCRIPTION["description"],
-            }
-        ]
-
-    finally:
-        cursor.close()
-        conn.close()
-
-
-def execute_sql_query_with_user_context(sql_query, user_id, query_params=None):
+        try:
+            cursor.execute(counting_sql, query_params)
+            return cursor.fetchone()[0]
+        except psycopg2.errors.QueryCanceled:
+            logger.info(f"🔢 Full row count exceeded {SQL_COUNT_TIMEOUT_MS}ms, reporting a lower bound")
+            return None
+        finally:
+            cursor.execute("ROLLBACK TO SAVEPOINT row_count")
+
+
+def _to_columnar(cursor, rows):
+    from .columnar import ColumnarResult  # pandas is only needed by the query path
+
+    return ColumnarResult.from_cursor(cursor, rows)
+
+
+def execute_sql_query_with_user_context(sql_query, user_id, query_params=None, max_rows=None,
+                                        cost_gate=False, columnar=False):
     """
-    Execute a SQL query with RLS user context using session variables.
+    Execute a SQL query with RLS user context scoped to its transaction.
+
+    With ``max_rows`` set, only the first ``max_rows`` rows of a read query
+    are returned and ``truncated`` tells whether rows were left behind.
+    Single SELECTs get a ``LIMIT max_rows + 1`` injected (see ``sql_rewrite``)
+    and are counted only when truncated, so ``row_count`` is the full result
+    size; anything else is read through a server-side cursor that stops after
+    ``max_rows + 1`` rows. When the count is skipped (too costly or too slow)
+    or not possible, ``row_count`` is only that ``max_rows + 1`` lower bound
+    and ``row_count_is_lower_bound`` is set.
+
+    With ``cost_gate`` set, read queries are planned with EXPLAIN first and
+    rejected (via ``error_message``) if the estimates exceed the limits in
+    ``query_guard``.
+
+    With ``columnar`` set, rows are returned under ``columnar`` as a
+    ``ColumnarResult`` (one typed array per column) instead of under ``rows``.
     """
-    conn = get_db_connection()
-    if not conn:
-        return {
-            "success": False,
-            "rows": None,
-            "column_names": None,
-            "row_count": 0,
-            "error_message": "Database connection failed",
-        }
+    try:
+        with db_connection() as conn:
+            return _execute_on_connection(conn, sql_query, user_id, query_params, max_rows, cost_gate, columnar)
+    except (psycopg2.Error, PoolTimeout) as e:
+        logger.error(f"❌ Database connection failed: {e}")
+        return _failed_result("Database connection failed")
 
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+
+def _execute_on_connection(conn, sql_query, user_id, query_params, max_rows=None, cost_gate=False, columnar=False):
+    """Run a query on a pooled connection, scoping RLS to this checkout only."""
     result = {
         "success": False,
         "rows": None,
+        "columnar": None,
         "column_names": None,
         "row_count": 0,
+        "row_count_is_lower_bound": False,
+        "truncated": False,
         "error_message": None,
+        "plan_estimate": None,
     }
 
     try:
-        # Initialize parameters
-        if query_params is None:
-            query_params = ()
-
-        # Set user context for RLS
+        # The RLS context rides along with the first statement of the
+        # transaction and stays in effect until it ends
+        context_sql = _user_context_sql(conn, user_id)
         if user_id:
-            cursor.execute("SET app.current_user_id = %s", (user_id,))
-            logger.info(f"🔒 Set RLS user context: {user_id}")
+            logger.info(f"🔍 Executing SQL with RLS: {sql_query}")
+        else:
+            logger.info(f"🔍 Executing SQL without user context: {sql_query}")
+
+        # Large listings only produce the rows we will show
+        capped = cap_query(sql_query, max_rows) if max_rows is not None else None
+        if capped is not None:
+            logger.info(f"✂️ Capped query at {capped.fetch_limit} rows")
+
+        if cost_gate and _is_read_query(sql_query):
+            estimate = explain_query(
+                conn, capped.sql if capped else sql_query, query_params, setup_sql=context_sql
+            )
+            context_sql = ""
+            rejected_reason = check_plan(estimate)
+            record_estimate(sql_query, estimate, rejected_reason)
+            result["plan_estimate"] = asdict(estimate)
+            if rejected_reason:
+                result["error_message"] = f"Query rejected before execution: {rejected_reason}"
+                return result
+
+        if max_rows is not None and _is_read_query(sql_query):
+            if capped is not None:
+                rows, column_names, total, lower_bound = _fetch_limited(
+                    conn, capped, sql_query, query_params, max_rows, columnar, context_sql, cost_gate
+                )
+            else:
+                rows, column_names, total, lower_bound = _fetch_capped(
+                    conn, sql_query, query_params, max_rows, columnar, context_sql
+                )
+            result["column_names"] = column_names
+            result["columnar" if columnar else "rows"] = rows
+            result["row_count"] = total
+            result["row_count_is_lower_bound"] = lower_bound
+            result["truncated"] = total > len(rows)
+            result["success"] = True
+            return result
 
         # Execute the query - RLS will automatically filter
-        logger.info(f"🔍 Executing SQL with RLS: {sql_query}")
-        cursor.execute(sql_query, query_params)
-        
-        if cursor.description:
-            result["column_names"] = [col.name for col in cursor.description]
-            rows = cursor.fetchall()
-            result["rows"] = [dict(row) for row in rows]
-            result["row_count"] = len(rows)
-        else:
-            conn.commit()
-            
+        cursor_factory = None if columnar else psycopg2.extras.RealDictCursor
+        with conn.cursor(cursor_factory=cursor_factory) as cursor:
+            cursor.execute(context_sql + sql_query, query_params)
+
+            if cursor.description:
+                result["column_names"] = [col.name for col in cursor.description]
+                rows = cursor.fetchall()
+                result["row_count"] = len(rows)
+                if columnar:
+                    result["columnar"] = _to_columnar(cursor, rows)
+                else:
+                    result["rows"] = rows
+            else:
+                conn.commit()
+
         result["success"] = True
-        
+
     except psycopg2.Error as e:
         result["error_message"] = f"Database error: {e}"
         conn.rollback()
     except Exception as e:
         result["error_message"] = f"Unexpected error: {e}"
         conn.rollback()
-    finally:
-        cursor.close()
-        conn.close()
-        
+
+    # Anything still open (including the RLS context) is rolled back when the
+    # connection goes back to the pool, so the next checkout starts clean.
     return result
 
 
-def execute_sql_query(sql_query, athlete_id=None, query_params=None):
+def execute_sql_query(sql_query, athlete_id=None, query_params=None, max_rows=None, cost_gate=False, columnar=False):
     """Execute a SQL query with RLS user context."""
-    if athlete_id:
-        # Use RLS user context
-        return execute_sql_query_with_user_context(sql_query, athlete_id, query_params)
-    else:
-        # No user context - execute without RLS filtering (admin queries)
-        conn = get_db_connection()
-        if not conn:
-            return {
-                "success": False,
-                "rows": None,
-                "column_names": None,
-                "row_count": 0,
-                "error_message": "Database connection failed",
-            }
-
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        result = {
-            "success": False,
-            "rows": None,
-            "column_names": None,
-            "row_count": 0,
-            "error_message": None,
-        }
+    # Without an athlete_id the query runs without RLS filtering (admin queries)
+    return execute_sql_query_with_user_context(sql_query, athlete_id, query_params, max_rows, cost_gate, columnar)
 
-        try:
-            if query_params is None:
-                query_params = ()
 
-            logger.info(f"🔍 Executing SQL without user context: {sql_query}")
-            cursor.execute(sql_query, query_params)
-            
-            if cursor.description:
-                result["column_names"] = [col.name for col in cursor.description]
-                rows = cursor.fetchall()
-                result["rows"] = [dict(row) for row in rows]
-                result["row_count"] = len(rows)
+def _execute_on_replica(sql_query, athlete_id, write_lsn, max_rows, cost_gate, columnar):
+    """Run a read on the replica if it has caught up with the athlete's last write.
+
+    Returns None when the query should run on the primary instead.
+    """
+    router = get_replica_router()
+    try:
+        with db_connection(role="replica") as conn:
+            if not router.is_fresh_for(conn, write_lsn):
+                logger.info(f"↩️ Replica has not replayed athlete {athlete_id}'s last write, using primary")
+                return None
+            result = _execute_on_connection(conn, sql_query, athlete_id, None, max_rows, cost_gate, columnar)
+            if not result["success"] and conn.closed:
+                logger.warning("⚠️ Lost replica connection, retrying on primary")
+                return None
+            return result
+    except (psycopg2.Error, PoolTimeout) as e:
+        logger.warning(f"⚠️ Read replica unavailable, using primary: {e}")
+        return None
+
+
+def _copy_result(result):
+    """Copy of a result whose rows can be edited without touching the original.
+
+    Used on the way into and out of the result cache, so a caller editing
+    the DataFrame built from a ``columnar`` result (which shares its arrays)
+    cannot change what later hits return.
+    """
+    result = dict(result)
+    if result.get("columnar") is not None:
+        result["columnar"] = result["columnar"].copy()
+    if result.get("rows") is not None:
+        result["rows"] = [dict(row) for row in result["rows"]]
+    return result
+
+
+def execute_cached_sql_query(sql_query, athlete_id, max_rows=None, cost_gate=False, columnar=False):
+    """
+    Execute a read query for an athlete, reusing a cached result when possible.
+
+    The athlete's data version is read from the primary first, so a hit costs
+    one primary-key lookup and a miss caches the result under the version it
+    was computed from. Writes bump the version, which retires every cached
+    result for that athlete.
+
+    On a miss, the query runs on the read replica when one is configured and
+    has already replayed the athlete's last write, as proven by comparing WAL
+    positions; otherwise on the primary, reusing the same checkout. Only
+    results from the primary or from such a proven replica are cached.
+    """
+    if not athlete_id or not _is_read_query(sql_query):
+        return execute_sql_query(sql_query, athlete_id, None, max_rows, cost_gate, columnar)
+
+    cache = get_result_cache()
+    # cost_gate is part of the key so an ungated result never answers a gated query
+    key = cache.make_key(athlete_id, sql_query, max_rows, cost_gate, columnar)
+    # Without version tracking there is no way to guard read-your-writes
+    route_to_replica = False
+    result = None
+
+    try:
+        with db_connection() as conn:
+            with conn.cursor() as cursor:
+                data_version = get_data_version(cursor, athlete_id)
+
+            if data_version is not None:
+                version, write_lsn = data_version
+                cached = cache.get(key, version)
+                if cached is not None:
+                    logger.info(f"⚡ Result cache hit for athlete {athlete_id} (version {version})")
+                    cached = _copy_result(cached)
+                    cached["cache_hit"] = True
+                    return cached
+                route_to_replica = has_read_replica()
+
+            if not route_to_replica:
+                result = _execute_on_connection(conn, sql_query, athlete_id, None, max_rows, cost_gate, columnar)
+                result["served_by"] = "primary"
+
+        if route_to_replica:
+            result = _execute_on_replica(sql_query, athlete_id, write_lsn, max_rows, cost_gate, columnar)
+            if result is not None:
+                result["served_by"] = "replica"
             else:
-                conn.commit()
-            result["success"] = True
-            
-        except psycopg2.Error as e:
-            result["error_message"] = f"Database error: {e}"
-            conn.rollback()
-        finally:
-            cursor.close()
-            conn.close()
-            
-        return result
+                result = execute_sql_query(sql_query, athlete_id, None, max_rows, cost_gate, columnar)
+                result["served_by"] = "primary"
+            get_replica_router().record(result["served_by"])
+    except (psycopg2.Error, PoolTimeout) as e:
+        logger.error(f"❌ Database connection failed: {e}")
+        return _failed_result("Database connection failed")
+
+    # _execute_on_replica only returns results from a replica that passed the
+    # WAL position check, so every result here is safe to cache
+    if data_version is not None and result["success"]:
+        cache.put(key, data_version[0], _copy_result(result))
+    result["cache_hit"] = False
+    return result
 
 
 def execute_user_query(sql_query, athlete_id):
@@ -207,8 +527,12 @@ def get_user_activities(athlete_id, limit=None):
 
 
 def get_user_activity_count(athlete_id):
-    """Get total activity count for a user using transaction-level RLS."""
-    result = execute_sql_query_with_user_context("SELECT COUNT(*) FROM activities", athlete_id)
+    """Get total activity count for a user from the maintained athlete_stats rows."""
+    result = execute_sql_query_with_user_context(
+        "SELECT COALESCE(SUM(activity_count), 0) AS count FROM athlete_stats WHERE athlete_id = %s",
+        athlete_id,
+        query_params=(athlete_id,),
+    )
     
     if result["success"] and result["rows"]:
         return result["rows"][0]["count"]
@@ -219,66 +543,66 @@ def get_user_activity_count(athlete_id):
 
 def get_user_from_token():
     """Get current user's athlete_id from most recent valid token."""
-    conn = get_db_connection()
-    if not conn:
-        return None
-
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
     try:
-        cursor.execute("""
-            SELECT athlete_id, access_token, refresh_token, expires_at 
-            FROM user_tokens 
-            ORDER BY updated_at DESC LIMIT 1
-        """)
-        result = cursor.fetchone()
-        if not result:
-            return None
-
-        # Check if token is expired
-        current_time = int(time.time())
-        if result["expires_at"] < current_time:
-            print(
-                f"Token expired, attempting refresh for athlete {result['athlete_id']}"
-            )
-            success = refresh_user_token(result["athlete_id"])
-            if not success:
-                print("Failed to refresh token")
-                return None
-
-        return result["athlete_id"]
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+            cursor.execute("""
+                SELECT athlete_id, access_token, refresh_token, expires_at 
+                FROM user_tokens 
+                ORDER BY updated_at DESC LIMIT 1
+            """)
+            result = cursor.fetchone()
     except Exception as e:
         print(f"Error getting user from token: {e}")
         return None
-    finally:
-        cursor.close()
-        conn.close()
 
+    if not result:
+        return None
 
-def refresh_user_token(athlete_id):
-    """Refresh an expired access token using the refresh token."""
-    conn = get_db_connection()
-    if not conn:
-        return False
+    # Check if token is expired
+    current_time = int(time.time())
+    if result["expires_at"] < current_time:
+        print(
+            f"Token expired, attempting refresh for athlete {result['athlete_id']}"
+        )
+        success = get_valid_access_token(result["athlete_id"]) is not None
+        if not success:
+            print("Failed to refresh token")
+            return None
+
+    return result["athlete_id"]
 
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+
+def _refresh_tokens(athlete_id):
+    """Exchange the athlete's refresh token for new tokens; returns Strava's token data, or None.
+
+    The athlete's tokens are stored in both ``user_tokens`` (webhooks) and
+    ``strava_connections`` (syncs). Strava rotates the refresh token, so both
+    are updated together.
+    """
     try:
-        # Get current refresh token
-        cursor.execute(
-            """
-            SELECT refresh_token FROM user_tokens 
-            WHERE athlete_id = %s
-        """,
-            (athlete_id,),
-        )
-        result = cursor.fetchone()
+        with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+            # Get current refresh token: the most recently written copy, in
+            # case a connection or refresh only reached one of the tables
+            cursor.execute(
+                """
+                SELECT refresh_token, updated_at FROM user_tokens
+                WHERE athlete_id = %s
+                UNION ALL
+                SELECT refresh_token, updated_at::timestamptz FROM strava_connections
+                WHERE athlete_id = %s
+                ORDER BY updated_at DESC NULLS LAST
+                LIMIT 1
+            """,
+                (athlete_id, athlete_id),
+            )
+            result = cursor.fetchone()
         if not result:
             print(f"No refresh token found for athlete {athlete_id}")
-            return False
+            return None
 
         refresh_token = result["refresh_token"]
 
-        # Call Strava token refresh endpoint
-        token_url = "https://www.strava.com/oauth/token"
+        # Call Strava token refresh endpoint (without holding a pooled connection)
         data = {
             "client_id": os.getenv("CLIENT_ID"),
             "client_secret": os.getenv("CLIENT_SECRET"),
@@ -286,86 +610,111 @@ def refresh_user_token(athlete_id):
             "grant_type": "refresh_token",
         }
 
-        response = requests.post(token_url, data=data)
+        response = get_strava_client().request(
+            "POST", f"{STRAVA_OAUTH_URL}/token", data=data, rate_limited=False
+        )
 
         if response.status_code == 200:
             token_data = response.json()
 
             # Update the token in database
-            cursor.execute(
-                """
-                UPDATE user_tokens 
-                SET access_token = %s, 
-                    refresh_token = %s, 
-                    expires_at = %s,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE athlete_id = %s
-            """,
-                (
-                    token_data["access_token"],
-                    token_data["refresh_token"],
-                    token_data["expires_at"],
-                    athlete_id,
-                ),
-            )
-            conn.commit()
+            with db_connection() as conn, conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE user_tokens 
+                    SET access_token = %s, 
+                        refresh_token = %s, 
+                        expires_at = %s,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE athlete_id = %s
+                """,
+                    (
+                        token_data["access_token"],
+                        token_data["refresh_token"],
+                        token_data["expires_at"],
+                        athlete_id,
+                    ),
+                )
+                cursor.execute(
+                    """
+                    UPDATE strava_connections
+                    SET access_token = %s,
+                        refresh_token = %s,
+                        expires_at = to_timestamp(%s) AT TIME ZONE 'UTC',
+                        updated_at = NOW()
+                    WHERE athlete_id = %s
+                """,
+                    (
+                        token_data["access_token"],
+                        token_data["refresh_token"],
+                        token_data["expires_at"],
+                        athlete_id,
+                    ),
+                )
+                conn.commit()
+            get_access_token_cache().put(athlete_id, token_data["access_token"], token_data["expires_at"])
 
             print(f"Successfully refreshed token for athlete {athlete_id}")
-            return True
+            return token_data
         else:
             print(f"Token refresh failed: {response.status_code} - {response.text}")
-            return False
+            return None
 
     except Exception as e:
         print(f"Error refreshing token: {e}")
-        return False
-    finally:
-        cursor.close()
-        conn.close()
+        return None
 
 
 def get_valid_access_token(athlete_id):
-    """Get a valid access token for the athlete, refreshing if necessary."""
-    conn = get_db_connection()
-    if not conn:
+    """Get a valid access token for the athlete, refreshing if necessary.
+
+    Served from the process-wide token cache; only one load or refresh per
+    athlete runs at a time, and concurrent callers share its result.
+    """
+    try:
+        return get_access_token_cache().get(athlete_id, lambda: _load_access_token(athlete_id))
+    except Exception as e:
+        print(f"Error getting valid access token: {e}")
         return None
 
-    cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+
+def refresh_access_token(athlete_id):
+    """Refresh the athlete's token now, even if it is still valid; returns whether it worked.
+
+    Shares the single-flight slot with lazy refreshes, so it never runs
+    alongside another refresh for the same athlete in this process.
+    """
     try:
+        return get_access_token_cache().get(
+            athlete_id, lambda: _load_access_token(athlete_id, force_refresh=True), force=True
+        ) is not None
+    except Exception as e:
+        print(f"Error refreshing access token: {e}")
+        return False
+
+
+def _load_access_token(athlete_id, force_refresh=False):
+    """(access_token, expires_at) from the database, refreshed first if it is about to expire."""
+    if force_refresh:
+        token_data = _refresh_tokens(athlete_id)
+        return (token_data["access_token"], token_data["expires_at"]) if token_data else None
+
+    with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
         cursor.execute(
             """
-            SELECT access_token, refresh_token, expires_at 
+            SELECT access_token, expires_at 
             FROM user_tokens 
             WHERE athlete_id = %s
         """,
             (athlete_id,),
         )
         result = cursor.fetchone()
-        if not result:
-            return None
-
-        # Check if token is expired
-        current_time = int(time.time())
-        if result["expires_at"] < current_time:
-            # Try to refresh the token
-            if refresh_user_token(athlete_id):
-                # Re-fetch the updated token
-                cursor.execute(
-                    """
-                    SELECT access_token FROM user_tokens 
-                    WHERE athlete_id = %s
-                """,
-                    (athlete_id,),
-                )
-                updated_result = cursor.fetchone()
-                return updated_result["access_token"] if updated_result else None
-            else:
-                return None
 
-        return result["access_token"]
-    except Exception as e:
-        print(f"Error getting valid access token: {e}")
+    if not result:
         return None
-    finally:
-        cursor.close()
-        conn.close()
+    if get_access_token_cache().is_fresh(result["expires_at"]):
+        return result["access_token"], result["expires_at"]
+
+    # Refresh (our connection is released first so the refresh does not need
+    # a second one from the pool)
+    return _load_access_token(athlete_id, force_refresh=True)
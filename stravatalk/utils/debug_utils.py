@@ -157,13 +157,52 @@ def show_sql_debug(sql_query, execution_result, container=st):
         
         container.write("**Execution Result:**")
         container.write(f"- Success: {execution_result.get('success', False)}")
-        container.write(f"- Row count: {execution_result.get('row_count', 0)}")
+        lower_bound = " (lower bound, full count skipped)" if execution_result.get('row_count_is_lower_bound') else ""
+        container.write(f"- Row count: {execution_result.get('row_count', 0)}{lower_bound}")
         
         if execution_result.get('error_message'):
             container.error(f"Error: {execution_result['error_message']}")
         
         if execution_result.get('column_names'):
             container.write(f"- Columns: {execution_result['column_names']}")
+        
+        if execution_result.get('plan_estimate'):
+            container.write(f"- Plan estimate: {execution_result['plan_estimate']}")
+            show_plan_estimate_history(container)
+
+        if execution_result.get('cache_hit'):
+            container.write("- Served from result cache")
+        elif execution_result.get('served_by'):
+            container.write(f"- Served by: {execution_result['served_by']}")
+        show_result_cache_stats(container)
+
+def show_result_cache_stats(container=st):
+    """Show the query result cache counters of this Streamlit process"""
+    from .result_cache import get_result_cache_stats
+
+    stats = get_result_cache_stats()
+    container.write(
+        f"- Result cache: {stats['hit_rate']:.0%} hit rate ({stats['hits']} hits, {stats['misses']} misses, "
+        f"{stats['stale']} stale), {stats['entries']}/{stats['max_entries']} entries, "
+        f"{stats['evictions']} evictions"
+    )
+
+def show_plan_estimate_history(container=st):
+    """Show the cost gate's recent plan estimates, newest first, for threshold tuning"""
+    from .query_guard import SQL_MAX_PLAN_COST, SQL_MAX_PLAN_ROWS, get_recent_plan_estimates
+
+    estimates = get_recent_plan_estimates()
+    if not estimates:
+        return
+    history = pd.DataFrame(reversed(estimates))
+    history["timestamp"] = pd.to_datetime(history["timestamp"], unit="s")
+    container.write(
+        f"**Recent plan estimates** ({len(history)}, {int(history['rejected'].sum())} rejected; "
+        f"limits: cost {SQL_MAX_PLAN_COST:,.0f}, node rows {SQL_MAX_PLAN_ROWS:,.0f}):"
+    )
+    container.dataframe(history[[
+        "timestamp", "total_cost", "plan_rows", "max_node_rows", "node_type", "rejected", "reason", "sql_query",
+    ]])
 
 def show_orchestrator_debug(query, classification, sql_output, execution_result, response_output, container=st):
     """Show complete orchestrator debug information"""
@@ -189,6 +228,7 @@ def show_orchestrator_debug(query, classification, sql_output, execution_result,
             container.json({
                 "success": execution_result.get('success', False),
                 "row_count": execution_result.get('row_count', 0),
+                "row_count_is_lower_bound": execution_result.get('row_count_is_lower_bound', False),
                 "columns": execution_result.get('column_names', []),
                 "error": execution_result.get('error_message')
             })
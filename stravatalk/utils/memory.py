@@ -126,10 +126,13 @@ class ConversationMemory:
         
         return memory
 
-def create_data_summary(data: Any, query_type: str, result_count: int) -> str:
+def create_data_summary(data: Any, query_type: str, result_count: int,
+                        result_count_is_lower_bound: bool = False) -> str:
     """Create a brief summary of query results for memory."""
     if data is None or result_count == 0:
         return "No results found"
+    if result_count_is_lower_bound:
+        result_count = f"at least {result_count}"
     
     # Handle pandas DataFrame check properly
     if hasattr(data, 'empty') and data.empty:
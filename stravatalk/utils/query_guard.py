@@ -0,0 +1,112 @@
+"""
+Pre-flight cost gate for LLM-generated SQL.
+
+Before a generated query runs, ``EXPLAIN (FORMAT JSON)`` is executed in the same
+transaction as the query (so RLS applies) and the planner's estimates are checked
+against configurable limits. Every estimate is logged, and the most recent ones
+are shown in the SQL debug panel, so the thresholds can be tuned from real
+traffic.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Planner cost units for the whole query, and estimated rows produced by any
+# single plan node (catches accidental cross joins even under an aggregate)
+SQL_MAX_PLAN_COST = float(os.getenv("SQL_MAX_PLAN_COST", "500000"))
+SQL_MAX_PLAN_ROWS = float(os.getenv("SQL_MAX_PLAN_ROWS", "5000000"))
+PLAN_ESTIMATE_HISTORY = int(os.getenv("PLAN_ESTIMATE_HISTORY", "500"))
+
+
+@dataclass
+class PlanEstimate:
+    """Planner estimates for a single query."""
+    total_cost: float
+    plan_rows: float
+    max_node_rows: float
+    node_type: str
+
+
+def _walk_plan(plan: Dict[str, Any]):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk_plan(child)
+
+
+def explain_query(conn, sql_query: str, query_params=None, setup_sql: str = "") -> PlanEstimate:
+    """Plan (but do not run) a query and return the planner's estimates.
+
+    ``setup_sql`` (e.g. the RLS context) is sent in the same round trip, ahead
+    of the EXPLAIN.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(setup_sql + "EXPLAIN (FORMAT JSON) " + sql_query, query_params)
+        plan_json = cursor.fetchone()[0]
+
+    if isinstance(plan_json, str):
+        plan_json = json.loads(plan_json)
+    root = plan_json[0]["Plan"]
+
+    return PlanEstimate(
+        total_cost=float(root.get("Total Cost", 0.0)),
+        plan_rows=float(root.get("Plan Rows", 0.0)),
+        max_node_rows=max(float(node.get("Plan Rows", 0.0)) for node in _walk_plan(root)),
+        node_type=root.get("Node Type", ""),
+    )
+
+
+def check_plan(estimate: PlanEstimate, max_cost: float = SQL_MAX_PLAN_COST,
+               max_rows: float = SQL_MAX_PLAN_ROWS) -> Optional[str]:
+    """Return the reason a plan is rejected, or None if it is within limits."""
+    if max_cost > 0 and estimate.total_cost > max_cost:
+        return (
+            f"estimated cost {estimate.total_cost:,.0f} exceeds the limit of {max_cost:,.0f}. "
+            "Try narrowing the time range or activity type."
+        )
+    if max_rows > 0 and estimate.max_node_rows > max_rows:
+        return (
+            f"it would process an estimated {estimate.max_node_rows:,.0f} rows "
+            f"(limit {max_rows:,.0f}), which usually means an unintended join."
+        )
+    return None
+
+
+_recent_estimates = deque(maxlen=PLAN_ESTIMATE_HISTORY)
+_recent_lock = threading.Lock()
+
+
+def record_estimate(sql_query: str, estimate: PlanEstimate, rejected_reason: Optional[str]):
+    """Log an estimate and keep it in the in-process history."""
+    entry = {
+        "timestamp": time.time(),
+        "sql_query": sql_query,
+        "rejected": rejected_reason is not None,
+        "reason": rejected_reason,
+        **asdict(estimate),
+    }
+    with _recent_lock:
+        _recent_estimates.append(entry)
+
+    logger.info(
+        "📏 Plan estimate: cost=%.1f rows=%.0f max_node_rows=%.0f node=%s rejected=%s",
+        estimate.total_cost, estimate.plan_rows, estimate.max_node_rows,
+        estimate.node_type, entry["rejected"],
+    )
+
+
+def get_recent_plan_estimates() -> List[Dict[str, Any]]:
+    """Return recorded estimates, oldest first."""
+    with _recent_lock:
+        return list(_recent_estimates)
@@ -0,0 +1,99 @@
+"""
+Routing of read-only user queries to a read replica.
+
+When ``DATABASE_READ_URL`` is set, analytical queries may run on the replica
+instead of the primary that syncs and webhooks write to. To keep
+read-your-writes, a query is only sent to the replica once it has replayed
+the athlete's last write: the WAL position of that write
+(``athlete_data_versions.last_write_lsn``, read on the primary) is compared
+with the replica's ``pg_last_wal_replay_lsn()``. A server that is not
+replaying WAL cannot prove that, so it is never used. The replay position is
+remembered, so most routing decisions cost no extra round trip.
+"""
+
+import os
+import time
+import threading
+import logging
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How long a measured replay position is trusted before it is re-read anyway
+REPLICA_LAG_RECHECK_SECONDS = float(os.getenv("REPLICA_LAG_RECHECK_SECONDS", "5"))
+
+REPLAY_POSITION_QUERY = "SELECT pg_is_in_recovery(), pg_last_wal_replay_lsn()::TEXT"
+
+
+def parse_lsn(lsn: str) -> int:
+    """Byte position of a textual WAL location such as ``16/B374D848``."""
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+class ReplicaRouter:
+    """Decides whether the replica is fresh enough for an athlete's query."""
+
+    def __init__(self, recheck_seconds: float = REPLICA_LAG_RECHECK_SECONDS):
+        self._recheck_seconds = recheck_seconds
+        self._lock = threading.Lock()
+        self._replayed_through: Optional[str] = None
+        self._is_standby = True
+        self._checked_at = 0.0
+        self._stats = {"replica_reads": 0, "primary_fallbacks": 0, "lag_checks": 0}
+
+    def _measure(self, conn):
+        with conn.cursor() as cursor:
+            cursor.execute(REPLAY_POSITION_QUERY)
+            in_recovery, replayed_through = cursor.fetchone()
+        with self._lock:
+            self._is_standby = bool(in_recovery)
+            self._replayed_through = replayed_through
+            self._checked_at = time.monotonic()
+            self._stats["lag_checks"] += 1
+
+    def _covers(self, write_lsn: Optional[str]) -> bool:
+        if write_lsn is None:
+            return True
+        if not self._is_standby or self._replayed_through is None:
+            return False
+        return parse_lsn(self._replayed_through) >= parse_lsn(write_lsn)
+
+    def is_fresh_for(self, conn, write_lsn: Optional[str]) -> bool:
+        """Whether the replica behind ``conn`` has replayed the write at WAL position ``write_lsn``.
+
+        The remembered replay position is used when it already covers the
+        write; otherwise (or when it is too old) it is re-measured once.
+        """
+        with self._lock:
+            recent = time.monotonic() - self._checked_at < self._recheck_seconds
+            if recent and self._covers(write_lsn):
+                return True
+
+        self._measure(conn)
+        with self._lock:
+            return self._covers(write_lsn)
+
+    def record(self, served_by: str):
+        with self._lock:
+            key = "replica_reads" if served_by == "replica" else "primary_fallbacks"
+            self._stats[key] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["replayed_through"] = self._replayed_through
+            stats["is_standby"] = self._is_standby
+        return stats
+
+
+_router = ReplicaRouter()
+
+
+def get_replica_router() -> ReplicaRouter:
+    """Return the process-wide replica router."""
+    return _router
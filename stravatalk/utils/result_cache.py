@@ -0,0 +1,175 @@
+"""
+Per-athlete cache of SQL query results.
+
+Results are keyed by (athlete_id, normalized SQL, execution options) and tagged
+with the athlete's data version from ``athlete_data_versions``. Every write to
+an athlete's activities bumps that version in the same transaction, so a cached
+result is served only while the data it was computed from is unchanged. A
+lookup costs a single primary-key read instead of re-running the query.
+"""
+
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import psycopg2
+import sqlparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256"))  # 0 disables the cache
+
+# The write's WAL position is not known until it commits, so it is cleared
+# here and recorded by commit_data_versions
+BUMP_DATA_VERSION_SQL = """
+    INSERT INTO athlete_data_versions (athlete_id, version, last_write_lsn, updated_at)
+    VALUES (%s, 1, NULL, NOW())
+    ON CONFLICT (athlete_id) DO UPDATE SET
+        version = athlete_data_versions.version + 1,
+        last_write_lsn = NULL,
+        updated_at = NOW()
+    RETURNING version
+"""
+
+# Only for versions no later write has replaced; the insert position is past
+# the commit record of every transaction that committed before it is read
+RECORD_WRITE_LSN_SQL = """
+    UPDATE athlete_data_versions AS v SET last_write_lsn = pg_current_wal_insert_lsn()
+    FROM unnest(%s::BIGINT[], %s::BIGINT[]) AS committed (athlete_id, version)
+    WHERE v.athlete_id = committed.athlete_id AND v.version = committed.version
+"""
+
+# A version whose write position is not recorded yet falls back to the
+# primary's current position, which is past that write as well
+GET_DATA_VERSION_SQL = """
+    SELECT version, COALESCE(last_write_lsn, pg_current_wal_insert_lsn())::TEXT
+    FROM athlete_data_versions WHERE athlete_id = %s
+"""
+
+
+def bump_data_version(cursor, athlete_id: int) -> int:
+    """Invalidate cached results for an athlete; returns the new version.
+
+    Must run in the same transaction as the write it describes, so readers never
+    see new data under an old version. Commit that transaction with
+    ``commit_data_versions``.
+    """
+    cursor.execute(BUMP_DATA_VERSION_SQL, (athlete_id,))
+    return cursor.fetchone()[0]
+
+
+def commit_data_versions(conn, versions: Dict[int, int]):
+    """Commit a write and record its WAL position for the versions it bumped.
+
+    ``versions`` maps athlete ids to the versions returned by
+    ``bump_data_version``. The write is committed even if recording its
+    position fails; readers then compare against the primary's current
+    position instead, which only keeps them on the primary for longer.
+    """
+    conn.commit()
+    if not versions:
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(RECORD_WRITE_LSN_SQL, (list(versions), list(versions.values())))
+        conn.commit()
+    except psycopg2.Error as e:
+        conn.rollback()
+        logger.warning(f"⚠️ Could not record write position for athletes {sorted(versions)}: {e}")
+
+
+def get_data_version(cursor, athlete_id: int) -> Optional[Tuple[int, Optional[str]]]:
+    """Read an athlete's (data version, last write LSN), or None if untracked.
+
+    Runs on the primary. An athlete who was never written has version 0 and
+    no last write LSN.
+    """
+    try:
+        cursor.execute(GET_DATA_VERSION_SQL, (athlete_id,))
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else (0, None)
+    except psycopg2.errors.UndefinedTable:
+        cursor.connection.rollback()
+        return None
+
+
+def normalize_sql(sql_query: str) -> str:
+    """Canonical form of a query for cache keys (comments and layout removed)."""
+    normalized = sqlparse.format(sql_query, strip_comments=True, strip_whitespace=True)
+    return normalized.strip().rstrip(";").strip()
+
+
+class QueryResultCache:
+    """Size-bounded LRU of query results tagged with the athlete's data version."""
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "stores": 0}
+
+    @staticmethod
+    def make_key(athlete_id: int, sql_query: str, *options: Hashable) -> Tuple:
+        return (athlete_id, normalize_sql(sql_query)) + tuple(options)
+
+    def get(self, key: Tuple, version: int) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result if it was computed at ``version``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            cached_version, result = entry
+            if cached_version != version:
+                # The athlete's data changed since this was cached
+                del self._entries[key]
+                self._stats["stale"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return dict(result)
+
+    def put(self, key: Tuple, version: int, result: Dict[str, Any]):
+        """Store a result computed at ``version``, evicting the least recently used."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, dict(result))
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["max_entries"] = self.max_entries
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_result_cache = QueryResultCache()
+
+
+def get_result_cache() -> QueryResultCache:
+    """Return the process-wide result cache."""
+    return _result_cache
+
+
+def get_result_cache_stats() -> Dict[str, Any]:
+    """Return statistics for the process-wide result cache."""
+    return _result_cache.stats()
@@ -0,0 +1,92 @@
+"""
+Process-wide cache of the table definitions exposed to the SQL agent.
+
+The schema only changes when a migration runs, so it is introspected once per
+process and rebuilt only when the migration marker recorded by
+``migrations/run_migration.py`` changes. The marker is re-checked at most every
+``SCHEMA_CACHE_RECHECK_SECONDS``.
+"""
+
+import os
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import psycopg2
+
+from .db_pool import db_connection
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_CACHE_RECHECK_SECONDS = float(os.getenv("SCHEMA_CACHE_RECHECK_SECONDS", "300"))
+
+# Number of recorded migrations and when the latest was (re-)applied. Version
+# names are not compared: a migration recorded out of order, such as a
+# backfill finishing after later migrations, or one applied again must still
+# change the marker.
+SCHEMA_VERSION_QUERY = "SELECT count(*), MAX(applied_at) FROM schema_migrations"
+
+
+def render_schema_description(table_definitions: List[Dict[str, Any]]) -> str:
+    """Render table definitions as the schema block used in the SQL agent prompt."""
+    parts = []
+    for table in table_definitions:
+        parts.append(f"\nTable: {table['name']}\n")
+        parts.append(f"Description: {table['description']}\n")
+        parts.append("Columns:\n")
+        for col in table['columns']:
+            parts.append(f"  - {col['name']} ({col['type']}): {col['description']}\n")
+    return "".join(parts)
+
+
+def get_schema_version(cursor) -> Optional[Tuple[int, Any]]:
+    """Read the migration marker, or None if migrations are not tracked."""
+    try:
+        cursor.execute(SCHEMA_VERSION_QUERY)
+        row = cursor.fetchone()
+        return tuple(row) if row else None
+    except psycopg2.errors.UndefinedTable:
+        cursor.connection.rollback()
+        return None
+
+
+class SchemaCache:
+    """Caches table definitions and their rendered prompt description."""
+
+    def __init__(self, loader: Callable, recheck_seconds: float = SCHEMA_CACHE_RECHECK_SECONDS):
+        self._loader = loader
+        self._recheck_seconds = recheck_seconds
+        self._lock = threading.Lock()
+        self._tables = None
+        self._description = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self) -> Tuple[List[Dict[str, Any]], str]:
+        """Return (table_definitions, schema_description), rebuilding if stale."""
+        if self._tables is not None and time.monotonic() - self._checked_at < self._recheck_seconds:
+            return self._tables, self._description
+
+        with self._lock:
+            if self._tables is not None and time.monotonic() - self._checked_at < self._recheck_seconds:
+                return self._tables, self._description
+
+            with db_connection() as conn, conn.cursor() as cursor:
+                version = get_schema_version(cursor)
+                if self._tables is None or version != self._version:
+                    tables = self._loader(cursor)
+                    self._tables = tables
+                    self._description = render_schema_description(tables)
+                    self._version = version
+                    logger.info(f"📐 Built schema cache (migration marker: {version})")
+
+            self._checked_at = time.monotonic()
+            return self._tables, self._description
+
+    def invalidate(self):
+        """Force the next lookup to re-introspect the schema."""
+        with self._lock:
+            self._tables = None
+            self._description = None
+            self._checked_at = 0.0
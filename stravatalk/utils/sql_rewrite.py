@@ -0,0 +1,99 @@
+"""
+Row-cap rewriting for LLM-generated SQL.
+
+The app only ever shows the first few rows of a result, so a generated SELECT
+is rewritten to ask the server for no more than that: its top-level LIMIT is
+injected (or tightened) to ``max_rows + 1``. The extra row tells us whether
+the result was truncated without producing the rest of it, and lets the
+planner use top-N sorts and stop scans early. The full row count is only
+computed, with a separate ``count(*)``, when the result was truncated.
+
+Statements the rewriter does not understand are left alone and run through the
+server-side cursor path instead.
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import sqlparse
+from sqlparse import sql as sql_tokens
+from sqlparse import tokens as T
+
+logger = logging.getLogger(__name__)
+
+# Top-level clauses that make a LIMIT rewrite unsafe or meaningless
+UNSUPPORTED_KEYWORDS = {"FETCH", "FOR", "INTO"}
+
+
+@dataclass
+class CappedQuery:
+    """A read query rewritten to return at most ``fetch_limit`` rows."""
+    sql: str
+    fetch_limit: int
+    # False when the query's own LIMIT is already within the cap, so the rows
+    # fetched are the whole result
+    may_truncate: bool
+
+
+def _top_level_tokens(token_list):
+    """Leaf tokens outside parentheses (subqueries, CTE bodies, function calls)."""
+    for token in token_list.tokens:
+        if isinstance(token, sql_tokens.Parenthesis):
+            continue
+        if token.is_group:
+            yield from _top_level_tokens(token)
+        elif not token.is_whitespace:
+            yield token
+
+
+def _strip(sql_query: str) -> str:
+    """The query without comments or a trailing semicolon."""
+    return sqlparse.format(sql_query, strip_comments=True).strip().rstrip(";").rstrip()
+
+
+def _single_statement(sql_query: str) -> Optional[sql_tokens.Statement]:
+    statements = [statement for statement in sqlparse.parse(_strip(sql_query)) if _strip(str(statement))]
+    if len(statements) != 1:
+        return None
+    return statements[0]
+
+
+def cap_query(sql_query: str, max_rows: int) -> Optional[CappedQuery]:
+    """Rewrite a single SELECT so it returns at most ``max_rows + 1`` rows.
+
+    Returns None if the statement is not a single SELECT or its row limit
+    cannot be rewritten safely (placeholders, FETCH FIRST, FOR UPDATE, ...).
+    """
+    statement = _single_statement(sql_query)
+    if statement is None or statement.get_type() != "SELECT":
+        return None
+
+    fetch_limit = max_rows + 1
+    tokens = list(_top_level_tokens(statement))
+    if any(token.normalized in UNSUPPORTED_KEYWORDS for token in tokens if token.is_keyword):
+        return None
+
+    limit_index = next(
+        (i for i, token in enumerate(tokens) if token.is_keyword and token.normalized == "LIMIT"), None
+    )
+    if limit_index is not None:
+        if limit_index + 1 >= len(tokens):
+            return None
+        value = tokens[limit_index + 1]
+        if value.ttype in T.Literal.Number.Integer:
+            if int(value.value) <= max_rows:
+                return CappedQuery(sql_query, max_rows, may_truncate=False)
+        elif not (value.is_keyword and value.normalized == "ALL"):
+            return None  # LIMIT %s, LIMIT (subquery), ...
+        value.value = str(fetch_limit)
+        rewritten = str(statement)
+    else:
+        rewritten = f"{statement}\nLIMIT {fetch_limit}"
+
+    return CappedQuery(_strip(rewritten), fetch_limit, may_truncate=True)
+
+
+def count_query(sql_query: str) -> str:
+    """Count the rows of the original (uncapped) query without returning them."""
+    return f"SELECT count(*) FROM (\n{_strip(sql_query)}\n) AS uncapped"
@@ -0,0 +1,189 @@
+"""
+Shared HTTP client for every call to Strava.
+
+One ``requests.Session`` per process keeps TLS connections to Strava alive
+across calls (sync pages, webhook fetches, token refreshes). Every request
+goes through the same path:
+
+- API calls take a token from the process-wide ``StravaRateLimiter`` and feed
+  the ``X-RateLimit-*`` headers of the response back into it; OAuth token
+  calls are not rate limited by Strava and skip it.
+- 429 and 5xx answers and connection errors are retried with full-jitter
+  exponential backoff (a 429 also marks the rate-limit window as spent, so the
+  retry waits for the next one, up to ``max_wait``).
+- Interactive requests wait at most ``STRAVA_INTERACTIVE_MAX_WAIT_SECONDS``
+  for a rate-limit token and otherwise fail fast with ``RateLimitExceeded``,
+  rather than holding a webhook or OAuth call until the next 15-minute window.
+- Latency, errors and retries are recorded per endpoint for
+  ``/health/strava``.
+
+``arequest`` is the async variant for the FastAPI services: it runs the same
+pooled request on the HTTP thread pool from ``async_executor``.
+"""
+
+import os
+import re
+import time
+import random
+import logging
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from .async_executor import HTTP_EXECUTOR_MAX_WORKERS, run_http
+from .strava_rate_limit import get_strava_rate_limiter
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+STRAVA_API_URL = os.getenv("STRAVA_API_URL", "https://www.strava.com/api/v3")
+STRAVA_OAUTH_URL = os.getenv("STRAVA_OAUTH_URL", "https://www.strava.com/oauth")
+
+STRAVA_CONNECT_TIMEOUT = float(os.getenv("STRAVA_CONNECT_TIMEOUT", "5"))
+STRAVA_READ_TIMEOUT = float(os.getenv("STRAVA_READ_TIMEOUT", "30"))
+STRAVA_HTTP_MAX_RETRIES = int(os.getenv("STRAVA_HTTP_MAX_RETRIES", "3"))
+STRAVA_HTTP_BACKOFF_SECONDS = float(os.getenv("STRAVA_HTTP_BACKOFF_SECONDS", "0.5"))
+# Keep-alive connections per host; every HTTP executor thread can hold one
+STRAVA_HTTP_POOL_SIZE = int(os.getenv("STRAVA_HTTP_POOL_SIZE", str(HTTP_EXECUTOR_MAX_WORKERS)))
+# Longest an interactive (non-background) request waits for a rate-limit token
+STRAVA_INTERACTIVE_MAX_WAIT_SECONDS = float(os.getenv("STRAVA_INTERACTIVE_MAX_WAIT_SECONDS", "5"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+LATENCY_SAMPLES = 200
+
+
+def _endpoint_label(method: str, url: str) -> str:
+    """``GET /activities/{id}`` style label, so metrics don't grow per activity."""
+    path = re.sub(r"^https?://[^/]+", "", url).split("?", 1)[0]
+    return f"{method.upper()} {re.sub(r'/[0-9]+(?=/|$)', '/{id}', path)}"
+
+
+class StravaClient:
+    """Pooled, rate-limited, retrying client for the Strava API and OAuth endpoints."""
+
+    def __init__(self, api_url: str = STRAVA_API_URL, pool_size: int = STRAVA_HTTP_POOL_SIZE,
+                 max_retries: int = STRAVA_HTTP_MAX_RETRIES):
+        self.api_url = api_url.rstrip("/")
+        self.max_retries = max_retries
+        self.timeout = (STRAVA_CONNECT_TIMEOUT, STRAVA_READ_TIMEOUT)
+        self.session = requests.Session()
+        # Retries are handled here, where the rate limiter and metrics can see them
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+
+    def _record(self, endpoint: str, elapsed: float, status: Optional[int], retried: bool):
+        with self._lock:
+            metrics = self._metrics.setdefault(endpoint, {
+                "requests": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "latencies_ms": deque(maxlen=LATENCY_SAMPLES),
+            })
+            elapsed_ms = elapsed * 1000
+            metrics["requests"] += 1
+            metrics["retries"] += int(retried)
+            metrics["errors"] += int(status is None or status >= 400)
+            metrics["total_ms"] += elapsed_ms
+            metrics["max_ms"] = max(metrics["max_ms"], elapsed_ms)
+            metrics["latencies_ms"].append(elapsed_ms)
+
+    def _backoff(self, attempt: int):
+        time.sleep(random.uniform(0, STRAVA_HTTP_BACKOFF_SECONDS * 2 ** attempt))
+
+    def request(self, method: str, url: str, access_token: Optional[str] = None, rate_limited: bool = True,
+                background: bool = False, max_wait: Optional[float] = None,
+                retries: Optional[int] = None, **kwargs) -> requests.Response:
+        """Send a request and return the final response (after any retries).
+
+        ``url`` may be a path under the API base URL. ``background`` requests
+        (syncs) leave the rate-limit reserve for interactive ones. A request
+        that cannot get a rate-limit token within ``max_wait`` seconds raises
+        ``RateLimitExceeded``; ``max_wait`` defaults to
+        ``STRAVA_INTERACTIVE_MAX_WAIT_SECONDS`` for interactive requests and
+        to no limit for background ones. Connection errors are raised once
+        retries run out.
+        """
+        if not url.startswith(("http://", "https://")):
+            url = f"{self.api_url}{url}"
+        if access_token:
+            kwargs["headers"] = {**kwargs.get("headers", {}), "Authorization": f"Bearer {access_token}"}
+        kwargs.setdefault("timeout", self.timeout)
+        retries = self.max_retries if retries is None else retries
+        if max_wait is None and not background:
+            max_wait = STRAVA_INTERACTIVE_MAX_WAIT_SECONDS
+        endpoint = _endpoint_label(method, url)
+        limiter = get_strava_rate_limiter()
+
+        for attempt in range(retries + 1):
+            if rate_limited:
+                limiter.acquire(max_wait=max_wait, use_reserve=not background)
+            started = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(endpoint, time.perf_counter() - started, None, attempt > 0)
+                if attempt == retries:
+                    raise
+                logger.warning(f"⚠️ {endpoint} failed ({e}), retrying")
+                self._backoff(attempt)
+                continue
+
+            self._record(endpoint, time.perf_counter() - started, response.status_code, attempt > 0)
+            if rate_limited:
+                if response.status_code == 429:
+                    limiter.throttled(response.headers)
+                else:
+                    limiter.update(response.headers)
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            logger.warning(f"⚠️ {endpoint} returned {response.status_code}, retrying")
+            self._backoff(attempt)
+
+    async def arequest(self, method: str, url: str, **kwargs) -> requests.Response:
+        """``request`` for async code, run on the HTTP thread pool."""
+        return await run_http(self.request, method, url, **kwargs)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-endpoint request counts and latency (average, p50, p95, max) in ms."""
+        with self._lock:
+            snapshot = {endpoint: dict(metrics) for endpoint, metrics in self._metrics.items()}
+        stats = {}
+        for endpoint, metrics in snapshot.items():
+            latencies = sorted(metrics.pop("latencies_ms"))
+            stats[endpoint] = {
+                "requests": metrics["requests"],
+                "errors": metrics["errors"],
+                "retries": metrics["retries"],
+                "avg_ms": round(metrics["total_ms"] / metrics["requests"], 1),
+                "p50_ms": round(latencies[len(latencies) // 2], 1),
+                "p95_ms": round(latencies[max(int(len(latencies) * 0.95) - 1, 0)], 1),
+                "max_ms": round(metrics["max_ms"], 1),
+            }
+        return stats
+
+
+_client: Optional[StravaClient] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_strava_client() -> StravaClient:
+    """Return the process-wide Strava client (rebuilt after a fork, like the DB pools)."""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = StravaClient()
+                _client_pid = os.getpid()
+    return _client
+
+
+def get_strava_client_stats() -> Dict[str, Any]:
+    """Endpoint metrics and rate-limit usage for the health endpoint."""
+    return {"endpoints": get_strava_client().stats(), "rate_limit": get_strava_rate_limiter().stats()}
@@ -0,0 +1,152 @@
+"""
+Process-wide budget for Strava API requests.
+
+Strava limits each application to a number of requests per 15 minutes (windows
+start on the quarter hour, UTC) and per UTC day, and reports both the limits
+and the usage so far on every response (``X-RateLimit-Limit: 200,2000``,
+``X-RateLimit-Usage: 35,410``). ``StravaRateLimiter`` is a token bucket over
+those windows: each request takes a token, the bucket refills when a window
+rolls over, and every response re-syncs it with Strava's own count (which
+includes requests made by other processes). A reserve is held back so that a
+long sync never starves the webhook handler.
+"""
+
+import os
+import time
+import threading
+import logging
+from typing import Mapping, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Used until the first response reports the application's real limits
+STRAVA_RATE_LIMIT_15MIN = int(os.getenv("STRAVA_RATE_LIMIT_15MIN", "200"))
+STRAVA_RATE_LIMIT_DAILY = int(os.getenv("STRAVA_RATE_LIMIT_DAILY", "2000"))
+# Requests per window left for webhooks and other interactive calls
+STRAVA_RATE_LIMIT_RESERVE = int(os.getenv("STRAVA_RATE_LIMIT_RESERVE", "10"))
+
+SHORT_WINDOW_SECONDS = 15 * 60
+DAY_SECONDS = 24 * 60 * 60
+
+
+class RateLimitExceeded(Exception):
+    """Raised when the request budget cannot be met in time.
+
+    ``retry_at`` is the epoch time at which requests can be made again.
+    """
+
+    def __init__(self, message: str, retry_at: Optional[float] = None):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+
+def _parse_pair(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    try:
+        short, daily = (int(part) for part in value.split(","))
+        return short, daily
+    except (AttributeError, ValueError):
+        return None
+
+
+class StravaRateLimiter:
+    """Token bucket over Strava's 15-minute and daily request windows."""
+
+    def __init__(self, short_limit: int = STRAVA_RATE_LIMIT_15MIN, daily_limit: int = STRAVA_RATE_LIMIT_DAILY,
+                 reserve: int = STRAVA_RATE_LIMIT_RESERVE, clock=time.time):
+        self.short_limit = short_limit
+        self.daily_limit = daily_limit
+        self.reserve = reserve
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._short_used = 0
+        self._daily_used = 0
+        self._window = self._day = None
+        self._stats = {"acquired": 0, "waits": 0, "waited_seconds": 0.0, "throttled": 0}
+
+    def _roll(self, now: float):
+        window, day = int(now // SHORT_WINDOW_SECONDS), int(now // DAY_SECONDS)
+        if window != self._window:
+            self._window, self._short_used = window, 0
+        if day != self._day:
+            self._day, self._daily_used = day, 0
+
+    def acquire(self, max_wait: Optional[float] = None, use_reserve: bool = False):
+        """Take one request token, waiting for the next 15-minute window if needed.
+
+        Background work (syncs) leaves the reserve alone; interactive calls
+        such as webhooks pass ``use_reserve`` to draw on it. Raises
+        ``RateLimitExceeded`` if the daily budget is spent, or if the wait
+        would exceed ``max_wait`` seconds.
+        """
+        reserve = 0 if use_reserve else self.reserve
+        with self._cond:
+            while True:
+                now = self._clock()
+                self._roll(now)
+                if self._daily_used >= self.daily_limit - reserve:
+                    raise RateLimitExceeded(
+                        "Strava daily request limit reached, try again tomorrow",
+                        retry_at=(now // DAY_SECONDS + 1) * DAY_SECONDS,
+                    )
+                if self._short_used < self.short_limit - reserve:
+                    self._short_used += 1
+                    self._daily_used += 1
+                    self._stats["acquired"] += 1
+                    return
+
+                wait = SHORT_WINDOW_SECONDS - now % SHORT_WINDOW_SECONDS
+                if max_wait is not None and wait > max_wait:
+                    raise RateLimitExceeded(
+                        f"Strava rate limit reached, next window in {wait:.0f} seconds", retry_at=now + wait
+                    )
+                logger.info(f"⏳ Strava 15-minute budget spent, waiting {wait:.0f}s for the next window")
+                self._stats["waits"] += 1
+                self._stats["waited_seconds"] += wait
+                self._cond.wait(wait)
+
+    def next_window_at(self) -> float:
+        """Epoch time at which the next 15-minute window starts."""
+        return (self._clock() // SHORT_WINDOW_SECONDS + 1) * SHORT_WINDOW_SECONDS
+
+    def update(self, headers: Mapping[str, str]):
+        """Re-sync the bucket with the limits and usage Strava reported."""
+        limits = _parse_pair(headers.get("X-RateLimit-Limit"))
+        usage = _parse_pair(headers.get("X-RateLimit-Usage"))
+        with self._cond:
+            self._roll(self._clock())
+            if limits:
+                self.short_limit, self.daily_limit = limits
+            if usage:
+                # Our own count also covers requests still in flight, so never go below it
+                self._short_used = max(self._short_used, usage[0])
+                self._daily_used = max(self._daily_used, usage[1])
+            self._cond.notify_all()
+
+    def throttled(self, headers: Mapping[str, str]):
+        """Record a 429: nothing more can be sent in the current window."""
+        with self._cond:
+            self._stats["throttled"] += 1
+            self._roll(self._clock())
+            self._short_used = self.short_limit
+        self.update(headers)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(
+                short_used=self._short_used, short_limit=self.short_limit,
+                daily_used=self._daily_used, daily_limit=self.daily_limit,
+            )
+        return stats
+
+
+_limiter = StravaRateLimiter()
+
+
+def get_strava_rate_limiter() -> StravaRateLimiter:
+    """Return the process-wide Strava rate limiter."""
+    return _limiter
@@ -3,88 +3,137 @@ Strava historical activities sync service.
 """
 
 import os
-import requests
 import time
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Callable
-from .db_utils import get_db_connection
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Callable, Tuple
+from .db_pool import db_connection
+from .strava_client import get_strava_client
+from .strava_rate_limit import RateLimitExceeded, get_strava_rate_limiter
+from .result_cache import bump_data_version, commit_data_versions
+from .athlete_stats import STATS_SOURCE_COLUMNS, batch_stats_ctes, get_athlete_stats, lock_activities
 from .auth_utils import get_user_strava_connection
+import psycopg2.errors
 import psycopg2.extras
 
+# Largest page Strava's activity list accepts
+STRAVA_SYNC_PAGE_SIZE = int(os.getenv("STRAVA_SYNC_PAGE_SIZE", "200"))
+# Pages fetched concurrently while earlier pages are being stored
+STRAVA_SYNC_FETCH_WORKERS = int(os.getenv("STRAVA_SYNC_FETCH_WORKERS", "4"))
+# Attempts per page when Strava answers 429 or 5xx
+STRAVA_SYNC_MAX_ATTEMPTS = 3
+# Longest the sync waits for the next rate-limit window before checkpointing and stopping
+STRAVA_SYNC_MAX_WAIT_SECONDS = float(os.getenv("STRAVA_SYNC_MAX_WAIT_SECONDS", "60"))
+
+SAVE_CHECKPOINT_SQL = """
+    UPDATE user_sync_status SET
+        sync_pages_done = %(pages_done)s,
+        sync_activities_stored = %(added)s,
+        sync_newest_start_date = %(newest_at)s,
+        sync_newest_activity_id = %(newest_id)s,
+        last_error = NULL,
+        next_request_at = NULL,
+        updated_at = NOW()
+    WHERE user_id = %(user_id)s
+"""
+
+# One statement per page: the multi-row insert and the stats/rollup updates for
+# the rows it actually added. Only for activities not stored yet (see
+# lock_activities): the partitioned table's key is (id, start_date), so the
+# conflict check alone misses an activity whose start_date was edited.
+STORE_PAGE_SQL = f"""
+    WITH added AS (
+        INSERT INTO activities (
+            id, name, distance, moving_time, elapsed_time,
+            total_elevation_gain, type, start_date, start_date_local, athlete_id
+        ) VALUES %s
+        ON CONFLICT DO NOTHING
+        RETURNING athlete_id, {STATS_SOURCE_COLUMNS}
+    ){batch_stats_ctes("added")}
+    SELECT COUNT(*) FROM added
+"""
+
+
+def _newest_activity(activities: List[Dict]) -> Tuple[datetime, int]:
+    """(start_date, id) of the most recent activity in a page."""
+    return max(
+        (datetime.fromisoformat(activity["start_date"].replace("Z", "+00:00")), activity["id"])
+        for activity in activities
+    )
+
+
+class SyncCancelled(Exception):
+    """Raised by a progress callback to stop a sync; stored pages stay checkpointed."""
+
+
 class StravaSyncService:
     """Service for syncing historical Strava activities."""
     
     def __init__(self):
-        self.base_url = "https://www.strava.com/api/v3"
+        self.client = get_strava_client()
         
     def check_sync_status(self, user_id: int) -> Dict:
         """Check if user has synced activities and their sync status."""
-        conn = get_db_connection()
-        if not conn:
-            return {"synced": False, "activity_count": 0, "error": "Database connection failed"}
-            
+        activity_count = 0
         try:
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-            
-            # Count current activities for this user's athlete
+            # Look up the athlete before checking out a connection of our own
             strava_connection = get_user_strava_connection(user_id)
             if not strava_connection:
                 return {"synced": False, "activity_count": 0, "error": "No Strava connection"}
                 
             athlete_id = strava_connection["athlete_id"]
-            cursor.execute("SELECT COUNT(*) as count FROM activities WHERE athlete_id = %s", (athlete_id,))
-            activity_count = cursor.fetchone()["count"]
-            
-            # Check if sync status table exists
-            cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'user_sync_status'
-                );
-            """)
-            
-            table_exists = cursor.fetchone()[0]
-            
-            if not table_exists:
-                # Table doesn't exist, assume sync needed if few activities
-                return {
-                    "synced": activity_count > 50,  # Assume synced if many activities
-                    "activity_count": activity_count,
-                    "needs_sync": activity_count <= 50
-                }
+
+            with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+                # Counts come from the incrementally maintained athlete_stats rows
+                activity_count = get_athlete_stats(cursor, athlete_id)["activity_count"]
             
-            # Check if user has a sync record
-            cursor.execute("""
-                SELECT last_sync_date, total_activities_synced, sync_completed 
-                FROM user_sync_status 
-                WHERE user_id = %s
-            """, (user_id,))
+                # Check if user has a sync record
+                cursor.execute("""
+                    SELECT last_sync_date, total_activities_synced, sync_completed 
+                    FROM user_sync_status 
+                    WHERE user_id = %s
+                """, (user_id,))
             
-            sync_record = cursor.fetchone()
+                sync_record = cursor.fetchone()
             
-            if sync_record and sync_record["sync_completed"]:
-                return {
-                    "synced": True,
-                    "activity_count": activity_count,
-                    "last_sync": sync_record["last_sync_date"],
-                    "total_synced": sync_record["total_activities_synced"]
-                }
-            else:
-                return {
-                    "synced": False,
-                    "activity_count": activity_count,
-                    "needs_sync": True
-                }
+                if sync_record and sync_record["sync_completed"]:
+                    return {
+                        "synced": True,
+                        "activity_count": activity_count,
+                        "last_sync": sync_record["last_sync_date"],
+                        "total_synced": sync_record["total_activities_synced"]
+                    }
+                else:
+                    return {
+                        "synced": False,
+                        "activity_count": activity_count,
+                        "needs_sync": True
+                    }
                 
+        except psycopg2.errors.UndefinedTable:
+            # Sync status table doesn't exist, assume sync needed if few activities
+            return {
+                "synced": activity_count > 50,  # Assume synced if many activities
+                "activity_count": activity_count,
+                "needs_sync": activity_count <= 50
+            }
         except Exception as e:
             return {"synced": False, "activity_count": 0, "error": str(e)}
-        finally:
-            cursor.close()
-            conn.close()
     
-    def sync_historical_activities(self, user_id: int, progress_callback: Optional[Callable] = None) -> Dict:
-        """Sync historical activities from Strava with progress updates."""
+    def sync_historical_activities(self, user_id: int, progress_callback: Optional[Callable] = None,
+                                   full: bool = False) -> Dict:
+        """Sync historical activities from Strava with progress updates.
+
+        After a first complete sync, later syncs are incremental: only
+        activities that started after the newest one already synced are
+        requested, which usually takes a single API call. Pass ``full=True``
+        to walk the whole history again (e.g. to pick up old activities
+        uploaded late while webhooks were down).
+
+        Every stored page also records a checkpoint, so a sync that stops
+        halfway (closed session, Strava rate limit) resumes where it left off.
+        ``progress_callback`` can raise ``SyncCancelled`` to stop the sync.
+        """
         
         # Get user's Strava connection
         strava_connection = get_user_strava_connection(user_id)
@@ -95,45 +144,87 @@ class StravaSyncService:
         athlete_id = strava_connection["athlete_id"]
         
         try:
-            # Initialize sync status
-            self._init_sync_status(user_id)
+            state = self._get_sync_state(user_id)
+            if state and state["next_request_at"] and state["next_request_at"] > datetime.now(timezone.utc):
+                # Don't spend requests Strava would reject anyway
+                return {
+                    "success": False,
+                    "error": f"Strava rate limit reached, sync resumes after {state['next_request_at']:%H:%M} UTC",
+                    "retry_at": state["next_request_at"],
+                }
+
+            resuming = bool(state) and not full and not state["sync_completed"] and state["sync_pages_done"] > 0
+            if resuming:
+                after = state["sync_after"]
+                # Re-fetch the last stored page: listings shift if activities
+                # were deleted in between, and nothing may slip past the checkpoint
+                start_page = state["sync_pages_done"]
+                activities_added = state["sync_activities_stored"]
+                newest = state["newest"]
+            else:
+                after = None
+                if state and not full and state["sync_completed"] and state["watermark"]:
+                    # Re-request the watermark's own second, in case several activities share it
+                    after = int(state["watermark"].timestamp()) - 1
+                start_page = 1
+                activities_added = 0
+                newest = None
+                # Initialize sync status
+                self._init_sync_status(user_id, after)
             
+            tracking = state is not None
             activities_synced = 0
-            page = 1
-            per_page = 30  # Strava API limit
+            pages_done = start_page - 1
+            stored_pages = set()
             
             if progress_callback:
-                progress_callback(0, "Starting sync...")
-                
-            while True:
-                # Fetch activities page
-                activities = self._fetch_activities_page(access_token, page, per_page)
-                
-                if not activities:
-                    break  # No more activities
-                    
-                # Process this batch
-                for activity in activities:
-                    success = self._store_activity(activity, athlete_id)
-                    if success:
-                        activities_synced += 1
-                        
-                if progress_callback:
-                    progress_callback(
-                        activities_synced, 
-                        f"Synced {activities_synced} activities..."
-                    )
-                
-                # Respect Strava API rate limits (100 requests per 15 minutes)
-                time.sleep(0.2)  # Small delay between requests
+                if resuming:
+                    progress_callback(0, f"Resuming sync from page {start_page}...")
+                else:
+                    progress_callback(0, "Starting sync..." if after is None else "Checking for new activities...")
+
+            # A catch-up is usually one short page, so fetch it sequentially
+            pages = self._fetch_pages(
+                access_token, after=after, start_page=start_page,
+                workers=STRAVA_SYNC_FETCH_WORKERS if after is None else 1,
+            )
                 
-                if len(activities) < per_page:
-                    break  # Last page
-                    
-                page += 1
+            # Pages are fetched concurrently and stored as they arrive, on one
+            # connection for the whole sync with one transaction per page
+            with db_connection() as conn:
+                for page, activities, fetch_ms in pages:
+                    page_newest = _newest_activity(activities)
+                    if newest is None or page_newest > newest:
+                        newest = page_newest
+                    # Pages arrive out of order; the checkpoint only covers a gap-free prefix
+                    stored_pages.add(page)
+                    while pages_done + 1 in stored_pages:
+                        pages_done += 1
+
+                    store_started = time.perf_counter()
+                    added = self._store_page(conn, activities, athlete_id, checkpoint={
+                        "user_id": user_id,
+                        "pages_done": pages_done,
+                        "added": activities_added,
+                        "newest": newest,
+                    } if tracking else None)
+                    store_ms = (time.perf_counter() - store_started) * 1000
+                    activities_added += added
+                    activities_synced += len(activities)
+                            
+                    if progress_callback:
+                        progress_callback(
+                            activities_synced, 
+                            f"Synced {activities_synced} activities... "
+                            f"(page {page}: fetched in {fetch_ms:.0f} ms, stored in {store_ms:.0f} ms)"
+                        )
+
+                with conn.cursor() as cursor:
+                    activity_count = get_athlete_stats(cursor, athlete_id)["activity_count"]
                 
-            # Mark sync as completed
-            self._complete_sync_status(user_id, activities_synced)
+            # Mark sync as completed; only now is it safe to move the watermark,
+            # since pages may have been stored out of order
+            self._complete_sync_status(user_id, activity_count, newest)
             
             if progress_callback:
                 progress_callback(activities_synced, f"Sync completed! {activities_synced} activities synced.")
@@ -141,57 +232,138 @@ class StravaSyncService:
             return {
                 "success": True, 
                 "activities_synced": activities_synced,
+                "activities_added": activities_added,
+                "incremental": after is not None,
+                "resumed": resuming,
                 "message": f"Successfully synced {activities_synced} activities"
             }
             
+        except SyncCancelled as e:
+            # Whoever cancelled the sync owns it now; leave its status alone
+            return {"success": False, "error": str(e), "cancelled": True}
+        except RateLimitExceeded as e:
+            retry_at = datetime.fromtimestamp(e.retry_at, timezone.utc) if e.retry_at else None
+            self._record_sync_error(user_id, str(e), retry_at)
+            return {"success": False, "error": f"{e}. The sync will resume where it stopped.", "retry_at": retry_at}
         except Exception as e:
+            self._record_sync_error(user_id, str(e))
             return {"success": False, "error": str(e)}
     
-    def _fetch_activities_page(self, access_token: str, page: int, per_page: int) -> List[Dict]:
-        """Fetch a page of activities from Strava API."""
-        headers = {"Authorization": f"Bearer {access_token}"}
-        
+    def _get_sync_state(self, user_id: int) -> Optional[Dict]:
+        """The user's sync status row (watermark and checkpoint), or None if not tracked.
+
+        Returns an empty dict if the user never started a sync.
+        """
+        try:
+            with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
+                cursor.execute("""
+                    SELECT sync_completed, last_activity_start_date, sync_after, sync_pages_done,
+                           sync_activities_stored, sync_newest_start_date, sync_newest_activity_id,
+                           next_request_at
+                    FROM user_sync_status
+                    WHERE user_id = %s
+                """, (user_id,))
+                row = cursor.fetchone()
+        except (psycopg2.errors.UndefinedTable, psycopg2.errors.UndefinedColumn):
+            # Tracking tables not migrated yet: every sync is a full one
+            return None
+
+        if not row:
+            return {}
+        state = dict(row)
+        state["watermark"] = state.pop("last_activity_start_date")
+        newest_at, newest_id = state.pop("sync_newest_start_date"), state.pop("sync_newest_activity_id")
+        state["newest"] = (newest_at, newest_id) if newest_at else None
+        return state
+    
+    def _fetch_pages(self, access_token: str, per_page: int = STRAVA_SYNC_PAGE_SIZE,
+                     workers: int = STRAVA_SYNC_FETCH_WORKERS, after: Optional[int] = None,
+                     start_page: int = 1) -> Iterator[Tuple[int, List[Dict], float]]:
+        """Yield (page, activities, fetch_ms) for every non-empty page from ``start_page``, in arrival order.
+
+        Up to ``workers`` pages are in flight at once, including while the
+        caller stores the page just yielded. The total is unknown up front, so
+        new pages are requested until one comes back short; the few requests
+        already in flight past the end simply return nothing.
+        """
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="strava-sync")
+        in_flight = {}
+        next_page = start_page
+        last_page = None
+
+        def submit():
+            nonlocal next_page
+            future = pool.submit(self._fetch_activities_page, access_token, next_page, per_page, after)
+            in_flight[future] = next_page
+            next_page += 1
+
+        try:
+            for _ in range(workers):
+                submit()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = in_flight.pop(future)
+                    activities, fetch_ms = future.result()
+                    if len(activities) < per_page:
+                        last_page = page if last_page is None else min(last_page, page)
+                    if last_page is None:
+                        submit()
+                    if activities:
+                        yield page, activities, fetch_ms
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _fetch_activities_page(self, access_token: str, page: int, per_page: int,
+                               after: Optional[int] = None) -> Tuple[List[Dict], float]:
+        """Fetch a page of activities from Strava API within the shared rate limit.
+
+        With ``after`` (epoch seconds), only activities that started later are
+        listed. Returns the activities and the time spent fetching them (in ms).
+        """
         params = {
             "page": page,
             "per_page": per_page
         }
+        if after is not None:
+            params["after"] = after
         
-        response = requests.get(
-            f"{self.base_url}/athlete/activities",
-            headers=headers,
+        started = time.perf_counter()
+        response = self.client.request(
+            "GET", "/athlete/activities",
+            access_token=access_token,
             params=params,
-            timeout=30
+            background=True,
+            max_wait=STRAVA_SYNC_MAX_WAIT_SECONDS,
+            retries=STRAVA_SYNC_MAX_ATTEMPTS - 1,
         )
+        fetch_ms = (time.perf_counter() - started) * 1000
         
-        if response.status_code == 200:
-            return response.json()
+        if response.status_code == 429:
+            # Over the limit anyway (e.g. other processes) on every attempt
+            raise RateLimitExceeded(
+                "Strava rate limit reached", retry_at=get_strava_rate_limiter().next_window_at()
+            )
+        elif response.status_code == 200:
+            return response.json(), fetch_ms
         elif response.status_code == 401:
             raise Exception("Strava access token expired or invalid")
         else:
             raise Exception(f"Strava API error: {response.status_code}")
     
-    def _store_activity(self, activity: Dict, athlete_id: int) -> bool:
-        """Store a single activity in the database."""
-        conn = get_db_connection()
-        if not conn:
-            return False
-            
-        try:
-            cursor = conn.cursor()
-            
-            # Check if activity already exists
-            cursor.execute("SELECT id FROM activities WHERE id = %s", (activity["id"],))
-            if cursor.fetchone():
-                return True  # Already exists, skip
-                
-            # Insert activity
-            cursor.execute("""
-                INSERT INTO activities (
-                    id, name, distance, moving_time, elapsed_time, 
-                    total_elevation_gain, type, start_date, athlete_id
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (id) DO NOTHING
-            """, (
+    def _store_page(self, conn, activities: List[Dict], athlete_id: int,
+                    checkpoint: Optional[Dict] = None) -> int:
+        """Store a page of activities in one statement and commit; returns how many were new.
+
+        Activities that are already stored (looked up by id) are left untouched
+        and count as synced. ``checkpoint`` (user_id, pages_done, added before
+        this page, newest) is saved in the same transaction, so it never runs
+        ahead of the data.
+        """
+        # Listings can repeat an activity when they shift between page requests
+        activities = list({activity["id"]: activity for activity in activities}.values())
+        rows = [
+            (
                 activity["id"],
                 activity.get("name", ""),
                 activity.get("distance", 0),
@@ -200,75 +372,64 @@ class StravaSyncService:
                 activity.get("total_elevation_gain", 0),
                 activity.get("type", ""),
                 activity.get("start_date"),
-                athlete_id
-            ))
-            
-            conn.commit()
-            return True
-            
-        except Exception as e:
-            print(f"Error storing activity {activity.get('id', 'unknown')}: {e}")
+                activity.get("start_date_local"),
+                athlete_id,
+            )
+            for activity in activities
+        ]
+        try:
+            with conn.cursor() as cursor:
+                stored = lock_activities(cursor, [row[0] for row in rows])
+                rows = [row for row in rows if row[0] not in stored]
+                added = psycopg2.extras.execute_values(
+                    cursor, STORE_PAGE_SQL, rows, page_size=len(rows), fetch=True
+                )[0][0] if rows else 0
+                versions = {athlete_id: bump_data_version(cursor, athlete_id)} if added else {}
+                if checkpoint is not None:
+                    newest_at, newest_id = checkpoint["newest"]
+                    cursor.execute(SAVE_CHECKPOINT_SQL, {
+                        "user_id": checkpoint["user_id"],
+                        "pages_done": checkpoint["pages_done"],
+                        "added": checkpoint["added"] + added,
+                        "newest_at": newest_at,
+                        "newest_id": newest_id,
+                    })
+            commit_data_versions(conn, versions)
+            return added
+        except Exception:
             conn.rollback()
-            return False
-        finally:
-            cursor.close()
-            conn.close()
+            raise
     
-    def _init_sync_status(self, user_id: int):
-        """Initialize sync status for user."""
-        conn = get_db_connection()
-        if not conn:
-            return
-            
+    def _init_sync_status(self, user_id: int, after: Optional[int] = None):
+        """Initialize sync status for user, starting a fresh checkpoint for a listing ``after`` (or full)."""
         try:
-            cursor = conn.cursor()
-            
-            # Check if table exists first
-            cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'user_sync_status'
-                );
-            """)
-            
-            if cursor.fetchone()[0]:
+            with db_connection() as conn, conn.cursor() as cursor:
                 cursor.execute("""
-                    INSERT INTO user_sync_status (user_id, sync_started, sync_completed)
-                    VALUES (%s, NOW(), false)
+                    INSERT INTO user_sync_status (user_id, sync_started, sync_completed, sync_after)
+                    VALUES (%s, NOW(), false, %s)
                     ON CONFLICT (user_id) 
-                    DO UPDATE SET sync_started = NOW(), sync_completed = false
-                """, (user_id,))
+                    DO UPDATE SET
+                        sync_started = NOW(),
+                        sync_completed = false,
+                        sync_after = EXCLUDED.sync_after,
+                        sync_pages_done = 0,
+                        sync_activities_stored = 0,
+                        sync_newest_start_date = NULL,
+                        sync_newest_activity_id = NULL,
+                        last_error = NULL,
+                        next_request_at = NULL
+                """, (user_id, after))
                 conn.commit()
-            else:
-                print("user_sync_status table does not exist, skipping status tracking")
-                
+        except psycopg2.errors.UndefinedTable:
+            print("user_sync_status table does not exist, skipping status tracking")
         except Exception as e:
             print(f"Error initializing sync status: {e}")
-            conn.rollback()
-        finally:
-            cursor.close()
-            conn.close()
     
-    def _complete_sync_status(self, user_id: int, activities_count: int):
-        """Mark sync as completed."""
-        conn = get_db_connection()
-        if not conn:
-            return
-            
+    def _complete_sync_status(self, user_id: int, activities_count: int,
+                              newest: Optional[Tuple[datetime, int]] = None):
+        """Mark sync as completed, advancing the watermark to ``newest`` (start_date, id) if given."""
         try:
-            cursor = conn.cursor()
-            
-            # Check if table exists first
-            cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'user_sync_status'
-                );
-            """)
-            
-            if cursor.fetchone()[0]:
+            with db_connection() as conn, conn.cursor() as cursor:
                 # Use UPSERT to handle both new records and updates
                 cursor.execute("""
                     INSERT INTO user_sync_status (user_id, sync_started, sync_completed, last_sync_date, total_activities_synced)
@@ -279,13 +440,41 @@ class StravaSyncService:
                         last_sync_date = NOW(),
                         total_activities_synced = %s
                 """, (user_id, activities_count, activities_count))
+                if newest is not None:
+                    # The watermark only moves forward
+                    cursor.execute("""
+                        UPDATE user_sync_status
+                        SET last_activity_start_date = %s, last_activity_id = %s
+                        WHERE user_id = %s
+                          AND (last_activity_start_date IS NULL OR last_activity_start_date <= %s)
+                    """, (newest[0], newest[1], user_id, newest[0]))
+                # Nothing left to resume
+                cursor.execute("""
+                    UPDATE user_sync_status SET
+                        sync_after = NULL,
+                        sync_pages_done = 0,
+                        sync_activities_stored = 0,
+                        sync_newest_start_date = NULL,
+                        sync_newest_activity_id = NULL,
+                        last_error = NULL,
+                        next_request_at = NULL
+                    WHERE user_id = %s
+                """, (user_id,))
                 conn.commit()
-            else:
-                print("user_sync_status table does not exist, skipping status tracking")
-                
+        except psycopg2.errors.UndefinedTable:
+            print("user_sync_status table does not exist, skipping status tracking")
         except Exception as e:
             print(f"Error completing sync status: {e}")
-            conn.rollback()
-        finally:
-            cursor.close()
-            conn.close()
\ No newline at end of file
+    
+    def _record_sync_error(self, user_id: int, error: str, next_request_at: Optional[datetime] = None):
+        """Keep the checkpoint and note why the sync stopped (and when Strava can be asked again)."""
+        try:
+            with db_connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE user_sync_status
+                    SET last_error = %s, next_request_at = %s, updated_at = NOW()
+                    WHERE user_id = %s
+                """, (error[:1000], next_request_at, user_id))
+                conn.commit()
+        except Exception as e:
+            print(f"Error recording sync error: {e}")
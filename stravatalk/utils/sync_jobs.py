@@ -0,0 +1,147 @@
+"""
+Durable queue of historical sync jobs (``sync_jobs``, migration 013).
+
+The Streamlit app enqueues a job and polls it; ``stravatalk.sync_worker``
+processes claim and run them. Claims use ``FOR UPDATE SKIP LOCKED``, so any
+number of workers can poll the table without handing the same job out twice.
+A running job whose heartbeat is older than ``SYNC_JOB_STALE_SECONDS`` belongs
+to a worker that died and is claimed again.
+"""
+
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+import psycopg2.extras
+from dotenv import load_dotenv
+
+from .db_pool import db_connection
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SYNC_JOB_STALE_SECONDS = int(os.getenv("SYNC_JOB_STALE_SECONDS", "120"))
+SYNC_JOB_MAX_ATTEMPTS = int(os.getenv("SYNC_JOB_MAX_ATTEMPTS", "5"))
+# Retry delay after a failed attempt, multiplied by the attempt number
+SYNC_JOB_RETRY_SECONDS = int(os.getenv("SYNC_JOB_RETRY_SECONDS", "30"))
+
+ACTIVE_STATUSES = ("queued", "running")
+
+CLAIM_JOB_SQL = """
+    UPDATE sync_jobs SET
+        status = 'running',
+        attempts = attempts + 1,
+        locked_by = %(worker_id)s,
+        heartbeat_at = NOW(),
+        started_at = COALESCE(started_at, NOW()),
+        error = NULL
+    WHERE id = (
+        SELECT id FROM sync_jobs
+        WHERE (status = 'queued' AND run_after <= NOW())
+           OR (status = 'running' AND heartbeat_at < NOW() - make_interval(secs => %(stale_seconds)s))
+        ORDER BY run_after, id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING *
+"""
+
+
+def enqueue_sync_job(user_id: int, full: bool = False) -> Dict[str, Any]:
+    """Queue a sync for a user, or return the job already queued or running for them."""
+    with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        job = None
+        # The active job that blocked the insert can finish before the SELECT
+        # sees it; each statement takes a fresh snapshot, so just try again
+        while job is None:
+            cursor.execute("""
+                INSERT INTO sync_jobs (user_id, full_sync)
+                VALUES (%s, %s)
+                ON CONFLICT (user_id) WHERE status IN ('queued', 'running') DO NOTHING
+                RETURNING *
+            """, (user_id, full))
+            job = cursor.fetchone()
+            if job is None:
+                cursor.execute(
+                    "SELECT * FROM sync_jobs WHERE user_id = %s AND status IN %s", (user_id, ACTIVE_STATUSES)
+                )
+                job = cursor.fetchone()
+        conn.commit()
+    logger.info(f"📥 Sync job {job['id']} for user {user_id} is {job['status']}")
+    return dict(job)
+
+
+def get_latest_sync_job(user_id: int) -> Optional[Dict[str, Any]]:
+    """The user's most recent sync job, if any."""
+    with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute(
+            "SELECT * FROM sync_jobs WHERE user_id = %s ORDER BY created_at DESC, id DESC LIMIT 1", (user_id,)
+        )
+        job = cursor.fetchone()
+    return dict(job) if job else None
+
+
+def claim_sync_job(worker_id: str, stale_seconds: int = SYNC_JOB_STALE_SECONDS) -> Optional[Dict[str, Any]]:
+    """Claim the next runnable job for this worker, or None if there is nothing to do.
+
+    The claim commits immediately; the sync itself runs outside any lock.
+    """
+    with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        cursor.execute(CLAIM_JOB_SQL, {"worker_id": worker_id, "stale_seconds": stale_seconds})
+        job = cursor.fetchone()
+        conn.commit()
+    return dict(job) if job else None
+
+
+def update_sync_job_progress(job_id: int, worker_id: str, count: int, message: str) -> bool:
+    """Record progress and refresh the heartbeat; False if the job is no longer ours."""
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            UPDATE sync_jobs
+            SET progress_count = %s, progress_message = %s, heartbeat_at = NOW()
+            WHERE id = %s AND locked_by = %s AND status = 'running'
+        """, (count, message, job_id, worker_id))
+        conn.commit()
+        return cursor.rowcount > 0
+
+
+def finish_sync_job(job: Dict[str, Any], worker_id: str, result: Dict[str, Any]):
+    """Store a sync result: done, retried later, or failed for good.
+
+    A rate-limited sync is requeued for when Strava accepts requests again,
+    without using up an attempt; it resumes from its checkpoint.
+    """
+    now = datetime.now(timezone.utc)
+    if result.get("success"):
+        status, run_after, error = "succeeded", now, None
+        attempts_delta = 0
+    elif result.get("retry_at"):
+        status, run_after, error = "queued", result["retry_at"], result.get("error")
+        attempts_delta = -1
+    elif job["attempts"] < SYNC_JOB_MAX_ATTEMPTS:
+        status, error = "queued", result.get("error")
+        run_after = now + timedelta(seconds=SYNC_JOB_RETRY_SECONDS * job["attempts"])
+        attempts_delta = 0
+    else:
+        status, run_after, error = "failed", now, result.get("error")
+        attempts_delta = 0
+
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            UPDATE sync_jobs SET
+                status = %s,
+                run_after = %s,
+                attempts = attempts + %s,
+                error = %s,
+                activities_synced = COALESCE(%s, activities_synced),
+                locked_by = NULL,
+                finished_at = CASE WHEN %s IN ('succeeded', 'failed') THEN NOW() END
+            WHERE id = %s AND locked_by = %s
+        """, (
+            status, run_after, attempts_delta, error, result.get("activities_synced"),
+            status, job["id"], worker_id,
+        ))
+        conn.commit()
+    logger.info(f"🏁 Sync job {job['id']} {status}" + (f": {error}" if error else ""))
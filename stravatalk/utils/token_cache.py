@@ -0,0 +1,106 @@
+"""
+Per-athlete cache of Strava access tokens with single-flight refresh.
+
+Webhook events look up the owner's access token for every fetch. Tokens are
+cached until shortly before they expire (``ACCESS_TOKEN_EXPIRY_MARGIN_SECONDS``),
+so a burst of events for one athlete costs one database read. When the token
+has to be loaded or refreshed, only the first caller does the work; concurrent
+callers for the same athlete wait for its result. Strava rotates the refresh
+token on every refresh, so parallel refreshes would race each other for it.
+"""
+
+import os
+import time
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# A token this close to expiry is refreshed rather than handed out
+ACCESS_TOKEN_EXPIRY_MARGIN_SECONDS = int(os.getenv("ACCESS_TOKEN_EXPIRY_MARGIN_SECONDS", "60"))
+
+
+class AccessTokenCache:
+    """Access tokens by athlete, valid until ``expires_at`` minus a margin."""
+
+    def __init__(self, margin_seconds: int = ACCESS_TOKEN_EXPIRY_MARGIN_SECONDS, clock=time.time):
+        self.margin_seconds = margin_seconds
+        self._clock = clock
+        self._tokens: Dict[int, Tuple[str, int]] = {}
+        self._in_flight: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "loads": 0, "waits": 0, "invalidations": 0}
+
+    def is_fresh(self, expires_at: int) -> bool:
+        return expires_at - self.margin_seconds > self._clock()
+
+    def get(self, athlete_id: int, load: Callable[[], Optional[Tuple[str, int]]],
+            force: bool = False) -> Optional[str]:
+        """Return a fresh access token for the athlete, calling ``load`` on a miss.
+
+        ``load`` returns ``(access_token, expires_at)`` or None, and runs at
+        most once at a time per athlete; callers arriving meanwhile block
+        until it finishes and share its result (or exception). ``force``
+        loads even if the cached token is still fresh.
+        """
+        with self._lock:
+            cached = self._tokens.get(athlete_id)
+            if not force and cached is not None and self.is_fresh(cached[1]):
+                self._stats["hits"] += 1
+                return cached[0]
+            future = self._in_flight.get(athlete_id)
+            leader = future is None
+            if leader:
+                future = self._in_flight[athlete_id] = Future()
+                self._stats["loads"] += 1
+            else:
+                self._stats["waits"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            loaded = load()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(athlete_id, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            if loaded:
+                self._tokens[athlete_id] = loaded
+            self._in_flight.pop(athlete_id, None)
+        token = loaded[0] if loaded else None
+        future.set_result(token)
+        return token
+
+    def put(self, athlete_id: int, access_token: str, expires_at: int):
+        with self._lock:
+            self._tokens[athlete_id] = (access_token, expires_at)
+
+    def invalidate(self, athlete_id: int):
+        """Forget an athlete's token (revoked, rejected by Strava, or replaced)."""
+        with self._lock:
+            if self._tokens.pop(athlete_id, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._tokens)
+            stats["in_flight"] = len(self._in_flight)
+        return stats
+
+
+_token_cache = AccessTokenCache()
+
+
+def get_access_token_cache() -> AccessTokenCache:
+    """Return the process-wide access token cache."""
+    return _token_cache
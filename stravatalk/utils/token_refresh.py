@@ -0,0 +1,155 @@
+"""
+Background refresh of Strava access tokens before they expire.
+
+Without it a token is only refreshed when a webhook finds it expired (and a
+sync never refreshes it), putting Strava's token round trip on the critical
+path. Every ``TOKEN_REFRESH_INTERVAL_SECONDS`` the scheduler picks the tokens
+in ``user_tokens`` and ``strava_connections`` that expire within
+``TOKEN_REFRESH_HORIZON_SECONDS`` (soonest first, through the ``expires_at``
+indexes of migration 016) and refreshes up to ``TOKEN_REFRESH_BATCH_SIZE`` of
+them, paced to ``TOKEN_REFRESH_PER_SECOND``.
+
+Every FastAPI replica runs the scheduler, but a cycle only proceeds while
+holding a Postgres advisory lock, so one replica refreshes at a time.
+Refreshes share the token cache's single-flight slot with lazy refreshes in
+the same process.
+
+Strava only issues a new token once the current one has less than an hour
+left, so the horizon should stay below 3600 seconds.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+from .db_pool import db_connection
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+TOKEN_REFRESH_INTERVAL_SECONDS = float(os.getenv("TOKEN_REFRESH_INTERVAL_SECONDS", "300"))  # 0 disables
+TOKEN_REFRESH_HORIZON_SECONDS = int(os.getenv("TOKEN_REFRESH_HORIZON_SECONDS", "1800"))
+TOKEN_REFRESH_BATCH_SIZE = int(os.getenv("TOKEN_REFRESH_BATCH_SIZE", "50"))
+TOKEN_REFRESH_PER_SECOND = float(os.getenv("TOKEN_REFRESH_PER_SECOND", "5"))
+# An athlete whose refresh failed (e.g. revoked access) is skipped for this long
+TOKEN_REFRESH_RETRY_SECONDS = int(os.getenv("TOKEN_REFRESH_RETRY_SECONDS", "3600"))
+
+ADVISORY_LOCK_NAME = "stravatalk.token_refresh"
+
+# Both tables hold the same rotating token per athlete; each branch is an
+# index range scan on expires_at
+EXPIRING_TOKENS_SQL = """
+    SELECT athlete_id, MIN(expires_epoch) AS expires_epoch
+    FROM (
+        SELECT athlete_id, expires_at::BIGINT AS expires_epoch
+        FROM user_tokens
+        WHERE expires_at < %(cutoff)s
+        UNION ALL
+        SELECT athlete_id, EXTRACT(EPOCH FROM expires_at)::BIGINT
+        FROM strava_connections
+        WHERE expires_at < to_timestamp(%(cutoff)s) AT TIME ZONE 'UTC'
+    ) expiring
+    WHERE athlete_id <> ALL(%(skip)s)
+    GROUP BY athlete_id
+    ORDER BY expires_epoch
+    LIMIT %(limit)s
+"""
+
+
+class TokenRefreshScheduler:
+    """Runs refresh cycles on a daemon thread until stopped."""
+
+    def __init__(self, interval: float = TOKEN_REFRESH_INTERVAL_SECONDS):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failed_until: Dict[int, float] = {}
+        self._stats = {"cycles": 0, "skipped_cycles": 0, "refreshed": 0, "failed": 0, "last_cycle_at": None}
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+        self._thread.start()
+        logger.info(f"🔑 Token refresh scheduler started (every {self.interval:.0f}s)")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_cycle()
+            except Exception as e:
+                logger.error(f"❌ Token refresh cycle failed: {e}")
+
+    def run_cycle(self) -> Optional[Dict[str, int]]:
+        """Refresh one batch of expiring tokens; None if another replica holds the lock."""
+        with db_connection() as lock_conn, lock_conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (ADVISORY_LOCK_NAME,))
+            locked = cursor.fetchone()[0]
+            lock_conn.commit()
+            if not locked:
+                self._stats["skipped_cycles"] += 1
+                return None
+            try:
+                return self._refresh_batch()
+            finally:
+                # Session-level lock: must be released before the connection returns to the pool
+                cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", (ADVISORY_LOCK_NAME,))
+                lock_conn.commit()
+
+    def _refresh_batch(self) -> Dict[str, int]:
+        from .db_utils import refresh_access_token
+
+        now = time.time()
+        self._failed_until = {athlete: until for athlete, until in self._failed_until.items() if until > now}
+        with db_connection() as conn, conn.cursor() as cursor:
+            cursor.execute(EXPIRING_TOKENS_SQL, {
+                "cutoff": int(now) + TOKEN_REFRESH_HORIZON_SECONDS,
+                "skip": list(self._failed_until),
+                "limit": TOKEN_REFRESH_BATCH_SIZE,
+            })
+            expiring = cursor.fetchall()
+
+        refreshed = failed = 0
+        for athlete_id, _ in expiring:
+            if self._stop.is_set():
+                break
+            started = time.monotonic()
+            if refresh_access_token(athlete_id):
+                refreshed += 1
+            else:
+                failed += 1
+                self._failed_until[athlete_id] = time.time() + TOKEN_REFRESH_RETRY_SECONDS
+            # Pace the batch so a wave of expiring tokens doesn't burst at Strava
+            self._stop.wait(max(0.0, 1 / TOKEN_REFRESH_PER_SECOND - (time.monotonic() - started)))
+
+        self._stats["cycles"] += 1
+        self._stats["refreshed"] += refreshed
+        self._stats["failed"] += failed
+        self._stats["last_cycle_at"] = time.time()
+        if expiring:
+            logger.info(f"🔑 Refreshed {refreshed} expiring tokens ({failed} failed)")
+        return {"expiring": len(expiring), "refreshed": refreshed, "failed": failed}
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["backing_off"] = len(self._failed_until)
+        return stats
+
+
+_scheduler = TokenRefreshScheduler()
+
+
+def get_token_refresh_scheduler() -> TokenRefreshScheduler:
+    """Return the process-wide token refresh scheduler."""
+    return _scheduler
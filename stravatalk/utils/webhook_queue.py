@@ -0,0 +1,260 @@
+"""
+Durable queue of Strava webhook events (``webhook_events``, migrations 014-015).
+
+``POST /webhook`` enqueues the raw event and replies straight away;
+``stravatalk.webhook_worker`` processes claim and process the events. Claims
+use ``FOR UPDATE SKIP LOCKED`` like the sync job queue, plus a per-object
+advisory lock, so an object is only ever processed by one worker at a time. An event held for longer than
+``WEBHOOK_EVENT_STALE_SECONDS`` belongs to a worker that died and is claimed
+again. Failures are retried with a growing delay; after
+``WEBHOOK_EVENT_MAX_ATTEMPTS`` the event is dead-lettered.
+
+Events are held back for ``WEBHOOK_COALESCE_SECONDS`` and then claimed by
+object, together with every other pending event for it, so a burst of edits
+to one activity is handled once (see ``coalesce_events``). A worker can claim
+several objects in one batch. Processed events
+stay as ``done`` for ``WEBHOOK_EVENT_RETENTION_HOURS``; a redelivery of an
+event already queued or applied is recognised by its ``dedup_key`` and
+dropped.
+"""
+
+import os
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+import psycopg2.extras
+from dotenv import load_dotenv
+
+from .db_pool import db_connection
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_EVENT_STALE_SECONDS = int(os.getenv("WEBHOOK_EVENT_STALE_SECONDS", "300"))
+WEBHOOK_EVENT_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_EVENT_MAX_ATTEMPTS", "5"))
+# Retry delay after a failed attempt, multiplied by the attempt number
+WEBHOOK_EVENT_RETRY_SECONDS = int(os.getenv("WEBHOOK_EVENT_RETRY_SECONDS", "30"))
+# How long a new event waits for follow-up events on the same object
+WEBHOOK_COALESCE_SECONDS = float(os.getenv("WEBHOOK_COALESCE_SECONDS", "5"))
+WEBHOOK_EVENT_RETENTION_HOURS = int(os.getenv("WEBHOOK_EVENT_RETENTION_HOURS", "24"))
+
+ENQUEUE_EVENT_SQL = """
+    INSERT INTO webhook_events (payload, owner_id, object_type, object_id, aspect_type, dedup_key, run_after)
+    VALUES (%(payload)s, %(owner_id)s, %(object_type)s, %(object_id)s, %(aspect_type)s, %(dedup_key)s,
+            NOW() + make_interval(secs => %(delay)s))
+    ON CONFLICT (dedup_key) DO NOTHING
+    RETURNING id
+"""
+
+# Runnable objects in claim order, up to max_objects of them. An object is
+# only taken if this transaction wins its advisory lock, which is held until
+# the claim commits, so two workers never claim the same object at once (row
+# locks alone cannot do this: a claim that has not committed yet is invisible
+# to the busy check of another worker). Objects another worker is processing
+# are left alone so their events are applied in order.
+LOCK_OBJECTS_SQL = """
+    SELECT object_type, object_id FROM (
+        SELECT object_type, object_id FROM webhook_events e
+        WHERE ((status = 'queued' AND run_after <= NOW())
+               OR (status = 'processing' AND locked_at < NOW() - make_interval(secs => %(stale_seconds)s)))
+          AND NOT EXISTS (
+              SELECT 1 FROM webhook_events busy
+              WHERE busy.object_type = e.object_type AND busy.object_id = e.object_id
+                AND busy.status = 'processing'
+                AND busy.locked_at >= NOW() - make_interval(secs => %(stale_seconds)s)
+          )
+        GROUP BY object_type, object_id
+        ORDER BY MIN(run_after), MIN(id)
+    ) runnable
+    WHERE pg_try_advisory_xact_lock(hashtext('webhook_events:' || object_type), hashtext(object_id::text))
+    LIMIT %(max_objects)s
+"""
+
+# All pending events of the locked objects. This runs as a separate statement
+# so its busy check sees every claim committed before the locks were won.
+CLAIM_EVENTS_SQL = """
+    WITH batch AS (
+        SELECT e.id FROM webhook_events e
+        JOIN unnest(%(object_types)s::TEXT[], %(object_ids)s::BIGINT[]) AS locked (object_type, object_id)
+          ON e.object_type = locked.object_type AND e.object_id = locked.object_id
+        WHERE (e.status = 'queued'
+               OR (e.status = 'processing' AND e.locked_at < NOW() - make_interval(secs => %(stale_seconds)s)))
+          AND NOT EXISTS (
+              SELECT 1 FROM webhook_events busy
+              WHERE busy.object_type = e.object_type AND busy.object_id = e.object_id
+                AND busy.status = 'processing'
+                AND busy.locked_at >= NOW() - make_interval(secs => %(stale_seconds)s)
+          )
+        FOR UPDATE OF e SKIP LOCKED
+    )
+    UPDATE webhook_events SET
+        status = 'processing',
+        attempts = attempts + 1,
+        locked_by = %(worker_id)s,
+        locked_at = NOW()
+    WHERE id IN (SELECT id FROM batch)
+    RETURNING id, payload, attempts, received_at
+"""
+
+# A retry_at (rate limited) reschedules the events for then without using up an attempt
+FAIL_EVENTS_SQL = """
+    UPDATE webhook_events SET
+        status = CASE WHEN %(retry_at)s::FLOAT8 IS NOT NULL OR attempts < %(max_attempts)s
+                      THEN 'queued' ELSE 'dead' END,
+        attempts = CASE WHEN %(retry_at)s::FLOAT8 IS NOT NULL THEN attempts - 1 ELSE attempts END,
+        run_after = COALESCE(to_timestamp(%(retry_at)s::FLOAT8),
+                             NOW() + make_interval(secs => %(retry_seconds)s * attempts)),
+        last_error = %(error)s,
+        locked_by = NULL,
+        locked_at = NULL
+    WHERE id = ANY(%(ids)s) AND locked_by = %(worker_id)s
+    RETURNING id, status, attempts
+"""
+
+
+def event_dedup_key(event: Dict[str, Any]) -> str:
+    """Key shared by every delivery of the same Strava event."""
+    return json.dumps([
+        event.get("object_type"), event.get("object_id"), event.get("aspect_type"),
+        event.get("owner_id"), event.get("event_time"), event.get("updates") or {},
+    ], sort_keys=True)
+
+
+def coalesce_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge the pending events of one object into the events worth processing.
+
+    - a delete supersedes everything before it: the object is gone, so there
+      is nothing to fetch or update;
+    - a create supersedes later updates, since its fetch returns the current
+      state of the activity;
+    - updates are merged into one, later values winning.
+    """
+    if not events:
+        return []
+    ordered = sorted(events, key=lambda event: event.get("event_time") or 0)
+    for aspect_type in ("delete", "create"):
+        matching = [event for event in ordered if event.get("aspect_type") == aspect_type]
+        if matching:
+            return [matching[-1]]
+    updates = {}
+    for event in ordered:
+        updates.update(event.get("updates") or {})
+    return [dict(ordered[-1], updates=updates)]
+
+
+def enqueue_webhook_event(event: Dict[str, Any]) -> Optional[int]:
+    """Append a raw webhook event to the queue; returns its id, or None for a redelivery."""
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(ENQUEUE_EVENT_SQL, {
+            "payload": psycopg2.extras.Json(event),
+            "owner_id": event.get("owner_id"),
+            "object_type": event.get("object_type"),
+            "object_id": event.get("object_id"),
+            "aspect_type": event.get("aspect_type"),
+            "dedup_key": event_dedup_key(event),
+            "delay": WEBHOOK_COALESCE_SECONDS,
+        })
+        row = cursor.fetchone()
+        conn.commit()
+    return row[0] if row else None
+
+
+def claim_webhook_events(worker_id: str, max_objects: int = 1,
+                         stale_seconds: int = WEBHOOK_EVENT_STALE_SECONDS) -> List[Dict[str, Any]]:
+    """Claim the pending events of up to ``max_objects`` runnable objects (empty if the queue is idle)."""
+    with db_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        events = _claim_events(cursor, worker_id, max_objects, stale_seconds)
+        conn.commit()
+    return events
+
+
+def _claim_events(cursor, worker_id: str, max_objects: int, stale_seconds: int) -> List[Dict[str, Any]]:
+    """Lock up to ``max_objects`` objects and claim their events; the caller commits."""
+    params = {"worker_id": worker_id, "max_objects": max_objects, "stale_seconds": stale_seconds}
+    cursor.execute(LOCK_OBJECTS_SQL, params)
+    objects = cursor.fetchall()
+    if not objects:
+        return []
+    cursor.execute(CLAIM_EVENTS_SQL, dict(
+        params,
+        object_types=[obj["object_type"] for obj in objects],
+        object_ids=[obj["object_id"] for obj in objects],
+    ))
+    events = cursor.fetchall()
+    return sorted((dict(event) for event in events), key=lambda event: event["id"])
+
+
+def finish_webhook_events(events: List[Dict[str, Any]], worker_id: str, error: Optional[str] = None,
+                          retry_at: Optional[float] = None):
+    """Mark claimed events done, or schedule a retry (dead-lettering those out of attempts).
+
+    With ``retry_at`` (epoch seconds, e.g. when Strava's rate limit frees up)
+    the retry runs then and the failed attempt is not counted.
+    """
+    ids = [event["id"] for event in events]
+    with db_connection() as conn, conn.cursor() as cursor:
+        if error is None:
+            cursor.execute("""
+                UPDATE webhook_events
+                SET status = 'done', processed_at = NOW(), last_error = NULL, locked_by = NULL, locked_at = NULL
+                WHERE id = ANY(%s) AND locked_by = %s
+            """, (ids, worker_id))
+            outcomes = []
+        else:
+            cursor.execute(FAIL_EVENTS_SQL, {
+                "ids": ids, "worker_id": worker_id, "error": error, "retry_at": retry_at,
+                "max_attempts": WEBHOOK_EVENT_MAX_ATTEMPTS, "retry_seconds": WEBHOOK_EVENT_RETRY_SECONDS,
+            })
+            outcomes = cursor.fetchall()
+        conn.commit()
+    for event_id, status, attempts in outcomes:
+        if status == "dead":
+            logger.error(f"☠️ Webhook event {event_id} dead-lettered after {attempts} attempts: {error}")
+        else:
+            logger.warning(f"⚠️ Webhook event {event_id} failed (attempt {attempts}), retrying: {error}")
+
+
+def purge_webhook_events(retention_hours: int = WEBHOOK_EVENT_RETENTION_HOURS) -> int:
+    """Delete processed events past their retention; returns how many were removed."""
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM webhook_events WHERE status = 'done' AND processed_at < NOW() - make_interval(hours => %s)",
+            (retention_hours,),
+        )
+        conn.commit()
+        return cursor.rowcount
+
+
+def get_webhook_queue_stats(window_seconds: int = 300) -> Dict[str, Any]:
+    """Event counts per status, the age of the oldest queued event, and over the
+    last ``window_seconds`` the events processed per second and their lag from
+    receipt to processing (all durations in seconds)."""
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+            SELECT status, COUNT(*), EXTRACT(EPOCH FROM NOW() - MIN(received_at))
+            FROM webhook_events
+            GROUP BY status
+        """)
+        rows = cursor.fetchall()
+        cursor.execute("""
+            SELECT COUNT(*),
+                   AVG(EXTRACT(EPOCH FROM processed_at - received_at)),
+                   percentile_cont(0.95) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM processed_at - received_at))
+            FROM webhook_events
+            WHERE status = 'done' AND processed_at >= NOW() - make_interval(secs => %s)
+        """, (window_seconds,))
+        processed, avg_lag, p95_lag = cursor.fetchone()
+    stats = {"queued": 0, "processing": 0, "done": 0, "dead": 0, "oldest_queued_seconds": None}
+    for status, count, oldest in rows:
+        stats[status] = count
+        if status == "queued":
+            stats["oldest_queued_seconds"] = round(float(oldest), 1)
+    stats["recent"] = {
+        "window_seconds": window_seconds,
+        "events_per_second": round(processed / window_seconds, 2),
+        "avg_lag_seconds": round(float(avg_lag), 2) if avg_lag is not None else None,
+        "p95_lag_seconds": round(float(p95_lag), 2) if p95_lag is not None else None,
+    }
+    return stats
@@ -1,12 +1,21 @@
 from fastapi import FastAPI, Request, HTTPException
 import os
+import time
 from dotenv import load_dotenv
+from .utils.async_executor import run_db, run_http
+from .utils.strava_client import get_strava_client
+from .utils.strava_rate_limit import RateLimitExceeded
+from .utils.token_cache import get_access_token_cache
+from .utils.webhook_queue import enqueue_webhook_event
 
 load_dotenv()
 
 app = FastAPI()
 
 STRAVA_WEBHOOK_VERIFY_TOKEN = os.getenv("STRAVA_WEBHOOK_VERIFY_TOKEN")
+# "inline" processes each event before replying; "queue" only stores it for
+# stravatalk.webhook_worker and replies at once
+WEBHOOK_PROCESSING = os.getenv("WEBHOOK_PROCESSING", "inline")
 
 @app.get("/webhook")
 async def verify_webhook(request: Request):
@@ -24,9 +33,24 @@ async def handle_webhook_event(request: Request):
     event_data = await request.json()
     print(f"Received webhook event: {event_data}")
     
+    if WEBHOOK_PROCESSING == "queue":
+        try:
+            event_id = await run_db(enqueue_webhook_event, event_data)
+        except Exception as e:
+            print(f"Error queueing webhook event: {e}")
+            raise HTTPException(status_code=500, detail="Event could not be queued")
+        if event_id is None:
+            return {"message": "Duplicate event ignored"}
+        return {"message": "Event queued", "event_id": event_id}
+    
     try:
         await process_webhook_event(event_data)
         return {"message": "Event processed successfully"}
+    except RateLimitExceeded as e:
+        # Strava redelivers events that aren't acknowledged
+        print(f"Rate limited processing webhook event: {e}")
+        headers = {"Retry-After": str(max(int(e.retry_at - time.time()), 1))} if e.retry_at else None
+        raise HTTPException(status_code=429, detail=str(e), headers=headers)
     except Exception as e:
         print(f"Error processing webhook event: {e}")
         import traceback
@@ -56,71 +80,108 @@ async def process_webhook_event(event_data):
 
 async def handle_activity_create(activity_id, owner_id):
     """Handle new activity creation by fetching and storing activity data"""
-    from .utils.db_utils import get_db_connection
-    import requests
+    activity = await fetch_activity(activity_id, owner_id)
+    if activity is None:
+        return
     
+    # Store activity in database with athlete_id
+    await run_db(store_activity, activity, owner_id)
+    print(f"Stored new activity: {activity['name']} ({activity_id})")
+
+async def fetch_activity(activity_id, owner_id):
+    """Fetch an activity's details from Strava, or None if it can't be fetched for good"""
     # Get access token for this user (we'll need OAuth implementation later)
     access_token = await get_user_access_token(owner_id)
     if not access_token:
         print(f"No access token found for user {owner_id}")
-        return
+        return None
     
     # Fetch activity details from Strava API
-    headers = {"Authorization": f"Bearer {access_token}"}
-    response = requests.get(f"https://www.strava.com/api/v3/activities/{activity_id}", headers=headers)
+    response = await get_strava_client().arequest("GET", f"/activities/{activity_id}", access_token=access_token)
     
+    if response.status_code == 401:
+        # Revoked or replaced since it was cached; the next attempt reloads it
+        get_access_token_cache().invalidate(owner_id)
+        raise Exception(f"Access token for athlete {owner_id} was rejected")
+    if response.status_code == 429 or response.status_code >= 500:
+        # Worth retrying later (the queue worker does so)
+        raise Exception(f"Failed to fetch activity {activity_id}: {response.status_code}")
     if response.status_code != 200:
         print(f"Failed to fetch activity {activity_id}: {response.status_code}")
-        return
+        return None
     
-    activity = response.json()
+    return response.json()
+
+def store_activity(activity, owner_id):
+    """Upsert a fetched activity (blocking; run through run_db)"""
+    store_activities([(activity, owner_id)])
+
+def store_activities(entries):
+    """Upsert fetched activities, given as (activity, owner_id) pairs, in one transaction (blocking)"""
+    import psycopg2.extras
+    from .utils.db_pool import db_connection
+    from .utils.result_cache import bump_data_version, commit_data_versions
+    from .utils.athlete_stats import lock_activities, record_activity_replaced
+    from .utils.strava_sync import STORE_PAGE_SQL
     
-    # Store activity in database with athlete_id
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        """
-        INSERT INTO activities (id, athlete_id, name, distance, moving_time, elapsed_time, total_elevation_gain, type, start_date)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (id) DO UPDATE SET
-            athlete_id = EXCLUDED.athlete_id,
-            name = EXCLUDED.name,
-            distance = EXCLUDED.distance,
-            moving_time = EXCLUDED.moving_time,
-            elapsed_time = EXCLUDED.elapsed_time,
-            total_elevation_gain = EXCLUDED.total_elevation_gain,
-            type = EXCLUDED.type,
-            start_date = EXCLUDED.start_date;
-        """,
-        (
-            activity["id"],
-            owner_id,  # Store the athlete_id from webhook
-            activity["name"],
-            activity["distance"],
-            activity["moving_time"],
-            activity["elapsed_time"],
-            activity["total_elevation_gain"],
-            activity["type"],
-            activity["start_date"],
-        ),
-    )
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print(f"Stored new activity: {activity['name']} ({activity_id})")
+    # Latest fetch wins if an activity appears twice
+    entries = list({activity["id"]: (activity, owner_id) for activity, owner_id in entries}.values())
+    
+    with db_connection() as conn, conn.cursor() as cursor:
+        # A redelivered create replaces the stored row, so its old stats come out first
+        previous = lock_activities(cursor, [activity["id"] for activity, _ in entries])
+        
+        new_rows = []
+        changed_owners = set()
+        for activity, owner_id in entries:
+            values = (
+                owner_id,  # Store the athlete_id from webhook
+                activity["name"],
+                activity["distance"],
+                activity["moving_time"],
+                activity["elapsed_time"],
+                activity["total_elevation_gain"],
+                activity["type"],
+                activity["start_date"],
+                activity.get("start_date_local"),
+                activity["id"],
+            )
+            if activity["id"] not in previous:
+                # Column order of STORE_PAGE_SQL: id first, athlete_id last
+                new_rows.append((values[-1],) + values[1:-1] + (owner_id,))
+                changed_owners.add(owner_id)
+                continue
+            cursor.execute(
+                """
+                UPDATE activities SET
+                    athlete_id = %s,
+                    name = %s,
+                    distance = %s,
+                    moving_time = %s,
+                    elapsed_time = %s,
+                    total_elevation_gain = %s,
+                    type = %s,
+                    start_date = %s,
+                    start_date_local = %s
+                WHERE id = %s
+                """,
+                values,
+            )
+            if cursor.rowcount:
+                record_activity_replaced(cursor, owner_id, previous[activity["id"]], activity)
+                changed_owners.add(owner_id)
+        
+        if new_rows:
+            # One multi-row insert, with the stats and rollups of the rows it adds
+            psycopg2.extras.execute_values(cursor, STORE_PAGE_SQL, new_rows, page_size=len(new_rows), fetch=True)
+        versions = {owner_id: bump_data_version(cursor, owner_id) for owner_id in changed_owners}
+        commit_data_versions(conn, versions)
 
 async def handle_activity_update(activity_id, owner_id, updates):
     """Handle activity updates (name, type, privacy changes)"""
-    from .utils.db_utils import get_db_connection
-    
     if not updates:
         return
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     # Build dynamic UPDATE query based on what changed
     update_fields = []
     update_values = []
@@ -136,47 +197,68 @@ async def handle_activity_update(activity_id, owner_id, updates):
     if update_fields:
         update_values.extend([activity_id, owner_id])  # For WHERE clause
         query = f"UPDATE activities SET {', '.join(update_fields)} WHERE id = %s AND athlete_id = %s"
-        cursor.execute(query, update_values)
-        conn.commit()
+        await run_db(update_activity, query, update_values, activity_id, owner_id, updates.get("type"))
         print(f"Updated activity {activity_id} for athlete {owner_id}: {updates}")
-    
-    cursor.close()
-    conn.close()
 
 async def handle_activity_delete(activity_id, owner_id):
     """Handle activity deletion"""
-    from .utils.db_utils import get_db_connection
+    await run_db(delete_activity, activity_id, owner_id)
+    print(f"Deleted activity {activity_id} for athlete {owner_id}")
+
+def update_activity(query, params, activity_id, owner_id, new_type=None):
+    """Apply an activity UPDATE, moving its stats if the type changed (blocking)"""
+    from .utils.db_pool import db_connection
+    from .utils.result_cache import bump_data_version, commit_data_versions
+    from .utils.athlete_stats import lock_activity, record_activity_replaced
     
-    conn = get_db_connection()
-        
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM activities WHERE id = %s AND athlete_id = %s", (activity_id, owner_id))
+    with db_connection() as conn, conn.cursor() as cursor:
+        previous = lock_activity(cursor, activity_id, owner_id)
+        if previous is None:
+            return
+        cursor.execute(query, params)
+        if new_type is not None and new_type != previous["type"]:
+            record_activity_replaced(cursor, owner_id, previous, dict(previous, type=new_type))
+        version = bump_data_version(cursor, owner_id)
+        commit_data_versions(conn, {owner_id: version})
+
+def delete_activity(activity_id, owner_id):
+    """Delete an activity and remove it from the athlete's stats (blocking)"""
+    from .utils.db_pool import db_connection
+    from .utils.result_cache import bump_data_version, commit_data_versions
+    from .utils.athlete_stats import STATS_SOURCE_COLUMNS, STATS_SOURCE_NAMES, record_activity_removed
     
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print(f"Deleted activity {activity_id} for athlete {owner_id}")
+    with db_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM activities WHERE id = %s AND athlete_id = %s RETURNING {STATS_SOURCE_COLUMNS}",
+            (activity_id, owner_id),
+        )
+        removed = cursor.fetchone()
+        versions = {}
+        if removed:
+            record_activity_removed(cursor, owner_id, dict(zip(STATS_SOURCE_NAMES, removed)))
+            versions[owner_id] = bump_data_version(cursor, owner_id)
+        commit_data_versions(conn, versions)
 
 async def handle_athlete_deauthorize(owner_id):
     """Handle athlete deauthorization by removing their tokens"""
-    from .utils.db_utils import get_db_connection
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Remove user's tokens (we'll need to add athlete_id to tokens table later)
-    cursor.execute("DELETE FROM tokens WHERE id = %s", (owner_id,))
-    conn.commit()
-    
-    cursor.close()
-    conn.close()
+    await run_db(_delete_tokens, owner_id)
+    get_access_token_cache().invalidate(owner_id)
     print(f"Removed tokens for deauthorized athlete {owner_id}")
 
+def _delete_tokens(owner_id):
+    from .utils.db_pool import db_connection
+    
+    with db_connection() as conn, conn.cursor() as cursor:
+        # Remove user's tokens (we'll need to add athlete_id to tokens table later)
+        cursor.execute("DELETE FROM tokens WHERE id = %s", (owner_id,))
+        conn.commit()
+
 async def get_user_access_token(owner_id):
     """Get access token for a specific user by athlete_id, with automatic refresh"""
     from .utils.db_utils import get_valid_access_token
     
-    return get_valid_access_token(owner_id)
+    # May call Strava to refresh, so it runs on the HTTP pool
+    return await run_http(get_valid_access_token, owner_id)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,223 @@
+"""
+Background worker for queued Strava webhook events.
+
+With ``WEBHOOK_PROCESSING=queue`` the webhook endpoint only stores events in
+``webhook_events`` (see ``utils/webhook_queue.py``); this worker claims them
+in batches of up to ``WEBHOOK_BATCH_SIZE`` objects, merges each object's
+events (``coalesce_events``) and processes the batch, retrying failures and
+dead-lettering events that keep failing. Activity creates in a batch are
+fetched from Strava concurrently (within the shared rate limit) and stored
+in one transaction; other events go through
+``webhook_handler.process_webhook_event``. Run as many processes (or
+``--concurrency``) as needed; each object is claimed by one worker at a time,
+so its events are applied in order.
+
+Usage:
+    python -m stravatalk.webhook_worker [--concurrency 4] [--batch-size 20] [--once]
+"""
+
+import os
+import time
+import socket
+import asyncio
+import logging
+import argparse
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from .webhook_handler import fetch_activity, process_webhook_event, store_activities
+from .utils.db_pool import close_pool
+from .utils.async_executor import run_db, shutdown_executors
+from .utils.strava_rate_limit import RateLimitExceeded
+from .utils.webhook_queue import (
+    claim_webhook_events,
+    coalesce_events,
+    finish_webhook_events,
+    purge_webhook_events,
+)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_WORKER_POLL_SECONDS = float(os.getenv("WEBHOOK_WORKER_POLL_SECONDS", "1"))
+# Objects (activities, athletes) claimed and processed together
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "20"))
+WEBHOOK_METRICS_INTERVAL_SECONDS = float(os.getenv("WEBHOOK_METRICS_INTERVAL_SECONDS", "60"))
+# How often an idle worker deletes processed events past their retention
+PURGE_INTERVAL_SECONDS = 300
+
+_last_purge = 0.0
+
+
+class WorkerMetrics:
+    """Throughput and end-to-end lag (receipt to processed) of this worker process."""
+
+    def __init__(self, samples=1000):
+        self.processed = 0
+        self.failed = 0
+        self.batches = 0
+        self.fetches = 0
+        self._lags = deque(maxlen=samples)
+        self._window_start = time.monotonic()
+        self._window_processed = 0
+
+    def record_batch(self, events, failed_ids, fetches):
+        now = datetime.now(timezone.utc)
+        self.batches += 1
+        self.fetches += fetches
+        for event in events:
+            if event["id"] in failed_ids:
+                self.failed += 1
+                continue
+            self.processed += 1
+            self._window_processed += 1
+            self._lags.append((now - event["received_at"]).total_seconds())
+
+    def report(self):
+        """Log events/sec since the last report and the lag distribution of recent events."""
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < WEBHOOK_METRICS_INTERVAL_SECONDS:
+            return
+        rate = self._window_processed / elapsed
+        self._window_start, self._window_processed = now, 0
+        if not self._lags:
+            return
+        lags = sorted(self._lags)
+        logger.info(
+            f"📈 Webhook events: {rate:.2f}/s, lag p50 {lags[len(lags) // 2]:.1f}s "
+            f"p95 {lags[max(int(len(lags) * 0.95) - 1, 0)]:.1f}s max {lags[-1]:.1f}s "
+            f"({self.processed} processed, {self.failed} failed, {self.batches} batches, "
+            f"{self.fetches} fetches)"
+        )
+
+
+metrics = WorkerMetrics()
+
+
+def _error_text(e):
+    return f"{type(e).__name__}: {e}"
+
+
+async def run_events(events, worker_id):
+    """Process a claimed batch and record the outcome of every event in it.
+
+    Each object's events are merged first. Activity creates are fetched
+    concurrently and stored together; the rest run one object after another.
+    Failures are recorded per object, so one bad activity doesn't hold back
+    the rest of the batch. Objects that hit Strava's rate limit are retried
+    once it frees up.
+    """
+    groups = defaultdict(list)
+    for event in events:
+        payload = event["payload"]
+        groups[(payload.get("object_type"), payload.get("object_id"))].append(event)
+
+    creates = []
+    errors = {}
+    for key, group in groups.items():
+        payloads = coalesce_events([event["payload"] for event in group])
+        if len(payloads) == 1 and payloads[0].get("object_type") == "activity" \
+                and payloads[0].get("aspect_type") == "create":
+            creates.append((key, payloads[0]))
+            continue
+        try:
+            for payload in payloads:
+                await process_webhook_event(payload)
+        except Exception as e:
+            errors[key] = e
+
+    if creates:
+        fetched = await asyncio.gather(
+            *(fetch_activity(payload["object_id"], payload["owner_id"]) for _, payload in creates),
+            return_exceptions=True,
+        )
+        to_store = []
+        for (key, payload), result in zip(creates, fetched):
+            if isinstance(result, Exception):
+                errors[key] = result
+            elif result is not None:
+                to_store.append((key, (result, payload["owner_id"])))
+        if to_store:
+            try:
+                await run_db(store_activities, [entry for _, entry in to_store])
+            except Exception as e:
+                for key, _ in to_store:
+                    errors[key] = e
+
+    if len(events) > len(groups):
+        logger.info(f"🧩 {worker_id} coalesced {len(events)} events into {len(groups)}")
+    succeeded = [event for key, group in groups.items() if key not in errors for event in group]
+    if succeeded:
+        await run_db(finish_webhook_events, succeeded, worker_id)
+    for key, error in errors.items():
+        retry_at = error.retry_at if isinstance(error, RateLimitExceeded) else None
+        await run_db(finish_webhook_events, groups[key], worker_id, _error_text(error), retry_at)
+
+    failed_ids = {event["id"] for key in errors for event in groups[key]}
+    metrics.record_batch(events, failed_ids, len(creates))
+
+
+async def purge_if_due():
+    global _last_purge
+    if time.monotonic() - _last_purge < PURGE_INTERVAL_SECONDS:
+        return
+    _last_purge = time.monotonic()
+    try:
+        purged = await run_db(purge_webhook_events)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not purge processed webhook events: {e}")
+        return
+    if purged:
+        logger.info(f"🧹 Purged {purged} processed webhook events")
+
+
+async def worker_loop(worker_id, batch_size=WEBHOOK_BATCH_SIZE, once=False):
+    """Claim and process batches until cancelled (or the queue is empty, with ``once``)."""
+    while True:
+        try:
+            events = await run_db(claim_webhook_events, worker_id, batch_size)
+        except Exception as e:
+            logger.error(f"❌ {worker_id} could not claim webhook events: {e}")
+            events = []
+
+        metrics.report()
+        if not events:
+            if once:
+                return
+            await purge_if_due()
+            await asyncio.sleep(WEBHOOK_WORKER_POLL_SECONDS)
+            continue
+        await run_events(events, worker_id)
+
+
+async def run_workers(concurrency, batch_size=WEBHOOK_BATCH_SIZE, once=False):
+    base_id = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"🚀 Webhook worker {base_id} started with concurrency {concurrency}, batches of {batch_size}")
+    await asyncio.gather(*(worker_loop(f"{base_id}:{i}", batch_size, once) for i in range(concurrency)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process queued Strava webhook events")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("WEBHOOK_WORKER_CONCURRENCY", "4")))
+    parser.add_argument("--batch-size", type=int, default=WEBHOOK_BATCH_SIZE,
+                        help="objects claimed and processed together (1 disables batching)")
+    parser.add_argument("--once", action="store_true", help="exit when no event is runnable")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        asyncio.run(run_workers(args.concurrency, args.batch_size, args.once))
+    except KeyboardInterrupt:
+        # Events interrupted mid-processing are claimed again once they go stale
+        logger.info("🛑 Webhook worker stopped")
+    finally:
+        shutdown_executors()
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
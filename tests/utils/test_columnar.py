@@ -0,0 +1,114 @@
+from collections import namedtuple
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from stravatalk.utils.columnar import ColumnarResult
+
+Column = namedtuple("Column", ["name", "type_code"])
+
+COLUMNS = ["id", "distance", "type", "commute", "start_date", "day"]
+TYPE_CODES = [20, 1700, 25, 16, 1184, 1082]
+ROWS = [
+    (1, Decimal("5012.5"), "Run", True, datetime(2024, 5, 1, 7, 30, tzinfo=timezone.utc), date(2024, 5, 1)),
+    (2, Decimal("20100.0"), "Ride", False, datetime(2024, 5, 2, 18, 0, tzinfo=timezone.utc), date(2024, 5, 2)),
+    (3, None, "Swim", False, datetime(2024, 5, 3, 6, 15, tzinfo=timezone.utc), date(2024, 5, 3)),
+]
+
+
+def activities():
+    return ColumnarResult.from_rows(COLUMNS, TYPE_CODES, ROWS)
+
+
+class TestColumnarConversion:
+    """One typed array per column, converted from PostgreSQL rows."""
+
+    def test_column_types(self):
+        result = activities()
+
+        assert result.columns["id"].dtype == np.int64
+        assert result.columns["distance"].dtype == np.float64
+        assert result.columns["type"].dtype == object
+        assert result.columns["commute"].dtype == bool
+        assert isinstance(result.columns["start_date"].dtype, pd.DatetimeTZDtype)
+        assert str(result.columns["start_date"].dtype.tz) == "UTC"
+        assert pd.api.types.is_datetime64_dtype(result.columns["day"].dtype)
+
+    def test_nulls(self):
+        result = ColumnarResult.from_rows(["moving_time", "commute"], [23, 16], [(60, None), (None, True)])
+
+        assert result.columns["moving_time"].dtype == np.float64
+        assert np.isnan(result.columns["moving_time"][1])
+        assert result.columns["commute"].dtype == object
+        assert np.isnan(activities().columns["distance"][2])
+
+    def test_empty_result_keeps_columns(self):
+        result = ColumnarResult.from_rows(COLUMNS, TYPE_CODES, [])
+
+        assert len(result) == 0
+        assert list(result.to_dataframe().columns) == COLUMNS
+
+    def test_from_cursor_uses_description(self):
+        cursor = type("Cursor", (), {"description": [Column(name, code) for name, code in zip(COLUMNS, TYPE_CODES)]})
+
+        result = ColumnarResult.from_cursor(cursor, ROWS)
+
+        assert result.column_names == COLUMNS
+        assert result.columns["id"].tolist() == [1, 2, 3]
+
+
+class TestColumnarAccess:
+    """Slicing and conversion of a columnar result."""
+
+    def test_len_and_head(self):
+        result = activities()
+        head = result.head(2)
+
+        assert len(result) == 3
+        assert len(head) == 2
+        assert head.columns["type"].tolist() == ["Run", "Ride"]
+
+    def test_head_shares_arrays(self):
+        result = activities()
+
+        assert np.shares_memory(result.head(2).columns["id"], result.columns["id"])
+
+    def test_copy_does_not_share_arrays(self):
+        result = activities()
+        copy = result.copy()
+
+        frame = copy.to_dataframe()
+        frame.iloc[0, 0] = 99
+
+        assert copy.columns["id"][0] == 99
+
+        assert result.columns["id"][0] == 1
+        assert copy.date_columns == {"day"}
+
+    def test_to_dataframe(self):
+        frame = activities().to_dataframe()
+
+        assert list(frame.columns) == COLUMNS
+        assert frame["distance"].iloc[1] == 20100.0
+        assert frame["start_date"].iloc[0] == pd.Timestamp("2024-05-01 07:30", tz="UTC")
+
+    def test_to_records(self):
+        records = activities().to_records(limit=1)
+
+        assert records == [{
+            "id": 1, "distance": 5012.5, "type": "Run", "commute": True,
+            "start_date": "2024-05-01T07:30:00+00:00", "day": "2024-05-01",
+        }]
+
+    def test_to_records_turns_nulls_into_none(self):
+        records = activities().to_records()
+
+        assert records[2]["distance"] is None
+        assert ColumnarResult.from_rows(["day"], [1082], [(None,)]).to_records() == [{"day": None}]
+
+    def test_to_records_turns_missing_timestamps_into_none(self):
+        result = ColumnarResult.from_rows(["start_date"], [1184], [(None,)])
+
+        assert result.to_records() == [{"start_date": None}]
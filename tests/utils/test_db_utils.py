@@ -0,0 +1,147 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+import psycopg2.errors
+
+from stravatalk.utils import db_utils
+from stravatalk.utils.columnar import ColumnarResult
+from stravatalk.utils.query_guard import PlanEstimate
+from stravatalk.utils.result_cache import QueryResultCache
+from stravatalk.utils.sql_rewrite import cap_query
+
+SQL = "SELECT id FROM activities ORDER BY start_date DESC"
+
+
+class FakeCursor:
+    """Cursor that answers the capped query with ``rows`` and the count with ``count``."""
+
+    def __init__(self, rows, count=None, count_error=None):
+        self.rows = rows
+        self.count = count
+        self.count_error = count_error
+        self.executed = []
+        self.description = [SimpleNamespace(name="id")]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append(sql)
+        if sql.startswith("SELECT count(*)") and self.count_error:
+            raise self.count_error
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetchone(self):
+        return (self.count,)
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self, **kwargs):
+        return self._cursor
+
+
+def fetch(cursor, max_rows=2, cost_gate=False):
+    return db_utils._fetch_limited(
+        FakeConnection(cursor), cap_query(SQL, max_rows), SQL, None, max_rows, cost_gate=cost_gate
+    )
+
+
+class TestFetchLimited:
+    """Row count of a LIMIT-rewritten query."""
+
+    def test_untruncated_result_is_not_counted(self):
+        cursor = FakeCursor([{"id": 1}])
+
+        rows, _, total, lower_bound = fetch(cursor)
+
+        assert (len(rows), total, lower_bound) == (1, 1, False)
+        assert not any("count(*)" in sql for sql in cursor.executed)
+
+    def test_truncated_result_is_counted_under_a_timeout(self):
+        cursor = FakeCursor([{"id": 1}, {"id": 2}, {"id": 3}], count=40)
+
+        rows, _, total, lower_bound = fetch(cursor)
+
+        assert (len(rows), total, lower_bound) == (2, 40, False)
+        assert "statement_timeout" in cursor.executed[1]
+        assert cursor.executed[-1] == "ROLLBACK TO SAVEPOINT row_count"
+
+    def test_slow_count_reports_a_lower_bound(self):
+        cursor = FakeCursor([{"id": 1}, {"id": 2}, {"id": 3}], count_error=psycopg2.errors.QueryCanceled())
+
+        _, _, total, lower_bound = fetch(cursor)
+
+        assert (total, lower_bound) == (3, True)
+        assert cursor.executed[-1] == "ROLLBACK TO SAVEPOINT row_count"
+
+    def test_costly_count_is_not_run(self):
+        cursor = FakeCursor([{"id": 1}, {"id": 2}, {"id": 3}], count=40)
+        estimate = PlanEstimate(total_cost=1e9, plan_rows=1, max_node_rows=1e8, node_type="Aggregate")
+
+        with mock.patch.object(db_utils, "explain_query", return_value=estimate) as explain:
+            _, _, total, lower_bound = fetch(cursor, cost_gate=True)
+
+        assert explain.call_args.args[1].startswith("SELECT count(*)")
+        assert (total, lower_bound) == (3, True)
+        assert not any("count(*)" in sql for sql in cursor.executed)
+
+    def test_cheap_count_passes_the_gate(self):
+        cursor = FakeCursor([{"id": 1}, {"id": 2}, {"id": 3}], count=40)
+        estimate = PlanEstimate(total_cost=10, plan_rows=1, max_node_rows=40, node_type="Aggregate")
+
+        with mock.patch.object(db_utils, "explain_query", return_value=estimate):
+            _, _, total, lower_bound = fetch(cursor, cost_gate=True)
+
+        assert (total, lower_bound) == (40, False)
+
+
+class TestFetchCapped:
+    """Statements read through a server-side cursor are never counted in full."""
+
+    def test_truncated_count_is_a_lower_bound(self):
+        cursor = FakeCursor([{"id": 1}, {"id": 2}, {"id": 3}])
+
+        rows, _, total, lower_bound = db_utils._fetch_capped(FakeConnection(cursor), SQL, None, 2)
+
+        assert (len(rows), total, lower_bound) == (2, 3, True)
+
+    def test_complete_result_is_exact(self):
+        cursor = FakeCursor([{"id": 1}, {"id": 2}])
+
+        _, _, total, lower_bound = db_utils._fetch_capped(FakeConnection(cursor), SQL, None, 2)
+
+        assert (total, lower_bound) == (2, False)
+
+
+class TestExecuteCachedSqlQuery:
+    """Results handed out by the result cache."""
+
+    def test_editing_a_result_does_not_change_later_hits(self):
+        columnar = ColumnarResult.from_rows(["id", "distance"], [20, 1700], [(1, 5000.0), (2, 8000.0)])
+        result = {"success": True, "columnar": columnar, "rows": None, "row_count": 2}
+
+        @contextmanager
+        def db_connection(*args, **kwargs):
+            yield mock.MagicMock()
+
+        with mock.patch.object(db_utils, "db_connection", db_connection), \
+             mock.patch.object(db_utils, "get_data_version", return_value=(1, None)), \
+             mock.patch.object(db_utils, "has_read_replica", return_value=False), \
+             mock.patch.object(db_utils, "get_result_cache", return_value=QueryResultCache()), \
+             mock.patch.object(db_utils, "_execute_on_connection", return_value=result):
+            first = db_utils.execute_cached_sql_query(SQL, 42, columnar=True)
+            frame = first["columnar"].to_dataframe()
+            frame.iloc[0, 1] = 0.0
+            second = db_utils.execute_cached_sql_query(SQL, 42, columnar=True)
+
+        assert second["cache_hit"]
+        assert second["columnar"].columns["distance"].tolist() == [5000.0, 8000.0]
@@ -0,0 +1,100 @@
+from unittest import mock
+
+import psycopg2
+import pytest
+
+from stravatalk.utils.replica_router import ReplicaRouter, parse_lsn
+from stravatalk.utils.result_cache import commit_data_versions
+
+
+class FakeReplica:
+    """Connection whose replay-position query returns (in_recovery, replay_lsn)."""
+
+    def __init__(self, in_recovery=True, replayed_through="1/0"):
+        self.position = (in_recovery, replayed_through)
+        self.checks = 0
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value = cursor
+        cursor.fetchone.side_effect = self._fetch
+        self.cursor = mock.Mock(return_value=cursor)
+
+    def _fetch(self):
+        self.checks += 1
+        return self.position
+
+
+class TestParseLsn:
+    def test_parses_high_and_low_words(self):
+        assert parse_lsn("16/B374D848") == (0x16 << 32) + 0xB374D848
+        assert parse_lsn("0/0") == 0
+
+    def test_orders_like_postgres(self):
+        assert parse_lsn("1/0") > parse_lsn("0/FFFFFFFF")
+
+
+class TestReplicaRouter:
+    """Read-your-writes check against the replica's WAL replay position."""
+
+    def test_replayed_write_is_fresh(self):
+        assert ReplicaRouter().is_fresh_for(FakeReplica(replayed_through="1/200"), "1/100")
+
+    def test_unreplayed_write_is_not(self):
+        assert not ReplicaRouter().is_fresh_for(FakeReplica(replayed_through="1/100"), "1/200")
+
+    def test_athlete_without_writes_is_fresh(self):
+        assert ReplicaRouter().is_fresh_for(FakeReplica(replayed_through=None), None)
+
+    def test_server_not_in_recovery_proves_nothing(self):
+        assert not ReplicaRouter().is_fresh_for(FakeReplica(in_recovery=False, replayed_through=None), "0/1")
+
+    def test_recent_position_is_reused(self):
+        router = ReplicaRouter(recheck_seconds=60)
+        replica = FakeReplica(replayed_through="1/200")
+
+        router.is_fresh_for(replica, "1/100")
+        router.is_fresh_for(replica, "1/180")
+
+        assert replica.checks == 1
+
+    def test_position_is_remeasured_when_behind(self):
+        router = ReplicaRouter(recheck_seconds=60)
+        replica = FakeReplica(replayed_through="1/100")
+        router.is_fresh_for(replica, "1/100")
+
+        replica.position = (True, "1/300")
+
+        assert router.is_fresh_for(replica, "1/200")
+        assert replica.checks == 2
+        assert router.stats()["replayed_through"] == "1/300"
+
+
+class TestCommitDataVersions:
+    """Recording a write's WAL position once it has committed."""
+
+    @pytest.fixture
+    def conn(self):
+        conn = mock.MagicMock()
+        conn.cursor.return_value.__enter__.return_value = conn.cursor.return_value
+        return conn
+
+    def test_records_position_after_commit(self, conn):
+        commit_data_versions(conn, {5: 3, 6: 1})
+
+        sql, (athletes, versions) = conn.cursor.return_value.execute.call_args.args
+        assert "pg_current_wal_insert_lsn()" in sql
+        assert (athletes, versions) == ([5, 6], [3, 1])
+        assert conn.commit.call_count == 2
+
+    def test_nothing_to_record(self, conn):
+        commit_data_versions(conn, {})
+
+        conn.cursor.assert_not_called()
+        conn.commit.assert_called_once()
+
+    def test_write_stays_committed_if_recording_fails(self, conn):
+        conn.cursor.return_value.execute.side_effect = psycopg2.OperationalError("connection lost")
+
+        commit_data_versions(conn, {5: 3})
+
+        conn.commit.assert_called_once()
+        conn.rollback.assert_called_once()
@@ -0,0 +1,87 @@
+import pytest
+
+from stravatalk.utils.result_cache import QueryResultCache, normalize_sql
+
+
+def result(rows):
+    return {"success": True, "data": rows, "row_count": len(rows)}
+
+
+@pytest.fixture
+def cache():
+    return QueryResultCache(max_entries=2)
+
+
+class TestQueryResultCache:
+    """Version-tagged LRU of query results."""
+
+    def test_hit_at_same_version(self, cache):
+        key = cache.make_key(1, "SELECT 1")
+        cache.put(key, 3, result([1]))
+
+        assert cache.get(key, 3) == result([1])
+        assert cache.stats()["hits"] == 1
+
+    def test_hit_returns_a_copy(self, cache):
+        key = cache.make_key(1, "SELECT 1")
+        cache.put(key, 3, result([1]))
+
+        cache.get(key, 3)["cache_hit"] = True
+
+        assert "cache_hit" not in cache.get(key, 3)
+
+    def test_new_version_retires_entry(self, cache):
+        key = cache.make_key(1, "SELECT 1")
+        cache.put(key, 3, result([1]))
+
+        assert cache.get(key, 4) is None
+        assert cache.get(key, 3) is None
+        stats = cache.stats()
+        assert (stats["stale"], stats["misses"], stats["entries"]) == (1, 2, 0)
+
+    def test_evicts_least_recently_used(self, cache):
+        first, second, third = (cache.make_key(1, f"SELECT {n}") for n in range(3))
+        cache.put(first, 1, result([0]))
+        cache.put(second, 1, result([1]))
+        cache.get(first, 1)
+
+        cache.put(third, 1, result([2]))
+
+        assert cache.get(second, 1) is None
+        assert cache.get(first, 1) is not None
+        assert cache.get(third, 1) is not None
+        assert cache.stats()["evictions"] == 1
+
+    def test_zero_size_disables_cache(self):
+        cache = QueryResultCache(max_entries=0)
+        key = cache.make_key(1, "SELECT 1")
+
+        cache.put(key, 1, result([1]))
+
+        assert cache.get(key, 1) is None
+
+    def test_hit_rate(self, cache):
+        key = cache.make_key(1, "SELECT 1")
+        cache.get(key, 1)
+        cache.put(key, 1, result([1]))
+        cache.get(key, 1)
+
+        assert cache.stats()["hit_rate"] == 0.5
+
+
+class TestCacheKeys:
+    """What makes two queries share a cache entry."""
+
+    def test_layout_and_comments_do_not_matter(self):
+        assert QueryResultCache.make_key(1, "SELECT id\n  FROM activities -- all;\n;") == \
+            QueryResultCache.make_key(1, "SELECT id FROM activities")
+
+    def test_athlete_and_options_do(self):
+        key = QueryResultCache.make_key(1, "SELECT 1", 100, False, False)
+
+        assert key != QueryResultCache.make_key(2, "SELECT 1", 100, False, False)
+        assert key != QueryResultCache.make_key(1, "SELECT 1", 100, True, False)
+        assert key != QueryResultCache.make_key(1, "SELECT 1", 50, False, False)
+
+    def test_normalize_sql(self):
+        assert normalize_sql("  SELECT 1 ; ") == "SELECT 1"
@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+
+from stravatalk.utils import schema_cache
+from stravatalk.utils.schema_cache import SCHEMA_VERSION_QUERY, SchemaCache
+
+
+class FakeMigrationsCursor:
+    """Cursor over an in-memory schema_migrations table ({version: applied_at})."""
+
+    def __init__(self, applied):
+        self.applied = applied
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params=None):
+        assert sql == SCHEMA_VERSION_QUERY
+
+    def fetchone(self):
+        return len(self.applied), max(self.applied.values(), default=None)
+
+
+@pytest.fixture
+def migrations():
+    """Replace the pool with one fake connection; returns the migrations table."""
+    started = datetime(2024, 5, 1, 12, 0)
+    applied = {f"{n:03d}_migration.sql": started + timedelta(minutes=n) for n in range(1, 17) if n != 9}
+    cursor = FakeMigrationsCursor(applied)
+    conn = mock.Mock()
+    conn.cursor.return_value = cursor
+
+    @contextmanager
+    def db_connection(*args, **kwargs):
+        yield conn
+
+    with mock.patch.object(schema_cache, "db_connection", db_connection):
+        yield applied
+
+
+def cache_with_loader():
+    loader = mock.Mock(return_value=[{"name": "activities", "description": "", "columns": []}])
+    return SchemaCache(loader, recheck_seconds=0), loader
+
+
+class TestSchemaCache:
+    """Rebuilding the table definitions when a migration is recorded."""
+
+    def test_unchanged_marker_reuses_definitions(self, migrations):
+        cache, loader = cache_with_loader()
+
+        cache.get()
+        cache.get()
+
+        assert loader.call_count == 1
+
+    def test_older_version_recorded_late_rebuilds(self, migrations):
+        cache, loader = cache_with_loader()
+        cache.get()
+
+        migrations["009_partition_activities_swap"] = datetime(2024, 5, 2)
+        cache.get()
+
+        assert loader.call_count == 2
+
+    def test_reapplied_migration_rebuilds(self, migrations):
+        cache, loader = cache_with_loader()
+        cache.get()
+
+        migrations["003_migration.sql"] = datetime(2024, 5, 2)
+        cache.get()
+
+        assert loader.call_count == 2
@@ -0,0 +1,70 @@
+import pytest
+
+from stravatalk.utils.sql_rewrite import cap_query, count_query
+
+
+class TestCapQuery:
+    """Top-level LIMIT injection and tightening for generated SELECTs."""
+
+    def test_injects_limit_when_missing(self):
+        capped = cap_query("SELECT id FROM activities ORDER BY start_date DESC", 100)
+
+        assert capped.sql == "SELECT id FROM activities ORDER BY start_date DESC\nLIMIT 101"
+        assert capped.fetch_limit == 101
+        assert capped.may_truncate
+
+    def test_strips_comments_and_semicolon_before_injecting(self):
+        capped = cap_query("SELECT id FROM activities; -- latest first", 10)
+
+        assert capped.sql == "SELECT id FROM activities\nLIMIT 11"
+
+    def test_tightens_larger_limit(self):
+        capped = cap_query("SELECT id FROM activities LIMIT 5000", 100)
+
+        assert capped.sql == "SELECT id FROM activities LIMIT 101"
+        assert capped.may_truncate
+
+    def test_tightens_limit_all(self):
+        capped = cap_query("SELECT id FROM activities LIMIT ALL", 100)
+
+        assert capped.sql == "SELECT id FROM activities LIMIT 101"
+
+    def test_keeps_limit_within_cap(self):
+        sql = "SELECT id FROM activities LIMIT 20"
+        capped = cap_query(sql, 100)
+
+        assert capped.sql == sql
+        assert capped.fetch_limit == 100
+        assert not capped.may_truncate
+
+    def test_ignores_limits_inside_subqueries_and_ctes(self):
+        sql = (
+            "WITH recent AS (SELECT id FROM activities LIMIT 5) "
+            "SELECT * FROM recent WHERE id IN (SELECT id FROM activities LIMIT 3)"
+        )
+        capped = cap_query(sql, 100)
+
+        assert capped.sql == f"{sql}\nLIMIT 101"
+        assert capped.may_truncate
+
+    @pytest.mark.parametrize("sql", [
+        "SELECT id FROM activities LIMIT %s",
+        "SELECT id FROM activities LIMIT (SELECT 10)",
+        "SELECT id FROM activities FETCH FIRST 10 ROWS ONLY",
+        "SELECT id FROM activities FOR UPDATE",
+        "SELECT id INTO copy FROM activities",
+        "UPDATE activities SET name = 'x'",
+        "SELECT 1; SELECT 2",
+        "",
+    ])
+    def test_falls_back_when_limit_cannot_be_rewritten(self, sql):
+        assert cap_query(sql, 100) is None
+
+
+class TestCountQuery:
+    """Row count of the uncapped query."""
+
+    def test_wraps_original_query(self):
+        assert count_query("SELECT id FROM activities; -- all") == (
+            "SELECT count(*) FROM (\nSELECT id FROM activities\n) AS uncapped"
+        )
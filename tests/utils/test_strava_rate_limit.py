@@ -0,0 +1,165 @@
+from unittest import mock
+
+import pytest
+
+from stravatalk.utils import strava_client
+from stravatalk.utils.strava_rate_limit import (
+    DAY_SECONDS,
+    SHORT_WINDOW_SECONDS,
+    RateLimitExceeded,
+    StravaRateLimiter,
+)
+
+
+class FakeClock:
+    def __init__(self, now=DAY_SECONDS * 100 + 60):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def limiter(clock, short_limit=5, daily_limit=100, reserve=2):
+    return StravaRateLimiter(short_limit=short_limit, daily_limit=daily_limit, reserve=reserve, clock=clock)
+
+
+def drain(bucket, **kwargs):
+    taken = 0
+    while True:
+        try:
+            bucket.acquire(max_wait=0, **kwargs)
+        except RateLimitExceeded:
+            return taken
+        taken += 1
+
+
+class TestStravaRateLimiter:
+    """Token bucket over Strava's 15-minute and daily windows."""
+
+    def test_background_calls_leave_the_reserve(self, clock):
+        bucket = limiter(clock)
+
+        assert drain(bucket) == 3
+        assert drain(bucket, use_reserve=True) == 2
+
+    def test_spent_window_raises_with_next_window(self, clock):
+        bucket = limiter(clock)
+        drain(bucket, use_reserve=True)
+
+        with pytest.raises(RateLimitExceeded) as exc_info:
+            bucket.acquire(max_wait=60, use_reserve=True)
+
+        assert exc_info.value.retry_at == bucket.next_window_at()
+        assert exc_info.value.retry_at % SHORT_WINDOW_SECONDS == 0
+
+    def test_next_window_refills(self, clock):
+        bucket = limiter(clock)
+        drain(bucket, use_reserve=True)
+
+        clock.now = bucket.next_window_at()
+
+        assert drain(bucket, use_reserve=True) == 5
+
+    def test_daily_limit_raises_until_tomorrow(self, clock):
+        bucket = limiter(clock, short_limit=10, daily_limit=4, reserve=0)
+        drain(bucket)
+        clock.now = bucket.next_window_at()
+
+        with pytest.raises(RateLimitExceeded) as exc_info:
+            bucket.acquire()
+
+        assert exc_info.value.retry_at == (clock.now // DAY_SECONDS + 1) * DAY_SECONDS
+
+    def test_headers_resync_limits_and_usage(self, clock):
+        bucket = limiter(clock)
+
+        bucket.update({"X-RateLimit-Limit": "100,1000", "X-RateLimit-Usage": "97,500"})
+
+        stats = bucket.stats()
+        assert (stats["short_limit"], stats["daily_limit"]) == (100, 1000)
+        assert (stats["short_used"], stats["daily_used"]) == (97, 500)
+        assert drain(bucket, use_reserve=True) == 3
+
+    def test_headers_never_lower_own_count(self, clock):
+        bucket = limiter(clock)
+        drain(bucket)
+
+        bucket.update({"X-RateLimit-Usage": "1,1"})
+
+        assert bucket.stats()["short_used"] == 3
+
+    def test_malformed_headers_are_ignored(self, clock):
+        bucket = limiter(clock)
+
+        bucket.update({"X-RateLimit-Limit": "garbage", "X-RateLimit-Usage": None})
+
+        assert bucket.stats()["short_limit"] == 5
+
+    def test_throttled_spends_the_window(self, clock):
+        bucket = limiter(clock)
+
+        bucket.throttled({})
+
+        assert bucket.stats()["throttled"] == 1
+        assert drain(bucket, use_reserve=True) == 0
+
+
+class TestStravaClientRateLimit:
+    """How the client feeds responses back into the limiter."""
+
+    @pytest.fixture
+    def bucket(self, clock):
+        bucket = limiter(clock)
+        with mock.patch.object(strava_client, "get_strava_rate_limiter", return_value=bucket):
+            yield bucket
+
+    @pytest.fixture
+    def client(self):
+        client = strava_client.StravaClient(api_url="https://strava.test/api/v3")
+        with mock.patch.object(client, "_backoff"):
+            yield client
+
+    def respond(self, client, *responses):
+        client.session.request = mock.Mock(side_effect=[
+            mock.Mock(status_code=status, headers=headers) for status, headers in responses
+        ])
+
+    def test_response_headers_update_the_limiter(self, bucket, client):
+        self.respond(client, (200, {"X-RateLimit-Limit": "100,1000", "X-RateLimit-Usage": "40,400"}))
+
+        response = client.request("GET", "/athlete", access_token="token")
+
+        assert response.status_code == 200
+        assert bucket.stats()["short_used"] == 40
+
+    def test_429_spends_the_window_before_retrying(self, bucket, client):
+        self.respond(client, (429, {}), (200, {}))
+
+        with pytest.raises(RateLimitExceeded) as exc_info:
+            client.request("GET", "/athlete", max_wait=5)
+
+        assert exc_info.value.retry_at == bucket.next_window_at()
+        assert client.session.request.call_count == 1
+        assert bucket.stats()["throttled"] == 1
+
+    def test_interactive_calls_fail_fast(self, bucket, client):
+        drain(bucket, use_reserve=True)
+        self.respond(client, (200, {}))
+
+        with pytest.raises(RateLimitExceeded):
+            client.request("GET", "/athlete")
+
+        client.session.request.assert_not_called()
+
+    def test_oauth_calls_skip_the_limiter(self, bucket, client):
+        drain(bucket, use_reserve=True)
+        self.respond(client, (200, {}))
+
+        response = client.request("POST", "https://strava.test/oauth/token", rate_limited=False)
+
+        assert response.status_code == 200
@@ -0,0 +1,183 @@
+import threading
+from contextlib import contextmanager
+from unittest import mock
+
+import pytest
+
+from stravatalk.utils import strava_sync
+from stravatalk.utils.strava_sync import StravaSyncService
+
+PER_PAGE = 3
+
+
+def page_of(page, count=PER_PAGE):
+    """``count`` activities for a listing page, newest in the highest page."""
+    return [
+        {"id": page * 10 + n, "start_date": f"2024-05-{page:02d}T0{n}:00:00Z"}
+        for n in range(count)
+    ]
+
+
+@pytest.fixture
+def service():
+    with mock.patch.object(strava_sync, "get_strava_client"):
+        yield StravaSyncService()
+
+
+class TestFetchPages:
+    """Concurrent page fetching for the historical sync."""
+
+    def test_stops_after_short_page(self, service):
+        requested = []
+
+        def fetch(access_token, page, per_page, after=None):
+            requested.append(page)
+            if page <= 3:
+                return page_of(page), 1.0
+            if page == 4:
+                return page_of(page, count=1), 1.0
+            return [], 1.0
+
+        service._fetch_activities_page = fetch
+
+        pages = list(service._fetch_pages("token", per_page=PER_PAGE, workers=2))
+
+        assert sorted(page for page, _, _ in pages) == [1, 2, 3, 4]
+        # Only the pages already in flight when the short one arrived go past it
+        assert max(requested) <= 5
+
+    def test_starts_at_start_page(self, service):
+        service._fetch_activities_page = lambda token, page, per_page, after=None: (
+            (page_of(page, count=1), 1.0) if page == 7 else ([], 1.0)
+        )
+
+        pages = list(service._fetch_pages("token", per_page=PER_PAGE, workers=1, start_page=7))
+
+        assert [page for page, _, _ in pages] == [7]
+
+    def test_yields_pages_as_they_arrive(self, service):
+        first_page_released = threading.Event()
+
+        def fetch(access_token, page, per_page, after=None):
+            if page == 1:
+                # Page 1 only returns once page 2 has been handed out
+                first_page_released.wait(5)
+                return page_of(page), 1.0
+            return (page_of(page, count=1), 1.0) if page == 2 else ([], 1.0)
+
+        service._fetch_activities_page = fetch
+        pages = service._fetch_pages("token", per_page=PER_PAGE, workers=2)
+
+        assert next(pages)[0] == 2
+        first_page_released.set()
+        assert [page for page, _, _ in pages] == [1]
+
+
+class TestSyncCheckpoints:
+    """The checkpoint only ever covers a gap-free prefix of stored pages."""
+
+    @pytest.fixture
+    def sync(self, service):
+        checkpoints = []
+
+        def store_page(conn, activities, athlete_id, checkpoint=None):
+            checkpoints.append(checkpoint)
+            return len(activities)
+
+        @contextmanager
+        def db_connection(*args, **kwargs):
+            yield mock.MagicMock()
+
+        with mock.patch.object(strava_sync, "get_user_strava_connection",
+                               return_value={"access_token": "token", "athlete_id": 5}), \
+                mock.patch.object(strava_sync, "db_connection", db_connection), \
+                mock.patch.object(strava_sync, "get_athlete_stats", return_value={"activity_count": 9}), \
+                mock.patch.object(service, "_store_page", side_effect=store_page), \
+                mock.patch.object(service, "_init_sync_status"), \
+                mock.patch.object(service, "_complete_sync_status") as complete:
+            service.complete = complete
+            service.checkpoints = checkpoints
+            yield service
+
+    def run(self, sync, state, arrival_order):
+        sync._get_sync_state = lambda user_id: state
+        sync._fetch_pages = mock.Mock(return_value=iter(
+            (page, page_of(page), 1.0) for page in arrival_order
+        ))
+        return sync.sync_historical_activities(user_id=1)
+
+    def test_out_of_order_pages_advance_the_checkpoint_only_past_gaps(self, sync):
+        result = self.run(sync, {}, [2, 4, 1, 3])
+
+        assert result["success"]
+        assert [checkpoint["pages_done"] for checkpoint in sync.checkpoints] == [0, 0, 2, 4]
+        assert [checkpoint["added"] for checkpoint in sync.checkpoints] == [0, 3, 6, 9]
+
+    def test_checkpoint_carries_newest_activity_so_far(self, sync):
+        self.run(sync, {}, [2, 1])
+
+        assert [checkpoint["newest"][1] for checkpoint in sync.checkpoints] == [22, 22]
+        assert sync.complete.call_args.args[2][1] == 22
+
+    def test_resume_refetches_last_stored_page(self, sync):
+        state = {
+            "next_request_at": None, "sync_completed": False, "sync_pages_done": 3,
+            "sync_after": None, "sync_activities_stored": 9, "newest": None, "watermark": None,
+        }
+
+        result = self.run(sync, state, [4, 3, 5])
+
+        assert result["resumed"]
+        assert sync._fetch_pages.call_args.kwargs["start_page"] == 3
+        assert [checkpoint["pages_done"] for checkpoint in sync.checkpoints] == [2, 4, 5]
+
+    def test_untracked_sync_saves_no_checkpoint(self, sync):
+        self.run(sync, None, [1, 2])
+
+        assert sync.checkpoints == [None, None]
+
+
+class TestStorePage:
+    """Storing a page only inserts activities that aren't stored under any start_date."""
+
+    @pytest.fixture
+    def conn(self):
+        conn = mock.MagicMock()
+        cursor = conn.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = []
+        with mock.patch.object(strava_sync.psycopg2.extras, "execute_values", return_value=[(0,)]) as insert, \
+                mock.patch.object(strava_sync, "bump_data_version", return_value=2), \
+                mock.patch.object(strava_sync, "commit_data_versions") as commit:
+            conn.stored = cursor.fetchall
+            conn.insert = insert
+            conn.commit_versions = commit
+            yield conn
+
+    def test_activity_with_edited_start_date_is_not_inserted_again(self, service, conn):
+        # Activity 11 is stored with the start_date it had before being edited on Strava
+        conn.stored.return_value = [(11, 5, "Run", 5000, 1500, 1600, 20, "2024-04-30T07:00:00Z", None)]
+        conn.insert.return_value = [(1,)]
+        edited = dict(page_of(1)[1], start_date="2024-05-01T09:30:00Z")
+
+        added = service._store_page(conn, [page_of(1)[0], edited], athlete_id=5)
+
+        rows = conn.insert.call_args.args[2]
+        assert [row[0] for row in rows] == [10]
+        assert added == 1
+        conn.commit_versions.assert_called_once_with(conn, {5: 2})
+
+    def test_page_already_stored_inserts_nothing(self, service, conn):
+        conn.stored.return_value = [(activity["id"], 5) + (None,) * 7 for activity in page_of(1)]
+
+        added = service._store_page(conn, page_of(1), athlete_id=5)
+
+        assert added == 0
+        conn.insert.assert_not_called()
+        conn.commit_versions.assert_called_once_with(conn, {})
+
+    def test_repeated_activity_is_inserted_once(self, service, conn):
+        conn.insert.return_value = [(1,)]
+
+        service._store_page(conn, [page_of(1)[0], page_of(1)[0]], athlete_id=5)
+
+        assert len(conn.insert.call_args.args[2]) == 1
@@ -0,0 +1,146 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pytest
+
+from stravatalk import sync_worker
+from stravatalk.utils import strava_sync, sync_jobs
+from stravatalk.utils.strava_sync import StravaSyncService
+from stravatalk.utils.sync_jobs import (
+    SYNC_JOB_MAX_ATTEMPTS,
+    SYNC_JOB_RETRY_SECONDS,
+    enqueue_sync_job,
+    finish_sync_job,
+)
+
+
+class FakeCursor:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+    def fetchone(self):
+        return self.rows.pop(0)
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.commits = 0
+
+    def cursor(self, **kwargs):
+        return self._cursor
+
+    def commit(self):
+        self.commits += 1
+
+
+@pytest.fixture
+def database():
+    """Replace the pool with one fake connection; returns its cursor."""
+    cursor = FakeCursor()
+    conn = FakeConnection(cursor)
+
+    @contextmanager
+    def db_connection(*args, **kwargs):
+        yield conn
+
+    with mock.patch.object(sync_jobs, "db_connection", db_connection):
+        yield cursor
+
+
+def finish(cursor, attempts, result):
+    """Run finish_sync_job and return the (status, run_after, attempts delta, error) it stored."""
+    finish_sync_job({"id": 7, "attempts": attempts}, "worker-1", result)
+    (_, params), = cursor.executed
+    status, run_after, attempts_delta, error = params[:4]
+    assert params[-2:] == (7, "worker-1")
+    return status, run_after, attempts_delta, error
+
+
+class TestFinishSyncJob:
+    """State transitions when a worker reports a sync result."""
+
+    def test_success(self, database):
+        status, _, attempts_delta, error = finish(database, 1, {"success": True, "activities_synced": 40})
+
+        assert (status, attempts_delta, error) == ("succeeded", 0, None)
+
+    def test_rate_limited_is_requeued_without_using_an_attempt(self, database):
+        retry_at = datetime(2024, 5, 1, 12, 15, tzinfo=timezone.utc)
+
+        status, run_after, attempts_delta, error = finish(
+            database, SYNC_JOB_MAX_ATTEMPTS, {"success": False, "retry_at": retry_at, "error": "rate limited"}
+        )
+
+        assert (status, run_after, attempts_delta, error) == ("queued", retry_at, -1, "rate limited")
+
+    def test_failure_is_retried_with_growing_delay(self, database):
+        before = datetime.now(timezone.utc)
+
+        status, run_after, attempts_delta, error = finish(database, 2, {"success": False, "error": "boom"})
+
+        assert (status, attempts_delta, error) == ("queued", 0, "boom")
+        assert run_after >= before + timedelta(seconds=SYNC_JOB_RETRY_SECONDS * 2)
+
+    def test_last_attempt_fails_for_good(self, database):
+        status, _, _, error = finish(database, SYNC_JOB_MAX_ATTEMPTS, {"success": False, "error": "boom"})
+
+        assert (status, error) == ("failed", "boom")
+
+
+class TestEnqueueSyncJob:
+    """Queueing a sync, or joining the one already active."""
+
+    def test_new_job(self, database):
+        database.rows = [{"id": 1, "status": "queued"}]
+
+        assert enqueue_sync_job(42)["id"] == 1
+        assert len(database.executed) == 1
+
+    def test_returns_active_job(self, database):
+        database.rows = [None, {"id": 2, "status": "running"}]
+
+        assert enqueue_sync_job(42)["id"] == 2
+
+    def test_retries_when_active_job_finished_in_between(self, database):
+        database.rows = [None, None, {"id": 3, "status": "queued"}]
+
+        assert enqueue_sync_job(42)["id"] == 3
+        assert len(database.executed) == 3
+
+
+class TestRunJob:
+    """A worker stops a job that was reclaimed from it."""
+
+    @pytest.fixture
+    def service(self):
+        with mock.patch.object(strava_sync, "get_strava_client"), \
+             mock.patch.object(strava_sync, "get_user_strava_connection",
+                               return_value={"access_token": "token", "athlete_id": 42}), \
+             mock.patch.object(StravaSyncService, "_get_sync_state", return_value=None), \
+             mock.patch.object(StravaSyncService, "_init_sync_status"), \
+             mock.patch.object(StravaSyncService, "_fetch_pages", return_value=iter([])) as fetch_pages, \
+             mock.patch.object(StravaSyncService, "_record_sync_error") as record_error:
+            yield fetch_pages, record_error
+
+    def test_lost_job_stops_at_next_progress_report(self, service):
+        fetch_pages, record_error = service
+
+        with mock.patch.object(sync_worker, "update_sync_job_progress", return_value=False), \
+             mock.patch.object(sync_worker, "finish_sync_job") as finish_job:
+            sync_worker.run_job({"id": 7, "user_id": 3, "full_sync": False, "attempts": 1}, "worker-1")
+
+        fetch_pages.assert_not_called()
+        record_error.assert_not_called()
+        finish_job.assert_not_called()
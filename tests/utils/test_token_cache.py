@@ -0,0 +1,135 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from unittest import mock
+
+import psycopg2
+import pytest
+
+from stravatalk.utils import auth_utils
+from stravatalk.utils.token_cache import AccessTokenCache
+
+NOW = 1_700_000_000
+
+
+@pytest.fixture
+def cache():
+    return AccessTokenCache(margin_seconds=60, clock=lambda: NOW)
+
+
+class TestAccessTokenCache:
+    """Per-athlete token cache with single-flight loads."""
+
+    def test_fresh_token_is_served_from_cache(self, cache):
+        loads = []
+
+        def load():
+            loads.append(1)
+            return "token", NOW + 3600
+
+        assert cache.get(1, load) == "token"
+        assert cache.get(1, load) == "token"
+        assert len(loads) == 1
+        assert cache.stats()["hits"] == 1
+
+    def test_token_inside_margin_is_reloaded(self, cache):
+        cache.put(1, "old", NOW + 30)
+
+        assert cache.get(1, lambda: ("new", NOW + 3600)) == "new"
+
+    def test_missing_token_is_not_cached(self, cache):
+        assert cache.get(1, lambda: None) is None
+        assert cache.stats()["entries"] == 0
+
+    def test_force_reloads_fresh_token(self, cache):
+        cache.put(1, "old", NOW + 3600)
+
+        assert cache.get(1, lambda: ("new", NOW + 3600), force=True) == "new"
+        assert cache.get(1, lambda: pytest.fail("should be cached")) == "new"
+
+    def test_invalidate_forgets_token(self, cache):
+        cache.put(1, "old", NOW + 3600)
+
+        cache.invalidate(1)
+
+        assert cache.get(1, lambda: ("new", NOW + 3600)) == "new"
+        assert cache.stats()["invalidations"] == 1
+
+    def test_concurrent_misses_share_one_load(self, cache):
+        release = threading.Event()
+        loads = []
+
+        def load():
+            loads.append(1)
+            release.wait(5)
+            return "token", NOW + 3600
+
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            futures = [pool.submit(cache.get, 1, load) for _ in range(10)]
+            # Let every caller reach the cache before the load finishes
+            while cache.stats()["loads"] + cache.stats()["waits"] < 10:
+                time.sleep(0.01)
+            release.set()
+            tokens = [future.result(timeout=5) for future in futures]
+
+        assert tokens == ["token"] * 10
+        assert len(loads) == 1
+        assert cache.stats()["waits"] == 9
+        assert cache.stats()["in_flight"] == 0
+
+    def test_load_exception_reaches_every_waiter(self, cache):
+        release = threading.Event()
+
+        def load():
+            release.wait(5)
+            raise RuntimeError("Strava is down")
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            futures = [pool.submit(cache.get, 1, load) for _ in range(3)]
+            while cache.stats()["loads"] + cache.stats()["waits"] < 3:
+                time.sleep(0.01)
+            release.set()
+            for future in futures:
+                with pytest.raises(RuntimeError, match="Strava is down"):
+                    future.result(timeout=5)
+
+        # The failed load is not remembered; the next caller tries again
+        assert cache.get(1, lambda: ("token", NOW + 3600)) == "token"
+
+    def test_athletes_load_independently(self, cache):
+        cache.put(1, "one", NOW + 3600)
+
+        assert cache.get(2, lambda: ("two", NOW + 3600)) == "two"
+        assert cache.get(1, lambda: pytest.fail("should be cached")) == "one"
+
+
+class TestStoreStravaConnection:
+    """Reconnecting through OAuth replaces the cached token."""
+
+    def test_new_token_replaces_cached_one(self, cache):
+        cache.put(42, "old", NOW + 3600)
+
+        @contextmanager
+        def db_connection(*args, **kwargs):
+            yield mock.MagicMock()
+
+        with mock.patch.object(auth_utils, "db_connection", db_connection), \
+             mock.patch.object(auth_utils, "get_access_token_cache", return_value=cache):
+            assert auth_utils.store_strava_connection(7, 42, "new", "refresh", NOW + 21600)
+
+        assert cache.get(42, lambda: pytest.fail("should be cached")) == "new"
+
+    def test_failed_store_keeps_cached_token(self, cache):
+        cache.put(42, "old", NOW + 3600)
+
+        @contextmanager
+        def db_connection(*args, **kwargs):
+            raise psycopg2.OperationalError("connection lost")
+            yield
+
+        with mock.patch.object(auth_utils, "db_connection", db_connection), \
+             mock.patch.object(auth_utils, "get_access_token_cache", return_value=cache):
+            assert not auth_utils.store_strava_connection(7, 42, "new", "refresh", NOW + 21600)
+
+        assert cache.get(42, lambda: pytest.fail("should be cached")) == "old"
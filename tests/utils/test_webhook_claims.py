@@ -0,0 +1,115 @@
+"""
+Concurrent webhook claims against a real PostgreSQL.
+
+Set ``TEST_DATABASE_URL`` to run them. Each test builds its own
+``webhook_events`` table in a throwaway schema, so any database will do.
+"""
+
+import os
+import uuid
+
+import psycopg2
+import psycopg2.extras
+import pytest
+
+from stravatalk.utils.webhook_queue import _claim_events
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+
+@pytest.fixture
+def connect():
+    """Open connections that all see the same, empty webhook_events table."""
+    schema = f"webhook_claims_{uuid.uuid4().hex[:8]}"
+    admin = psycopg2.connect(TEST_DATABASE_URL)
+    admin.autocommit = True
+    with admin.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA {schema}")
+        cursor.execute(f"""
+            CREATE TABLE {schema}.webhook_events (
+                id BIGSERIAL PRIMARY KEY,
+                payload JSONB NOT NULL DEFAULT '{{}}',
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                locked_by TEXT,
+                locked_at TIMESTAMPTZ,
+                received_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                object_type TEXT,
+                object_id BIGINT
+            )
+        """)
+    opened = []
+
+    def open_connection():
+        conn = psycopg2.connect(TEST_DATABASE_URL, options=f"-c search_path={schema}")
+        opened.append(conn)
+        return conn
+
+    yield open_connection
+
+    for conn in opened:
+        conn.close()
+    with admin.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+    admin.close()
+
+
+def enqueue(conn, *object_ids):
+    with conn.cursor() as cursor:
+        for object_id in object_ids:
+            cursor.execute(
+                "INSERT INTO webhook_events (object_type, object_id) VALUES ('activity', %s)", (object_id,)
+            )
+    conn.commit()
+
+
+def claim(conn, worker_id, max_objects=1):
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+        return _claim_events(cursor, worker_id, max_objects, stale_seconds=300)
+
+
+def claimed_objects(conn, worker_id):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT DISTINCT object_id FROM webhook_events WHERE locked_by = %s ORDER BY object_id", (worker_id,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class TestConcurrentClaims:
+    """Two workers claiming from the queue at the same time."""
+
+    def test_uncommitted_claim_keeps_object_from_other_worker(self, connect):
+        first, second = connect(), connect()
+        enqueue(first, 1, 1, 2)
+
+        assert len(claim(first, "worker-a")) == 2
+        assert len(claim(second, "worker-b", max_objects=2)) == 1
+        first.commit()
+        second.commit()
+
+        assert claimed_objects(first, "worker-a") == [1]
+        assert claimed_objects(first, "worker-b") == [2]
+
+    def test_object_stays_with_worker_until_finished(self, connect):
+        first, second = connect(), connect()
+        enqueue(first, 1)
+        claim(first, "worker-a")
+        first.commit()
+
+        enqueue(first, 1)
+
+        assert claim(second, "worker-b") == []
+
+    def test_limit_counts_objects_not_events(self, connect):
+        conn = connect()
+        enqueue(conn, 1, 1, 1, 2)
+
+        events = claim(conn, "worker-a", max_objects=1)
+        conn.commit()
+
+        assert len(events) == 3
+        assert claimed_objects(conn, "worker-a") == [1]
@@ -0,0 +1,69 @@
+from stravatalk.utils.webhook_queue import coalesce_events, event_dedup_key
+
+
+def event(aspect_type, event_time, updates=None):
+    return {
+        "object_type": "activity", "object_id": 42, "owner_id": 7,
+        "aspect_type": aspect_type, "event_time": event_time, "updates": updates or {},
+    }
+
+
+class TestCoalesceEvents:
+    """Merging the pending events of one object."""
+
+    def test_no_events(self):
+        assert coalesce_events([]) == []
+
+    def test_single_event_is_kept(self):
+        update = event("update", 1, {"title": "Morning Run"})
+
+        assert coalesce_events([update]) == [update]
+
+    def test_updates_merge_with_later_values_winning(self):
+        events = [
+            event("update", 3, {"title": "Final"}),
+            event("update", 1, {"title": "First", "type": "Ride"}),
+            event("update", 2, {"private": "true"}),
+        ]
+
+        merged = coalesce_events(events)
+
+        assert len(merged) == 1
+        assert merged[0]["aspect_type"] == "update"
+        assert merged[0]["event_time"] == 3
+        assert merged[0]["updates"] == {"title": "Final", "type": "Ride", "private": "true"}
+
+    def test_create_absorbs_updates(self):
+        create = event("create", 1)
+        events = [event("update", 2, {"title": "Renamed"}), create, event("update", 3, {"type": "Ride"})]
+
+        assert coalesce_events(events) == [create]
+
+    def test_delete_supersedes_everything(self):
+        delete = event("delete", 3)
+        events = [event("create", 1), event("update", 2, {"title": "Renamed"}), delete]
+
+        assert coalesce_events(events) == [delete]
+
+    def test_delete_wins_over_later_create(self):
+        delete = event("delete", 1)
+
+        assert coalesce_events([delete, event("create", 2)]) == [delete]
+
+    def test_does_not_modify_input(self):
+        first = event("update", 1, {"title": "First"})
+        second = event("update", 2, {"type": "Ride"})
+
+        coalesce_events([first, second])
+
+        assert second["updates"] == {"type": "Ride"}
+
+
+class TestEventDedupKey:
+    """Recognising redeliveries of the same event."""
+
+    def test_redelivery_has_same_key(self):
+        assert event_dedup_key(event("update", 1, {"title": "A"})) == event_dedup_key(event("update", 1, {"title": "A"}))
+
+    def test_different_updates_have_different_keys(self):
+        assert event_dedup_key(event("update", 1, {"title": "A"})) != event_dedup_key(event("update", 1, {"title": "B"}))